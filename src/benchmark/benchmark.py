@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# times the open, lookup, upsert, delete and save paths against generated databases and prints the timings as json
+#   python src/benchmark/benchmark.py --entries 1000,10000 --kdf I=2,M=16,P=2 --attachment-sizes 0,1048576
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from importlib import metadata
+from typing import Callable, List
+
+from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
+from ansible.utils.display import Display
+from pykeepass import create_database
+from pykeepass.kdbx_parsing.kdbx import KDBX
+
+# the plugins are loaded the way a play loads them, from the collection in src/main
+_AnsibleCollectionFinder(paths=[os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "main")])._install()
+
+from ansible.plugins.loader import lookup_loader
+from ansible_collections.dszryan.keepass.plugins.filter.filter import do_lookup
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+from ansible_collections.dszryan.keepass.plugins.module_utils.snapshot import SNAPSHOT_CACHE
+
+_PASSWORD = "benchmark"
+_ENTRIES_PER_GROUP = 100
+_ATTACHMENTS = 10
+_SAMPLES = 100
+
+
+def _kdf(description: str) -> dict:
+    # argon2 parameters as I=iterations,M=memory in MiB,P=parallelism
+    parameters = dict(item.split("=") for item in description.split(","))
+    return {"I": int(parameters.get("I", 2)), "M": int(parameters.get("M", 16)) * 1024 * 1024, "P": int(parameters.get("P", 2))}
+
+
+def _path(index: int) -> str:
+    return "group%04d/entry%06d" % (index // _ENTRIES_PER_GROUP, index)
+
+
+def generate(directory: str, entries: int, kdf: str, attachment_size: int) -> str:
+    location = os.path.join(directory, "benchmark_%d_%s_%d.kdbx" % (entries, kdf.replace(",", "_").replace("=", ""), attachment_size))
+    if os.path.exists(location):
+        return location
+
+    database = create_database(location + ".tmp", password=_PASSWORD)
+    parameters = database.kdbx.header.value.dynamic_header.kdf_parameters.data.dict
+    for key, value in _kdf(kdf).items():
+        parameters[key].value = value
+    # the header is rebuilt from its parsed values only once its raw bytes are dropped
+    del database.kdbx.header.data
+    groups = [database.add_group(database.root_group, "group%04d" % index) for index in range((entries + _ENTRIES_PER_GROUP - 1) // _ENTRIES_PER_GROUP)]
+    for index in range(entries):
+        entry = database.add_entry(groups[index // _ENTRIES_PER_GROUP], "entry%06d" % index, "username%d" % index, "password%d" % index, url="https://%d.local" % index, force_creation=True)
+        entry.set_custom_property("custom", "value%d" % index)
+        if attachment_size > 0 and index % max(entries // _ATTACHMENTS, 1) == 0:
+            entry.add_attachment(database.add_binary(os.urandom(attachment_size)), "attachment.bin")
+    # built in memory, writing straight to the file cannot read the rebuilt header back
+    with open(location + ".tmp", mode="wb") as file:
+        file.write(KDBX.build(database.kdbx, password=_PASSWORD, keyfile=None, transformed_key=None))
+    os.replace(location + ".tmp", location)
+    return location
+
+
+def _timings(operation: Callable, arguments: List) -> dict:
+    elapsed = []
+    for argument in arguments:
+        start = time.perf_counter()
+        operation(argument)
+        elapsed.append(time.perf_counter() - start)
+    return {"count": len(elapsed), "median_ms": round(statistics.median(elapsed) * 1000, 3), "min_ms": round(min(elapsed) * 1000, 3), "max_ms": round(max(elapsed) * 1000, 3)}
+
+
+def measure(display: Display, location: str, entries: int, repeat: int, lookup) -> dict:
+    details = {"location": location, "password": _PASSWORD, "updatable": True, "cache_ttl": 0}
+    indexes = random.Random(entries).sample(range(entries), min(_SAMPLES, entries))
+    gets = [Query(display, True, "get://%s" % _path(index)).search for index in indexes]
+    timings = {}
+
+    def open_database(_):
+        DATABASE_CACHE.clear()
+        return KeepassDatabase(display, details)
+    timings["open"] = _timings(open_database, range(repeat))
+
+    storage = KeepassDatabase(display, details)
+    timings["get_by_path_cold"] = _timings(lambda search: storage.get(search), gets[:1])
+    timings["get_by_path"] = _timings(lambda search: storage.get(search), gets)
+    uuids = [storage._entry_find(search).uuid for search in gets]
+    timings["get_by_uuid"] = _timings(lambda entry_uuid: storage._entry_find(gets[0], ref_uuid=entry_uuid), uuids)
+
+    with tempfile.TemporaryDirectory() as directory:
+        copy = shutil.copy(location, os.path.join(directory, os.path.basename(location)))
+        storage = KeepassDatabase(display, dict(details, location=copy))
+        # changes are only applied in memory, the save is timed on its own
+        storage._in_transaction = True
+        timings["upsert"] = _timings(lambda index: storage._entry_upsert(Query(display, False, 'put://%s#{"url": "https://%d.updated"}' % (_path(index), index)).search, check_mode=False), indexes)
+        timings["delete"] = _timings(lambda index: storage.delete(Query(display, False, "del://%s" % _path(index)).search), indexes[:len(indexes) // 2])
+        storage._in_transaction = False
+        timings["save"] = _timings(lambda _: storage._save(), range(repeat))
+
+    terms = ["get://%s?password" % _path(index) for index in indexes[:10]]
+    cached = dict(details, cache_ttl=300)
+    timings["lookup_plugin"] = _timings(lambda _: lookup.run(terms, variables=None, database=cached), range(repeat))
+    timings["filter_plugin"] = _timings(lambda term: do_lookup({"database": cached, "lookup": term}), terms)
+
+    # the same reads once the database was decrypted into a snapshot
+    storage = KeepassDatabase(display, details)
+    storage.maintain("snapshot", check_mode=False)
+    timings["lookup_plugin_snapshot"] = _timings(lambda _: lookup.run(terms, variables=None, database=details), range(repeat))
+    timings["filter_plugin_snapshot"] = _timings(lambda term: do_lookup({"database": details, "lookup": term}), terms)
+    SNAPSHOT_CACHE.discard(storage._key_identity)
+    return timings
+
+
+def run(directory: str, entries: List[int], kdfs: List[str], attachment_sizes: List[int], repeat: int) -> dict:
+    display = Display()
+    display.verbosity = 0
+    lookup = lookup_loader.get("dszryan.keepass.lookup")
+    runs = []
+    with open(os.devnull, mode="w") as devnull, contextlib.redirect_stdout(devnull):
+        for count in entries:
+            for kdf in kdfs:
+                for attachment_size in attachment_sizes:
+                    start = time.perf_counter()
+                    location = generate(directory, count, kdf, attachment_size)
+                    generated = time.perf_counter() - start
+                    runs.append({
+                        "entries": count,
+                        "kdf": _kdf(kdf),
+                        "attachment_size": attachment_size,
+                        "file_size": os.path.getsize(location),
+                        "generate_s": round(generated, 3),
+                        "timings": measure(display, location, count, repeat, lookup)
+                    })
+    return {
+        "python": platform.python_version(),
+        "pykeepass": metadata.version("pykeepass"),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "runs": runs
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=u"times the keepass plugin paths against generated databases")
+    parser.add_argument("--entries", default="1000,10000", help=u"comma separated entry counts, e.g. 1000,10000,100000")
+    parser.add_argument("--kdf", action="append", help=u"argon2 parameters as I=iterations,M=memory in MiB,P=parallelism, may be repeated")
+    parser.add_argument("--attachment-sizes", default="0,1048576", help=u"comma separated attachment sizes in bytes, %d attachments per database" % _ATTACHMENTS)
+    parser.add_argument("--repeat", type=int, default=5, help=u"repetitions of the open, save and plugin timings")
+    parser.add_argument("--directory", default=os.path.join(tempfile.gettempdir(), "keepass-benchmark"), help=u"where the generated databases are kept between runs")
+    parser.add_argument("--output", help=u"file the json is written to, printed when absent")
+    arguments = parser.parse_args()
+
+    os.makedirs(arguments.directory, exist_ok=True)
+    report = run(
+        arguments.directory,
+        [int(count) for count in arguments.entries.split(",")],
+        arguments.kdf or ["I=2,M=16,P=2"],
+        [int(size) for size in arguments.attachment_sizes.split(",")],
+        arguments.repeat)
+    if arguments.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(arguments.output, mode="w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# per lookup cost of the logging at -v0 and -vvvv
+#   PYTHONPATH=src/main python src/benchmark/benchmark_logging.py --iterations 2000
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import contextlib
+import json
+import os
+import timeit
+
+from ansible.utils.display import Display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+
+_SCRATCH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "test", "ansible_collections", "dszryan", "keepass", "plugins", "module_utils")
+
+
+def run(iterations: int) -> dict:
+    display = Display()
+    verbosity, results = display.verbosity, {}
+    try:
+        for level in [0, 4]:
+            display.verbosity = level
+            with open(os.devnull, mode="w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                storage = KeepassDatabase(display, {
+                    "location": os.path.join(_SCRATCH, "scratch.kdbx"),
+                    "keyfile": os.path.join(_SCRATCH, "scratch.keyfile"),
+                    "password": "scratch"
+                })
+                elapsed = timeit.timeit(lambda: storage.execute(Query(display, True, "get://one/two/test?password").search, check_mode=False, fail_silently=False), number=iterations)
+            results["-v%s" % ("v" * (level - 1) if level > 0 else "0")] = round(elapsed / iterations * 1000000, 2)
+    finally:
+        display.verbosity = verbosity
+    return {"benchmark": "logging", "iterations": iterations, "microseconds_per_lookup": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=u"per lookup cost of the logging at -v0 and -vvvv")
+    parser.add_argument("--iterations", type=int, default=2000)
+    print(json.dumps(run(parser.parse_args().iterations), indent=2))
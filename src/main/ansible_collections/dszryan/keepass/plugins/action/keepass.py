@@ -2,11 +2,21 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
-from ansible.errors import AnsibleError, AnsibleParserError
+import os
+import shutil
+import tempfile
+from typing import Union
+
+from ansible import constants as C
+from ansible.errors import AnsibleError, AnsibleFileNotFound, AnsibleParserError
+from ansible.module_utils.common.text.converters import to_native
 from ansible.plugins import display
 from ansible.plugins.action import ActionBase
 
+from ansible_collections.dszryan.keepass.plugins.module_utils.kdf_advisor import KdfAdvisor
 from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import is_verbose
+from ansible_collections.dszryan.keepass.plugins.module_utils.record_reader import RecordReader
 from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
 from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
 
@@ -32,6 +42,11 @@ options:
             keyfile: path to the keyfile
             transformed_key:
             updatable: false    # this is the default value when not provided and and would only support I(action=get)
+            cache_ttl: 300      # seconds an opened database is reused within the process, 0 disables the cache
+            cache_transformed_key: false    # when true, the derived key is kept encrypted in the run's local tmp so later forks skip the key derivation
+            daemon: false       # when true, the first fork to open the database leaves a daemon holding it, later forks query it over a unix socket
+            daemon_idle_timeout: 60     # seconds without requests before the daemon exits, it also exits when the run ends
+            metrics: false      # when true, each result carries 'metrics' with the milliseconds spent opening, finding, resolving references, changing and saving, and the cache hits
           updatable_database:
             location: path of the database
             password: !vault |
@@ -39,6 +54,13 @@ options:
             keyfile: path to the keyfile
             transformed_key:
             updatable: true    # when explicitly provided as true, the database would support I(action=post), I(action=put) amd I(action=del)
+            cache_ttl: 300     # an opened database is keyed on its file version and credentials, a save replaces the cached version
+            concurrency: lock  # lock holds an advisory lock on '<location>.lock' from reading to saving a change.
+                               # optimistic only locks to save, and when another writer saved first reloads and re-applies its pending changes
+            history_max_items: 10      # history items kept per entry when a change saves its history, the newest are kept, unbounded when absent
+            history_max_age: 365       # days a history item is kept for
+            history_max_bytes: 6291456 # bytes of history, attachments included, kept per entry
+            kdf_target_ms: 1000        # milliseconds a key derivation should take on this host, see I(maintenance=kdf) and I(maintenance=rekey)
     type: dict
   term:
     description:
@@ -47,10 +69,19 @@ options:
       - Mutually exclusive with I(action), I(path), I(), I(field) and I(value).
     type: str
     version_added: "1.0"
+  terms:
+    description:
+      - a list of queries applied as one transaction, each item is either a term or a dictionary of I(action), I(path), I(field) and I(value)
+      - the database is saved once after all the queries succeeded, and when any query fails none of the changes are saved
+      - Mutually exclusive with I(term), I(action), I(path), I(field), I(value) and I(fail_silently).
+    type: list
+    version_added: "1.1"
   action:
     description:
       - the action to perform on the keepass database
       - get is equivalent to select
+      - get and find resolve field references ({REF:P@I:...}, including chained references), post, put and del return the fields as they are stored
+      - find returns the list of entries whose path matches I(path) as a pattern, see I(match) and I(tags)
       - post is equivalent to insert.
       - put is equivalent to upsert
       - del is equivalent to delete
@@ -58,6 +89,7 @@ options:
     default: get
     choices:
       - get
+      - find
       - post
       - put
       - del
@@ -78,20 +110,106 @@ options:
       - Mutually exclusive with I(term) and I(action=post) and I(action=put)
     type: str
     version_added: "1.0"
+  fields:
+    description:
+      - If I(action=get) and I(field) is absent, or I(action=find), only these properties of the entry are dumped
+      - a list or a comma separated string of title, path, username, password, url, notes, custom_properties and attachments
+      - properties not requested are never read, so attachments are not measured unless asked for
+      - Mutually exclusive with I(field).
+    type: list
+    version_added: "1.1"
+  match:
+    description:
+      - If I(action=find), how I(path) selects the entries, glob by default
+      - a glob '*' or '?' stays within a group or title and '**' spans groups, so 'prod/**' is the whole subtree of prod
+      - a regex is matched anywhere in the path unless anchored, within a I(term) it cannot hold '?' or '#'
+    choices:
+      - glob
+      - regex
+    type: str
+    version_added: "1.1"
+  tags:
+    description:
+      - If I(action=find), only the entries carrying all of these tags are returned
+      - a list or a comma separated string
+    type: list
+    version_added: "1.1"
+  dest:
+    description:
+      - If I(action=get) and I(field) names an attachment, the attachment is streamed into this file instead of being returned
+      - the result then holds the I(dest), I(size) and I(sha256) of the file, the file is only replaced when its content differs
+      - Mutually exclusive with I(terms).
+    type: path
+    version_added: "1.1"
+  remote_dest:
+    description:
+      - when true, I(dest) is a path on the remote host and the exported file is transferred to it
+      - when false, I(dest) is a path on the controller
+    default: false
+    type: bool
+    version_added: "1.1"
   value:
     description:
       - If I(action=get), if an entry is found and it the field has no value, the default (str) value is returned. else an exception is raised.
       - If I(action=post) or I(action=put), the value provided (json) is used to update the database.
+      - an attachment is provided as {"filename": "name", "binary": "base64 or plain text"} or as {"filename": "name", "src": "path on the controller"}
+      - a relative I(src) is looked up in the files of the role and the playbook, as the src of copy is
+      - an attachment given by I(src) is hashed as it is read and only stored when its content differs, I(filename) defaults to the name of the file
       - Required if I(action=post) or I(action=put)
       - Mutually exclusive with I(term) and I(action=del).
     type: str or json
     version_added: "1.0"
+  maintenance:
+    description:
+      - a maintenance operation applied to the whole database instead of a query
+      - collect_binaries removes the binaries no entry or history item refers to anymore and reports how many bytes were released
+      - compact prunes the history of every entry to the database's history_max_* limits, or without them to the limits set in the database itself, then removes the binaries left unreferenced
+      - compact reports the history items and binaries removed, the bytes released and the size of the file before and after
+      - kdf reads the cipher, compression and key derivation parameters from the database header without opening the database, times a key derivation with them on this host
+        and recommends the iterations, or when a single iteration is too slow the memory, that take the database's kdf_target_ms
+      - rekey applies the recommendation of kdf with a fresh seed and saves the database, it is left alone while within 25% of kdf_target_ms
+      - rekey needs the password or keyfile, fewer iterations or less memory make the database quicker to open and quicker to guess
+      - snapshot decrypts the database once into an indexed snapshot in the run's local tmp, each entry encrypted with a key that lives as long as the run
+      - while the database file is unchanged, the lookup and filter plugins read entries from the snapshot instead of opening the database
+      - attachments, other entry attributes and changes are still served by the database, saving a change drops the snapshot
+      - Mutually exclusive with I(term), I(terms), I(action), I(path), I(field), I(value) and I(dest).
+    choices:
+      - collect_binaries
+      - compact
+      - kdf
+      - rekey
+      - snapshot
+    type: str
+    version_added: "1.1"
+  import_src:
+    description:
+      - a file on the controller whose records are each applied as I(action=put), with one open and one save of the database
+      - a relative path is looked up in the files of the role and the playbook, as the src of copy is
+      - a record holds the entry's I(path), or its I(title) and I(group), and the values a put accepts, other keys are custom properties
+      - csv has a header row naming the columns and leaves the value as it is for an empty cell
+      - jsonl holds a json record per line, yaml (or json) a list of records
+      - an attachment I(src) relative to the file is read from beside it
+      - the result counts the records created, updated and unchanged, and nothing is saved if any record fails
+      - Mutually exclusive with I(term), I(terms), I(action), I(path), I(field), I(value), I(dest), I(maintenance) and I(fail_silently).
+    type: path
+    version_added: "1.1"
+  import_format:
+    description:
+      - the format of I(import_src), when absent it is taken from the file extension
+    choices:
+      - csv
+      - jsonl
+      - yaml
+    type: str
+    version_added: "1.1"
   check_mode:
     description:
       - ensures all operation do not affect the database
-      - If I(action=post) or I(action=put) or I(action=del), operations are performed mocked and not changes are made to the database.
+      - If I(action=post) or I(action=put) or I(action=del), the changes are worked out against the database and reported, nothing in the database is changed, not even in memory.
+      - the result holds a C(diff) of the fields, custom properties and attachment digests that would change, shown by ansible with C(--diff).
+      - the password and the other protected strings show as C(********) in the diff, or as they are when empty.
+      - defaults to the play's check mode, as set by C(--check).
       - If I(action=get), I(value) is ignored and an exception is raised if the field is none or empty.
-    default: false
     choices:
       - false
       - true
@@ -115,24 +233,72 @@ EXAMPLES = """
 - name: dump the whole entity
   keepass:
     term: get://path/to/entity    
+- name: dump every entity whose title starts with db in the groups under prod
+  keepass:
+    term: find://prod/*/db*
+    fields: path,username,password
+- name: dump the entities matching a regex and carrying both tags
+  keepass:
+    action: find
+    path: ^prod/.*/(mysql|postgres)-[0-9]+$
+    match: regex
+    tags:
+      - db
+      - primary
 - name: get only one field and raise an exception if not found
   keepass:
     term: get://path/to/entity?field_name
 - name: get only one field and return the default value if not found
   keepass:
     term: get://path/to/entity?field_name#default_value
+- name: dump only some properties of the entity
+  keepass:
+    term: get://path/to/entity
+    fields: username,url
+- name: export an attachment to a file on the remote host, without returning its content
+  keepass:
+    term: get://path/to/entity?keystore.p12
+    dest: /etc/ssl/private/keystore.p12
+    remote_dest: true
 - name: insert an entity, throw an exception if value already exists. note json requires " for delimitation and cannot replaced with ' or `
   keepass:
     term: post://path/to/entity#{"username": "value", "custom": "value", "attachments": [{"filename": "file content as base64k encoded"}] }
 - name: upsert an entity, overwrite if already exists. note json requires " for delimitation and cannot replaced with ' or `
   keepass:
     term: put://path/to/entity#{"username": "value", "custom": "value", "attachments": [{"filename": "file content as base64k encoded"}] }
+- name: upsert an entity, attaching a file from the controller. it is only stored when its content changed
+  keepass:
+    term: put://path/to/entity#{"attachments": [{"src": "files/keystore.p12"}, {"filename": "ca.pem", "src": "/etc/ssl/certs/ca.pem"}] }
 - name: delete an entity. raise an exception if not exists
   keepass:
     term: del://path/to/entity
 - name: clear a field, raise an exception if the entity does not exists or the field does not exists or has no value
   keepass:
     term: del://path/to/entity?field
+- name: drop the attachments binaries nothing refers to anymore
+  keepass:
+    maintenance: collect_binaries
+- name: prune the history of every entry and drop the binaries left unreferenced
+  keepass:
+    maintenance: compact
+- name: key the database for an unlock of about half a second on this host, the database has kdf_target_ms set to 500
+  keepass:
+    maintenance: rekey
+- name: seed the database from a csv with the columns path,username,password,url,notes and any custom properties
+  keepass:
+    import_src: files/seed.csv
+- name: decrypt the database once, the lookups that follow read their entries from the snapshot
+  keepass:
+    maintenance: snapshot
+  run_once: true
+- name: apply many changes and save the database once, nothing is saved if any of them fails
+  keepass:
+    terms:
+      - put://path/to/entity#{"username": "value"}
+      - action: put
+        path: path/to/another
+        value: '{ "custom": "value" }'
+      - del://path/to/obsolete
 """
 
 RETURN = """
@@ -144,29 +310,130 @@ result:
       description: the query that was executed
     result:
       description: when not failed the result of the query. and when failed and fail_silently the error details
+results:
+  description: when I(terms) is provided, the result of each query in the order provided
+  type: list
 """
 
 
 class ActionModule(ActionBase):
 
     TRANSFERS_FILES = False
-    _VALID_ARGS = frozenset(("database", "term", "action", "path", "field", "value", "check_mode", "fail_silently"))
+    _VALID_ARGS = frozenset(("database", "term", "terms", "action", "path", "field", "fields", "match", "tags", "dest", "remote_dest", "value", "maintenance", "import_src", "import_format", "check_mode", "fail_silently"))
     _search_args = ["action", "path", "field", "value"]
 
+    @staticmethod
+    def _search(args: dict) -> Search:
+        return Query(display, False, args["term"], args.get("fields", None), args.get("dest", None), args.get("match", None), args.get("tags", None)).search if args.get("term", None) is not None else \
+            Search(display=display,
+                   read_only=False,
+                   action=args.get("action", None),
+                   path=args.get("path", None),
+                   field=args.get("field", None),
+                   value=args.get("value", None),
+                   value_was_provided=args.get("value", None) is not None,
+                   fields=args.get("fields", None),
+                   dest=args.get("dest", None),
+                   match=args.get("match", None),
+                   tags=args.get("tags", None))
+
+    def _locate(self, search: Search) -> Search:
+        # an attachment src is looked up like the src of copy, in the role's and the playbook's files
+        if not isinstance(search.value, dict) or not isinstance(search.value.get("attachments", None), list):
+            return search
+        try:
+            # the attachments handed in are left as they are, the ones found replace them in a new value
+            attachments = [dict(attachment, src=self._find_needle("files", attachment["src"])) if isinstance(attachment, dict) and attachment.get("src", None) is not None else attachment
+                           for attachment in search.value["attachments"]]
+        except AnsibleFileNotFound as error:
+            raise AnsibleParserError(AnsibleError(message=to_native(error), orig_exc=error))
+        search.value = dict(search.value, attachments=attachments)
+        return search
+
+    @staticmethod
+    def _kdf(details: Union[dict, None]) -> dict:
+        # read off the header and timed on its own, the database is neither decrypted nor its key derived
+        location = (details or {}).get("location", None)
+        filename = None if location is None else os.path.realpath(os.path.expanduser(os.path.expandvars(location)))
+        if filename is None or not os.path.isfile(filename):
+            raise AnsibleParserError(u"could not find keepass database - %s" % location)
+        try:
+            report = KdfAdvisor(details.get("kdf_target_ms", KdfAdvisor.DEFAULT_TARGET_MS)).report(filename)
+        except AttributeError as error:
+            raise AnsibleParserError(AnsibleError(message=to_native(error), orig_exc=error))
+        return {"changed": False, "failed": False, "result": {"maintenance": "kdf", "outcome": report}}
+
+    @property
+    def _check_mode(self) -> bool:
+        # the task argument wins, otherwise the play's --check applies
+        return self._task.args.get("check_mode", self._play_context.check_mode)
+
     def run(self, tmp=None, task_vars=None):
         super(ActionModule, self).run(tmp, task_vars)
-        display.vvv("keepass: args - %s" % list(({key: value} for key, value in self._task.args.items() if key != "database")))
+        if is_verbose(display, 3):
+            display.vvv("keepass: args - %s" % list(({key: value} for key, value in self._task.args.items() if key != "database")))
         if self._task.args.get("term", None) is not None and len(set(self._search_args).intersection(set(self._task.args.keys()))) > 0:
             raise AnsibleParserError(AnsibleError(u"'term' is mutually exclusive with %s" % self._search_args))
+        if self._task.args.get("terms", None) is not None and len(set(self._search_args + ["term", "fail_silently", "dest"]).intersection(set(self._task.args.keys()))) > 0:
+            raise AnsibleParserError(AnsibleError(u"'terms' is mutually exclusive with %s" % (self._search_args + ["term", "fail_silently", "dest"])))
 
-        search = Query(display, False, self._task.args["term"]).search if self._task.args.get("term", None) is not None else \
-            Search(display=display,
-                   read_only=False,
-                   action=self._task.args.get("action", None),
-                   path=self._task.args.get("path", None),
-                   field=self._task.args.get("field", None),
-                   value=self._task.args.get("value", None),
-                   value_was_provided=self._task.args.get("value", None) is not None)
-
-        return KeepassDatabase(display, self._task.args.get("database", None)).\
-            execute(search, self._task.args.get("check_mode", False), self._task.args.get("fail_silently", False))
+        if self._task.args.get("maintenance", None) is not None and len(set(self._search_args + ["term", "terms", "dest"]).intersection(set(self._task.args.keys()))) > 0:
+            raise AnsibleParserError(AnsibleError(u"'maintenance' is mutually exclusive with %s" % (self._search_args + ["term", "terms", "dest"])))
+
+        if self._task.args.get("import_src", None) is not None and len(set(self._search_args + ["term", "terms", "dest", "maintenance", "fail_silently"]).intersection(set(self._task.args.keys()))) > 0:
+            raise AnsibleParserError(AnsibleError(u"'import_src' is mutually exclusive with %s" % (self._search_args + ["term", "terms", "dest", "maintenance", "fail_silently"])))
+
+        if self._task.args.get("maintenance", None) == "kdf":
+            return self._kdf(self._task.args.get("database", None))
+        storage = KeepassDatabase(display, self._task.args.get("database", None))
+        if self._task.args.get("import_src", None) is not None:
+            try:
+                # found like the src of copy, the attachments it names are then read from beside it
+                searches = list(RecordReader.searches(display, self._find_needle("files", self._task.args["import_src"]), self._task.args.get("import_format", None)))
+            except (AnsibleFileNotFound, AttributeError, OSError) as error:
+                raise AnsibleParserError(AnsibleError(message=to_native(error), orig_exc=error))
+            return storage.bulk_import(searches, self._check_mode)
+        if self._task.args.get("maintenance", None) is not None:
+            return storage.maintain(self._task.args["maintenance"], self._check_mode)
+        if self._task.args.get("terms", None) is not None:
+            searches = list(map(lambda term: self._locate(self._search(term if isinstance(term, dict) else {"term": term})), self._task.args["terms"]))
+            results = storage.execute_transaction(searches, self._check_mode)
+            return {"changed": any(result["changed"] for result in results), "failed": False, "results": results, "diff": [result["diff"] for result in results if result["changed"] and "diff" in result]}
+
+        search = self._locate(self._search(self._task.args))
+        if search.dest is not None and self._task.args.get("remote_dest", False):
+            return self._export_remote(storage, search, task_vars)
+        return storage.execute(search, self._check_mode, self._task.args.get("fail_silently", False))
+
+    def _export_remote(self, storage: KeepassDatabase, search: Search, task_vars) -> dict:
+        # export into the controller's local tmp, then hand the file to the copy module
+        dest, check_mode = search.dest, self._check_mode
+        local = tempfile.mkdtemp(dir=C.DEFAULT_LOCAL_TMP)
+        try:
+            search.dest = os.path.join(local, "attachment")
+            result = storage.execute(search, check_mode, self._task.args.get("fail_silently", False))
+            search.dest = dest
+            result["result"]["search"]["dest"] = dest
+            if result["failed"]:
+                return result
+
+            exported = result["result"]["outcome"][search.field]
+            if check_mode:
+                stat = self._execute_module(module_name="ansible.legacy.stat", module_args={"path": dest, "get_checksum": True, "checksum_algorithm": "sha256"}, task_vars=task_vars)
+                result["changed"] = stat.get("stat", {}).get("checksum", None) != exported["sha256"]
+            else:
+                if self._connection._shell.tmpdir is None:
+                    self._make_tmp_path()
+                source = self._connection._shell.join_path(self._connection._shell.tmpdir, "attachment")
+                self._transfer_file(exported["dest"], source)
+                self._fixup_perms2((self._connection._shell.tmpdir, source))
+                copied = self._execute_module(module_name="ansible.legacy.copy", module_args={"src": source, "dest": dest, "mode": "0600", "_original_basename": search.field}, task_vars=task_vars)
+                if copied.get("failed", False):
+                    raise AnsibleError(u"keepass: transfer to %s failed - %s" % (dest, copied.get("msg", "")))
+                result["changed"] = copied.get("changed", False)
+            exported["dest"] = dest
+            return result
+        finally:
+            shutil.rmtree(local, ignore_errors=True)
+            if self._connection._shell.tmpdir is not None:
+                self._remove_tmp_path(self._connection._shell.tmpdir)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = """
+callback: metrics
+author: Dszryan (@dszryan)
+version_added: "1.1"
+short_description: summarises the keepass metrics of a playbook run
+description:
+  - adds up the I(metrics) carried by the keepass results of every task, when the database sets C(metrics=true)
+  - prints the time spent per operation and the cache hits for each play, and for the whole run at its end
+type: aggregate
+requirements:
+  - enable in configuration, e.g. C(callbacks_enabled = dszryan.keepass.metrics)
+"""
+
+from ansible.plugins.callback import CallbackBase
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.metrics import Metrics
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "dszryan.keepass.metrics"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, display=None, options=None):
+        super(CallbackModule, self).__init__(display=display, options=options)
+        self._play = None       # type: str
+        self._plays = {}        # type: dict
+        self._results = 0       # type: int
+
+    @staticmethod
+    def _collect(value, found: list):
+        # the metrics sit beside the result of each query, which may be nested in results or loop items
+        if isinstance(value, dict):
+            if isinstance(value.get("metrics", None), dict) and "result" in value:
+                found.append(value["metrics"])
+            list(map(lambda item: CallbackModule._collect(item, found), value.values()))
+        elif isinstance(value, list):
+            list(map(lambda item: CallbackModule._collect(item, found), value))
+        return found
+
+    def _record(self, result):
+        found = CallbackModule._collect(result._result, [])
+        if len(found) == 0:
+            return
+        totals = self._plays.setdefault(self._play, {})
+        list(map(lambda metrics: Metrics.merge(totals, metrics), found))
+        self._results += len(found)
+
+    def _summary(self, title: str, totals: dict):
+        self._display.banner(u"KEEPASS METRICS: %s" % title)
+        for name, value in sorted(totals.get("timings_ms", {}).items(), key=lambda item: -item[1]):
+            self._display.display(u"%-40s %12.3f ms" % (name, value))
+        for name, value in sorted(totals.get("counters", {}).items()):
+            self._display.display(u"%-40s %12d" % (name, value))
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name().strip()
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result)
+
+    def v2_playbook_on_stats(self, stats):
+        if self._results == 0:
+            return
+        run = {}
+        for play, totals in self._plays.items():
+            self._summary(play or u"play", totals)
+            Metrics.merge(run, totals)
+        if len(self._plays) > 1:
+            self._summary(u"run", run)
@@ -7,6 +7,7 @@ from ansible.module_utils.common.text.converters import to_native
 from ansible.plugins import display
 
 from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import is_verbose
 from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
 
 
@@ -15,8 +16,9 @@ def do_lookup(value):
         if not isinstance(value, dict) or value.get("database", None) is None or value.get("lookup", None) is None:
             raise AttributeError("must be a dictionary providing the following elements database (must a valid database description) and lookup")
 
-        display.vvv("keepass: lookup %s" % value["lookup"])
-        outcome = KeepassDatabase(display, value["database"]).execute(Query(display, True, value["lookup"]).search, check_mode=False, fail_silently=False)["result"]["outcome"]
+        if is_verbose(display, 3):
+            display.vvv("keepass: lookup %s" % value["lookup"])
+        outcome = KeepassDatabase(display, value["database"]).execute(Query(display, True, value["lookup"], value.get("fields", None), match=value.get("match", None), tags=value.get("tags", None)).search, check_mode=False, fail_silently=False)["result"]["outcome"]
         return next(enumerate(outcome.values()))[1] if "?" in value["lookup"] else outcome
 
     except Exception as error:
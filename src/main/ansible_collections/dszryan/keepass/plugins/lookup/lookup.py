@@ -5,7 +5,8 @@ __metaclass__ = type
 from ansible.plugins import display
 from ansible.plugins.lookup import LookupBase
 
-from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_pool import DatabasePool
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import is_verbose
 from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
 
 DOCUMENTATION = """
@@ -21,15 +22,47 @@ options:
     description:
       - provided in the format '{{ action }}://{{ path }}?{{ field }}#{{ value }}'
       - for the rules governing read the respective descriptions I(action), I(path), I(field) and I(value) in M(keepass)
+      - a term can also be a dictionary holding the name of one of I(databases) as 'database' and the term itself as 'term'
     required: True
     type: list
     version_added: "1.0"
   database:
     description:
       - templated value that would location a dictionary value defining the keepass database
+      - the database of the terms that do not name one of I(databases)
     type: dict
-    required: True
     version_added: "1.0"
+  databases:
+    description:
+      - databases by name, each defined as I(database) is
+      - the databases named by the terms are opened and queried at the same time, each on its own thread
+      - only argon2 key derivations overlap, aes-kdf ones still run one after the other
+      - a database opened on its own thread does not spawn a daemon
+      - the results are returned in the order of the terms
+    type: dict
+    version_added: "1.1"
+  fields:
+    description:
+      - when a term dumps a whole entry, only these properties are returned
+      - a list or a comma separated string of title, path, username, password, url, notes, custom_properties and attachments
+    type: list
+    version_added: "1.1"
+  match:
+    description:
+      - how the path of a 'find://' term selects entries, glob by default
+      - a glob '*' or '?' stays within a group or title and '**' spans groups, so 'find://prod/**' returns the whole subtree
+      - a regex is matched anywhere in the path unless anchored, a term cannot hold '?' or '#'
+    choices:
+      - glob
+      - regex
+    type: str
+    version_added: "1.1"
+  tags:
+    description:
+      - a 'find://' term only returns the entries carrying all of these tags
+      - a list or a comma separated string
+    type: list
+    version_added: "1.1"
   check_mode:
     description:
       - ensures all operation do not affect the database
@@ -63,6 +96,15 @@ EXAMPLES = """
 - name: dump the multiple entity
   set_fact:
     keepass: "{{ lookup('dszryan.keepass.lookup', get://path/to/entity, get://path/to/another, database=parent_name.read_only_database, check_mode=false, fail_silently=false) }}"    
+- name: dump only some properties of the entity
+  set_fact:
+    keepass: "{{ lookup('dszryan.keepass.lookup', get://path/to/entity, database=parent_name.read_only_database, fields='username,url') }}"
+- name: get fields from the databases of several teams, the databases are opened concurrently
+  set_fact:
+    keepass: "{{ lookup('dszryan.keepass.lookup', {'database': 'team_a', 'term': 'get://path/to/entity?password'}, {'database': 'team_b', 'term': 'get://path/to/another?password'}, databases={'team_a': parent_name.team_a_database, 'team_b': parent_name.team_b_database}) }}"
+- name: dump every entity under a group and its subgroups that is tagged db
+  set_fact:
+    keepass: "{{ lookup('dszryan.keepass.lookup', find://prod/**, database=parent_name.read_only_database, tags='db', fields='path,title,username,password') }}"
 - name: get only one field and raise an exception if not found
   set_fact:
     keepass: "{{ lookup('dszryan.keepass.lookup', get://path/to/entity?field_name, database=parent_name.read_only_database, check_mode=false, fail_silently=false) }}"    
@@ -100,7 +142,13 @@ class LookupModule(LookupBase):
         self.set_options(var_options=variables, direct=kwargs)
         check_mode = self.get_option("check_mode")
         fail_silently = self.get_option("fail_silently")
-        storage = KeepassDatabase(display, self.get_option("database"))
+        fields = self.get_option("fields")
+        match = self.get_option("match")
+        tags = self.get_option("tags")
+        databases = dict(self.get_option("databases") or {})
+        databases[None] = self.get_option("database")
 
-        display.vvv("keepass: terms %s" % terms)
-        return list(map(lambda term: storage.execute(Query(display, True, term).search, check_mode=check_mode, fail_silently=fail_silently), terms))
+        if is_verbose(display, 3):
+            display.vvv("keepass: terms %s" % terms)
+        searches = list(map(lambda term: (term.get("database", None), Query(display, True, term.get("term", None), fields, match=match, tags=tags).search) if isinstance(term, dict) else (None, Query(display, True, term, fields, match=match, tags=tags).search), terms))
+        return DatabasePool(display, databases).execute_many(searches, check_mode=check_mode, fail_silently=fail_silently)
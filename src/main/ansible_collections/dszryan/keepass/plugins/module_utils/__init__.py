@@ -3,24 +3,47 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import json
-from typing import Tuple
+from typing import Callable, Tuple, Union, List
 
 from ansible.module_utils.common.text.converters import to_native
 from pykeepass.entry import Entry
 
+from ansible_collections.dszryan.keepass.plugins.module_utils.binary_stream import BinaryStream
 from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
 
 
 class EntryDump(object):
-    def __init__(self, entry: Entry):
-        self.title = entry.title                # type: str
-        self.path = entry.group.path            # type: str
-        self.username = entry.username          # type: str
-        self.password = entry.password          # type: str
-        self.url = entry.url                    # type: str
-        self.notes = entry.notes                # type: str
-        self.custom_properties = entry.custom_properties    # type: dict
-        self.attachments = [{"filename": attachment.filename, "length": len(attachment.binary)} for index, attachment in enumerate(entry.attachments)] or []    # type: list
+    FIELDS = Search.ENTRY_FIELDS
+    _REFERABLE = ("title", "username", "password", "url", "notes")
+    __slots__ = ("_entry", "_fields", "_resolve") + FIELDS
+
+    def __init__(self, entry: Entry, fields: Union[List[str], None] = None, resolve: Union[Callable, None] = None):
+        self._entry = entry                                                     # type: Entry
+        self._fields = EntryDump.FIELDS if fields is None else tuple(fields)    # type: tuple
+        self._resolve = resolve                                                 # type: Union[Callable, None]
+
+    def __getattr__(self, name: str):
+        # resolved on first access, then kept in its slot
+        if name not in EntryDump.FIELDS:
+            raise AttributeError(name)
+        if name == "path":
+            value = self._entry.group.path                              # type: str
+        elif name == "custom_properties":
+            value = self._entry.custom_properties                       # type: dict
+            if self._resolve is not None:
+                value = {key: self._resolve(item) for key, item in value.items()}
+        elif name == "attachments":
+            value = [{"filename": attachment.filename, "length": BinaryStream.length(attachment)} for attachment in self._entry.attachments]  # type: list
+        else:
+            value = getattr(self._entry, name)                          # type: str
+            if self._resolve is not None and name in EntryDump._REFERABLE:
+                value = self._resolve(value)
+        setattr(self, name, value)
+        return value
+
+    @property
+    def __dict__(self) -> dict:
+        return {field: getattr(self, field) for field in self._fields}
 
 
 class Result(object):
@@ -40,5 +63,11 @@ class Result(object):
             "error": to_native(result[1])
         }
 
+    def measured(self, metrics: dict):
+        self.metrics = metrics
+
+    def compared(self, diff: dict):
+        self.diff = diff
+
     def __str__(self) -> str:
         return json.dumps(self.__dict__)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import hashlib
+import os
+import struct
+import tempfile
+import weakref
+import zlib
+from typing import Iterator, Tuple, Union
+
+from construct import Container
+from pykeepass import PyKeePass
+from pykeepass.attachment import Attachment
+
+
+class BinaryStream(object):
+    DEFAULT_CHUNK_SIZE = 1024 * 1024    # type: int
+    _DIGESTS = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+    @staticmethod
+    def _element(database: PyKeePass, binary_id: int):
+        return database._xpath('/KeePassFile/Meta/Binaries/Binary[@ID="%d"]' % binary_id, first=True)
+
+    @staticmethod
+    def _source(database: PyKeePass, binary_id: int):
+        if database.version >= (4, 0):
+            return database.kdbx.body.payload.inner_header.binary[binary_id].data
+        return BinaryStream._element(database, binary_id)
+
+    @staticmethod
+    def count(database: PyKeePass) -> int:
+        if database.version >= (4, 0):
+            return len(database.kdbx.body.payload.inner_header.binary)
+        return len(database._xpath('/KeePassFile/Meta/Binaries/Binary'))
+
+    @staticmethod
+    def _length(database: PyKeePass, binary_id: int) -> int:
+        # the length is read off the stored binary, without copying or decompressing it
+        if database.version >= (4, 0):
+            return len(BinaryStream._source(database, binary_id)) - 1
+        element = BinaryStream._element(database, binary_id)
+        text = element.text or ""
+        # every 4 characters of base64 hold 3 bytes, less one for each '=' padding the last of them
+        encoded = len(text) - sum(text.count(whitespace) for whitespace in " \t\r\n")
+        if element.get("Compressed") != "True":
+            return encoded // 4 * 3 - text.rstrip()[-2:].count("=")
+        head, tail = base64.b64decode(text.lstrip()[:4]), base64.b64decode("".join(text[-64:].split())[-8:])
+        if head[:2] == b"\x1f\x8b":
+            # gzip ends with the length of what it holds, only the last two groups are decoded to read it
+            return struct.unpack("<I", tail[-4:])[0]
+        return sum(len(chunk) for chunk in BinaryStream._chunks(database, binary_id))
+
+    @staticmethod
+    def length(attachment: Attachment) -> int:
+        return BinaryStream._length(attachment._kp, attachment.id)
+
+    @staticmethod
+    def _chunks(database: PyKeePass, binary_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        if database.version >= (4, 0):
+            # the first byte of an inner header binary holds its protection flag
+            data = memoryview(BinaryStream._source(database, binary_id))
+            for offset in range(1, len(data), chunk_size):
+                yield data[offset:offset + chunk_size]
+            return
+
+        element = BinaryStream._element(database, binary_id)
+        text = "".join(element.text.split())
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32) if element.get("Compressed") == "True" else None
+        step = max(chunk_size // 3, 1) * 4
+        for offset in range(0, len(text), step):
+            decoded = base64.b64decode(text[offset:offset + step])
+            yield decoded if decompressor is None else decompressor.decompress(decoded)
+        if decompressor is not None:
+            yield decompressor.flush()
+
+    @staticmethod
+    def chunks(attachment: Attachment, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        return BinaryStream._chunks(attachment._kp, attachment.id, chunk_size)
+
+    @staticmethod
+    def _digest(database: PyKeePass, binary_id: int) -> str:
+        # kept against the object holding the stored binary, replacing or renumbering binaries can never serve a stale digest
+        source = BinaryStream._source(database, binary_id)
+        digests = BinaryStream._DIGESTS.setdefault(database, {})
+        cached = digests.get(binary_id, None)
+        if cached is not None and cached[0] is source:
+            return cached[1]
+        digest = hashlib.sha256()
+        for chunk in BinaryStream._chunks(database, binary_id):
+            digest.update(chunk)
+        digests[binary_id] = (source, digest.hexdigest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def digest(attachment: Attachment) -> str:
+        return BinaryStream._digest(attachment._kp, attachment.id)
+
+    @staticmethod
+    def find(database: PyKeePass, digest: str) -> Union[int, None]:
+        return next((binary_id for binary_id in range(BinaryStream.count(database)) if BinaryStream._digest(database, binary_id) == digest), None)
+
+    @staticmethod
+    def add(database: PyKeePass, data: bytes, digest: Union[str, None] = None) -> int:
+        # content addressed, a binary already stored is shared instead of being stored again
+        binary_id = BinaryStream.find(database, hashlib.sha256(data).hexdigest() if digest is None else digest)
+        if binary_id is not None:
+            return binary_id
+
+        binary_id = BinaryStream.count(database)
+        if database.version >= (4, 0):
+            database.kdbx.body.payload.inner_header.binary.append(Container(type="binary", data=b"\x01" + data))
+        else:
+            binaries = database._xpath('/KeePassFile/Meta/Binaries', first=True)
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            element = binaries.makeelement("Binary", ID=str(binary_id), Compressed="True")
+            element.text = base64.b64encode(compressor.compress(data) + compressor.flush()).decode()
+            binaries.append(element)
+        return binary_id
+
+    @staticmethod
+    def referenced(database: PyKeePass, excluded: frozenset = frozenset()) -> set:
+        # attachments of entries and of their history both hold references, those held by an excluded entry do not count
+        return set(
+            int(value.get("Ref")) for value in database.tree.xpath("//Entry/Binary/Value[@Ref]")
+            if len(excluded) == 0 or not any(entry in excluded for entry in value.iterancestors("Entry"))
+        )
+
+    @staticmethod
+    def collect(database: PyKeePass, check_mode: bool = False, excluded: frozenset = frozenset()) -> Tuple[int, int]:
+        referenced = BinaryStream.referenced(database, excluded)
+        unreferenced = [binary_id for binary_id in range(BinaryStream.count(database)) if binary_id not in referenced]
+        released = sum(BinaryStream._length(database, binary_id) for binary_id in unreferenced)
+        if not check_mode and database.version >= (4, 0):
+            # highest first, removing a binary renumbers the references above it
+            list(map(lambda binary_id: database.delete_binary(binary_id), reversed(unreferenced)))
+        elif not check_mode:
+            BinaryStream._collect_kdbx3(database, set(unreferenced))
+        return len(unreferenced), released
+
+    # noinspection PyBroadException
+    @staticmethod
+    def decode(possibly_base64_encoded) -> Tuple[bytes, bool]:
+        try:
+            # strict decoding rejects anything outside the alphabet, no need to encode again to compare
+            return base64.b64decode(possibly_base64_encoded, validate=True), True
+        except Exception:
+            return (str(possibly_base64_encoded).encode() if isinstance(possibly_base64_encoded, str) else bytes(possibly_base64_encoded)), False
+
+    @staticmethod
+    def _collect_kdbx3(database: PyKeePass, unreferenced: set):
+        # kdbx 3 binaries are addressed by their ID, the ones kept are numbered afresh and their references with them
+        renumbered = {}
+        for element in database._xpath('/KeePassFile/Meta/Binaries/Binary'):
+            binary_id = int(element.get("ID"))
+            if binary_id in unreferenced:
+                element.getparent().remove(element)
+            else:
+                renumbered[binary_id] = len(renumbered)
+                element.set("ID", str(renumbered[binary_id]))
+        for value in database.tree.xpath("//Entry/Binary/Value[@Ref]"):
+            if int(value.get("Ref")) in renumbered:
+                value.set("Ref", str(renumbered[int(value.get("Ref"))]))
+            else:
+                # an attachment left referring to a removed binary goes with it
+                value.getparent().getparent().remove(value.getparent())
+
+    @staticmethod
+    def file_digest(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Union[str, None]:
+        if not os.path.isfile(filename):
+            return None
+        digest = hashlib.sha256()
+        with open(filename, mode="rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def export(attachment: Attachment, dest: str, check_mode: bool = False) -> Tuple[bool, dict]:
+        dest = os.path.abspath(os.path.expanduser(dest))
+        digest, size = hashlib.sha256(), 0
+        if check_mode:
+            for chunk in BinaryStream.chunks(attachment):
+                digest.update(chunk)
+                size += len(chunk)
+            return BinaryStream.file_digest(dest) != digest.hexdigest(), {"dest": dest, "size": size, "sha256": digest.hexdigest()}
+
+        # stream into a private file beside the destination and only swap it in when the content differs
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(dest), prefix="." + os.path.basename(dest) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, mode="wb") as file:
+                for chunk in BinaryStream.chunks(attachment):
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            changed = BinaryStream.file_digest(dest) != digest.hexdigest()
+            if changed:
+                os.replace(temporary, dest)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return changed, {"dest": dest, "size": size, "sha256": digest.hexdigest()}
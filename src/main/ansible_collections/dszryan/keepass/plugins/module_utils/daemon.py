@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import json
+import os
+import socket
+import struct
+import time
+import traceback
+from datetime import datetime
+from typing import Union, List
+
+from ansible.errors import AnsibleParserError, AnsibleError
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.file_lock import FileLock
+from ansible_collections.dszryan.keepass.plugins.module_utils.run_scope import RUN_SCOPE, RunScope
+from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
+
+
+class Frame(object):
+    _HEADER = struct.Struct(">I")
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, bytes):
+            return {"$bytes": base64.b64encode(value).decode()}
+        if isinstance(value, datetime):
+            return {"$datetime": value.isoformat()}
+        raise TypeError(u"cannot frame %s" % type(value))
+
+    @staticmethod
+    def _decode(value: dict):
+        if list(value.keys()) == ["$bytes"]:
+            return base64.b64decode(value["$bytes"])
+        if list(value.keys()) == ["$datetime"]:
+            return datetime.fromisoformat(value["$datetime"])
+        return value
+
+    @staticmethod
+    def _receive_exactly(connection: socket.socket, length: int) -> Union[bytes, None]:
+        chunks, remaining = [], length
+        while remaining > 0:
+            chunk = connection.recv(min(remaining, 65536))
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    @staticmethod
+    def send(connection: socket.socket, message: dict):
+        payload = json.dumps(message, default=Frame._encode).encode()
+        connection.sendall(Frame._HEADER.pack(len(payload)) + payload)
+
+    @staticmethod
+    def receive(connection: socket.socket) -> Union[dict, None]:
+        header = Frame._receive_exactly(connection, Frame._HEADER.size)
+        if header is None:
+            return None
+        payload = Frame._receive_exactly(connection, Frame._HEADER.unpack(header)[0])
+        return None if payload is None else json.loads(payload.decode(), object_hook=Frame._decode)
+
+
+class KeepassDaemonClient(object):
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path  # type: str
+
+    def _connect(self) -> Union[socket.socket, None]:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            connection.close()
+            return None
+        return connection
+
+    @property
+    def is_available(self) -> bool:
+        connection = self._connect()
+        if connection is None:
+            return False
+        connection.close()
+        return True
+
+    def _request(self, message: dict) -> dict:
+        connection = self._connect()
+        if connection is None:
+            raise AnsibleError(u"keepass daemon is not running - %s" % self.socket_path)
+        with connection:
+            Frame.send(connection, message)
+            response = Frame.receive(connection)
+        if response is None:
+            raise AnsibleError(u"keepass daemon closed the connection - %s" % self.socket_path)
+        if response.get("error", None) is not None:
+            raise AnsibleParserError(AnsibleError(message=response["error"]))
+        return response.get("result", None)
+
+    def execute(self, search: Search, check_mode: bool, fail_silently: bool, updatable: bool, metrics: bool = False) -> dict:
+        return self._request({"method": "execute", "search": search.__dict__, "check_mode": check_mode, "fail_silently": fail_silently, "updatable": updatable, "metrics": metrics})
+
+    def execute_many(self, searches: List[Search], check_mode: bool, fail_silently: bool, updatable: bool, metrics: bool = False) -> List[dict]:
+        return self._request({"method": "execute_many", "searches": [search.__dict__ for search in searches], "check_mode": check_mode, "fail_silently": fail_silently, "updatable": updatable, "metrics": metrics})
+
+    def execute_transaction(self, searches: List[Search], check_mode: bool, updatable: bool, metrics: bool = False) -> List[dict]:
+        return self._request({"method": "execute_transaction", "searches": [search.__dict__ for search in searches], "check_mode": check_mode, "updatable": updatable, "metrics": metrics})
+
+    def bulk_import(self, searches: List[Search], check_mode: bool, updatable: bool, metrics: bool = False) -> dict:
+        return self._request({"method": "bulk_import", "searches": [search.__dict__ for search in searches], "check_mode": check_mode, "updatable": updatable, "metrics": metrics})
+
+    def maintain(self, operation: str, check_mode: bool, updatable: bool, metrics: bool = False) -> dict:
+        return self._request({"method": "maintain", "operation": operation, "check_mode": check_mode, "updatable": updatable, "metrics": metrics})
+
+    def shutdown(self):
+        self._request({"method": "shutdown"})
+
+
+class KeepassDaemon(object):
+    DEFAULT_IDLE_TIMEOUT = 60   # type: int
+    CONNECTION_TIMEOUT = 30     # type: int
+
+    def __init__(self, storage, identity: str, idle_timeout: int = DEFAULT_IDLE_TIMEOUT, run_scope: RunScope = RUN_SCOPE):
+        self._storage = storage                                         # type: KeepassDatabase
+        self.socket_path = KeepassDaemon.socket_location(identity, run_scope)  # type: str
+        self.idle_timeout = idle_timeout                                # type: int
+        self.spawn_lock = FileLock(self.socket_path)                    # type: FileLock
+        self._running = False                                           # type: bool
+
+    @staticmethod
+    def socket_location(identity: str, run_scope: RunScope = RUN_SCOPE) -> str:
+        # unix socket paths are limited to ~108 characters, keep the name short
+        return run_scope.location(identity, ".sock", 32)
+
+    def _handle(self, request: dict) -> dict:
+        if request.get("method", None) == "shutdown":
+            self._running = False
+            return {"result": None}
+        if request.get("method", None) not in ["execute", "execute_many", "execute_transaction", "bulk_import", "maintain"]:
+            return {"error": u"unknown method - %s" % request.get("method", None)}
+
+        # what a request may do is its own, the next request is held to what it was sent with
+        metrics, is_updatable = self._storage.metrics, self._storage.is_updatable
+        try:
+            self._storage.metrics = request.get("metrics", False)
+            self._storage.is_updatable = request["updatable"]
+            self._storage.refresh()
+            if request["method"] == "execute_many":
+                searches = [Search(display=self._storage._display, **search) for search in request["searches"]]
+                return {"result": self._storage.execute_many(searches, request["check_mode"], request["fail_silently"])}
+            if request["method"] == "maintain":
+                return {"result": self._storage.maintain(request["operation"], request["check_mode"])}
+            if request["method"] in ["execute_transaction", "bulk_import"]:
+                searches = [Search(display=self._storage._display, **search) for search in request["searches"]]
+                return {"result": getattr(self._storage, request["method"])(searches, request["check_mode"])}
+            search = Search(display=self._storage._display, **request["search"])
+            return {"result": self._storage.execute(search, request["check_mode"], request["fail_silently"])}
+        except Exception as error:
+            return {"error": traceback.format_exc() if not isinstance(error, AnsibleError) else error.message}
+        finally:
+            self._storage.metrics, self._storage.is_updatable = metrics, is_updatable
+
+    def _serve(self, server: socket.socket):
+        self._running, last_active = True, time.monotonic()
+        server.settimeout(1)
+        while self._running and time.monotonic() - last_active < self.idle_timeout and os.path.exists(self.socket_path):
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                continue
+            with connection:
+                # a client that stalls mid frame is dropped rather than holding up every other fork
+                connection.settimeout(KeepassDaemon.CONNECTION_TIMEOUT)
+                try:
+                    request = Frame.receive(connection)
+                    if request is not None:
+                        Frame.send(connection, self._handle(request))
+                except OSError:
+                    pass
+            last_active = time.monotonic()
+
+    def _bind(self) -> socket.socket:
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(16)
+        return server
+
+    def client(self) -> Union[KeepassDaemonClient, None]:
+        client = KeepassDaemonClient(self.socket_path)
+        with self.spawn_lock:
+            if not client.is_available:
+                self.spawn()
+        return client if client.is_available else None
+
+    def spawn(self):
+        ready_read, ready_write = os.pipe()
+        child = os.fork()
+        if child != 0:
+            os.close(ready_write)
+            with os.fdopen(ready_read, mode="rb") as ready:
+                ready.read(1)
+            os.waitpid(child, 0)
+            return
+
+        # detach twice so the daemon outlives the fork that started it and is never left a zombie
+        try:
+            os.close(ready_read)
+            os.setsid()
+            if os.fork() == 0:
+                # the daemon serves from the tree it inherited and must never route back to itself
+                self._storage.daemon = False
+                with self._bind() as server:
+                    os.write(ready_write, b"1")
+                    os.close(ready_write)
+                    with open(os.devnull, mode="r+b") as devnull:
+                        list(map(lambda descriptor: os.dup2(devnull.fileno(), descriptor), [0, 1, 2]))
+                    # nothing else inherited from the worker, its pipes and locks included, is kept open but the socket
+                    os.closerange(3, server.fileno())
+                    os.closerange(server.fileno() + 1, os.sysconf("SC_OPEN_MAX"))
+                    try:
+                        self._serve(server)
+                    finally:
+                        if os.path.exists(self.socket_path):
+                            os.remove(self.socket_path)
+        finally:
+            os._exit(0)
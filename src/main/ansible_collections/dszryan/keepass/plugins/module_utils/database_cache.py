@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple, Union, AnyStr
+
+from pykeepass import PyKeePass
+
+
+class DatabaseCache(object):
+    DEFAULT_TTL = 300       # type: int
+    DEFAULT_SIZE = 8        # type: int
+
+    def __init__(self, size: int = DEFAULT_SIZE):
+        self.size = size                    # type: int
+        self._handles = OrderedDict()       # type: OrderedDict
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _fingerprint(keyfile: Union[AnyStr, None], password: Union[AnyStr, None], transformed_key: Union[AnyStr, None]) -> str:
+        digest = hashlib.sha256()
+        for part in [password, keyfile, transformed_key]:
+            digest.update(b"\x00" if part is None else b"\x01" + (part.encode() if isinstance(part, str) else bytes(part)))
+        if keyfile is not None:
+            with open(keyfile, mode="rb") as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def version(filename: str) -> Tuple:
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @staticmethod
+    def key(filename: str, keyfile: Union[AnyStr, None], password: Union[AnyStr, None], transformed_key: Union[AnyStr, None]) -> Tuple:
+        return (filename, ) + DatabaseCache.version(filename) + (DatabaseCache._fingerprint(keyfile, password, transformed_key), )
+
+    def get(self, key: Tuple, ttl: int) -> Union[PyKeePass, None]:
+        with self._lock:
+            cached = self._handles.get(key, None)
+            if cached is None:
+                return None
+            if ttl <= 0 or time.monotonic() - cached[0] > ttl:
+                self._handles.pop(key, None)
+                return None
+            self._handles.move_to_end(key)
+            return cached[1]
+
+    def put(self, key: Tuple, database: PyKeePass, ttl: int):
+        if ttl <= 0:
+            return
+        with self._lock:
+            # a file only ever has one live version, drop handles for the superseded ones
+            list(map(lambda stale: self._handles.pop(stale, None), [cached for cached in self._handles.keys() if cached[0] == key[0] and cached[1:4] != key[1:4]]))
+            self._handles[key] = (time.monotonic(), database)
+            self._handles.move_to_end(key)
+            while len(self._handles) > self.size:
+                self._handles.popitem(last=False)
+
+    def discard(self, key: Union[Tuple, None]):
+        with self._lock:
+            self._handles.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+
+DATABASE_CACHE = DatabaseCache()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import threading
+import uuid
+import weakref
+from typing import Iterator, Tuple, Union
+
+from pykeepass import PyKeePass
+from pykeepass.entry import Entry
+from pykeepass.group import Group
+
+
+class DatabaseIndex(object):
+    _INDEXES = weakref.WeakKeyDictionary()     # type: weakref.WeakKeyDictionary
+    _INDEXES_LOCK = threading.Lock()
+
+    def __init__(self, database: PyKeePass):
+        self._database = database       # type: PyKeePass
+        self._entries_by_path = None    # type: Union[dict, None]
+        self._entries_by_uuid = None    # type: Union[dict, None]
+        self._groups_by_path = None     # type: Union[dict, None]
+        self._duplicates = set()        # type: set
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def of(database: PyKeePass) -> "DatabaseIndex":
+        with DatabaseIndex._INDEXES_LOCK:
+            index = DatabaseIndex._INDEXES.get(database, None)
+            if index is None:
+                index = DatabaseIndex._INDEXES[database] = DatabaseIndex(database)
+            return index
+
+    @staticmethod
+    def _string_field(element, key: str) -> Union[str, None]:
+        for string in element.iterfind("String"):
+            if string.findtext("Key") == key:
+                return string.findtext("Value")
+        return None
+
+    @staticmethod
+    def _uuid(element) -> uuid.UUID:
+        return uuid.UUID(bytes=base64.b64decode(element.findtext("UUID")))
+
+    @staticmethod
+    def _join(group_path: str, name: str) -> str:
+        return name if group_path == "" else group_path + "/" + name
+
+    def _index_entry(self, group_path: str, element):
+        path = DatabaseIndex._join(group_path, DatabaseIndex._string_field(element, "Title") or "")
+        if path in self._entries_by_path and self._entries_by_path[path] is not element:
+            self._duplicates.add(path)
+        self._entries_by_path.setdefault(path, element)
+        self._entries_by_uuid.setdefault(DatabaseIndex._uuid(element), element)
+
+    def _build(self):
+        with self._lock:
+            if self._entries_by_path is not None:
+                return
+            self._entries_by_path, self._entries_by_uuid, self._groups_by_path, self._duplicates = {}, {}, {}, set()
+            root = self._database.tree.getroot().find("Root/Group")
+            # walk in document order so the first match wins, as it does for the xpath searches
+            stack = [(root, "")]
+            while stack:
+                group, group_path = stack.pop()
+                self._groups_by_path.setdefault(group_path, group)
+                list(map(lambda element: self._index_entry(group_path, element), group.iterfind("Entry")))
+                stack.extend(reversed([(child, DatabaseIndex._join(group_path, child.findtext("Name") or "")) for child in group.iterfind("Group")]))
+
+    def invalidate(self):
+        with self._lock:
+            self._entries_by_path, self._entries_by_uuid, self._groups_by_path = None, None, None
+
+    def find_entry_by_path(self, path: str) -> Union[Entry, None]:
+        self._build()
+        element = self._entries_by_path.get(path.strip("/"), None)
+        return Entry(element=element, kp=self._database) if element is not None else None
+
+    def find_entry_by_uuid(self, entry_uuid: uuid.UUID) -> Union[Entry, None]:
+        self._build()
+        element = self._entries_by_uuid.get(entry_uuid, None)
+        return Entry(element=element, kp=self._database) if element is not None else None
+
+    def entries(self) -> Iterator[Tuple[str, Entry]]:
+        # each path once, the entry a search on it would find
+        self._build()
+        with self._lock:
+            elements = list(self._entries_by_path.items())
+        return ((path, Entry(element=element, kp=self._database)) for path, element in elements)
+
+    def find_group_by_path(self, path: str) -> Union[Group, None]:
+        self._build()
+        element = self._groups_by_path.get(path.strip("/"), None)
+        return Group(element=element, kp=self._database) if element is not None else None
+
+    def add_group(self, group: Group):
+        self._build()
+        with self._lock:
+            self._groups_by_path.setdefault(group.path.strip("/"), group._element)
+
+    def add_entry(self, entry: Entry):
+        self._build()
+        with self._lock:
+            self._index_entry(entry.group.path.strip("/"), entry._element)
+
+    def remove_entry(self, entry: Entry):
+        # called before the entry leaves the tree, its path is derived from its ancestors
+        self._build()
+        with self._lock:
+            path = entry.path.strip("/")
+            if path in self._duplicates:
+                # another entry shares the path and has to take its place, rebuild from the tree
+                self.invalidate()
+                return
+            self._entries_by_path.pop(path, None)
+            self._entries_by_uuid.pop(DatabaseIndex._uuid(entry._element), None)
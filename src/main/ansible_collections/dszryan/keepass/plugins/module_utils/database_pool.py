@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Union
+
+from ansible.errors import AnsibleParserError
+from ansible.utils.display import Display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
+
+
+class DatabasePool(object):
+    # each database is opened and queried on its own thread, only an argon2 key derivation releases the gil and
+    # so overlaps, aes-kdf is pure python in pykeepass and would need a process pool to run side by side
+    MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)    # type: int
+
+    def __init__(self, display: Display, databases: dict, max_workers: Union[int, None] = None):
+        self._display = display                                         # type: Display
+        self._databases = databases                                     # type: dict
+        self._max_workers = max_workers or DatabasePool.MAX_WORKERS     # type: int
+
+    def _execute(self, name: str, searches: List[Search], check_mode: bool, fail_silently: bool) -> List[dict]:
+        # forking a daemon from a worker thread could leave the child holding a lock another thread took, only the main thread spawns one
+        details = self._databases[name] if threading.current_thread() is threading.main_thread() else dict(self._databases[name], daemon=False)
+        return KeepassDatabase(self._display, details).execute_many(searches, check_mode, fail_silently)
+
+    def execute_many(self, searches: List[Tuple[str, Search]], check_mode: bool, fail_silently: bool) -> List[dict]:
+        # searches are grouped per database, the results are returned in the order of the searches
+        grouped = {}
+        for position, (name, search) in enumerate(searches):
+            if self._databases.get(name, None) is None:
+                raise AnsibleParserError(u"Invalid query - no database given" if name is None else u"Invalid query - no database named '%s'" % name)
+            grouped.setdefault(name, []).append((position, search))
+
+        if len(grouped) <= 1 or self._max_workers <= 1:
+            executed = {name: self._execute(name, [search for position, search in group], check_mode, fail_silently) for name, group in grouped.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(grouped), self._max_workers), thread_name_prefix="keepass") as executor:
+                futures = {name: executor.submit(self._execute, name, [search for position, search in group], check_mode, fail_silently) for name, group in grouped.items()}
+                executed = {name: future.result() for name, future in futures.items()}
+
+        results = [None] * len(searches)
+        for name, group in grouped.items():
+            for (position, search), result in zip(group, executed[name]):
+                results[position] = result
+        return results
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import os
+from typing import Union
+
+from pykeepass.entry import Entry
+
+from ansible_collections.dszryan.keepass.plugins.module_utils import EntryDump
+from ansible_collections.dszryan.keepass.plugins.module_utils.binary_stream import BinaryStream
+
+
+class EntryDiff(object):
+    MASK = "********"   # type: str
+    STRINGS = {"title": "Title", "username": "UserName", "url": "URL", "notes": "Notes"}   # type: dict
+
+    # what a put/post/del would change on an entry, worked out in one pass over the request and never applied
+    def __init__(self, path: str, entry: Union[Entry, None]):
+        self.path = path                # type: str
+        self.entry = entry              # type: Union[Entry, None]
+        self.fields = {}                # type: dict
+        self.custom_properties = {}     # type: dict
+        self.attachments = {}           # type: dict
+        self.deleted = None             # type: Union[dict, None]
+        # the strings kept protected in the database, the password always is
+        self.protected = set() if entry is None else set(entry._element.xpath("String[Value/@Protected]/Key/text()"))  # type: set
+
+    @staticmethod
+    def _field_differs(entry: Union[Entry, None], key: str, value) -> bool:
+        if entry is None:
+            return True
+        return getattr(entry, key, None) != value or (key in ["username", "password"] and getattr(entry, key, "") != ("" if value is None else value))
+
+    @staticmethod
+    def attachment(entry: Union[Entry, None], filename: str):
+        return None if entry is None else ([attachment for attachment in entry.attachments if attachment.filename == filename] or [None])[0]
+
+    @staticmethod
+    def _plain(value):
+        return value if value is None or isinstance(value, (str, int, float, bool, list, dict)) else str(value)
+
+    @staticmethod
+    def _masked(value):
+        # the diff is printed to the console, a secret only shows whether it is set
+        return value if value is None or value == "" else EntryDiff.MASK
+
+    def _shown(self, key: str, value, custom: bool = False):
+        protected = key in self.protected if custom else key == "password" or EntryDiff.STRINGS.get(key, None) in self.protected
+        return EntryDiff._masked(value) if protected else EntryDiff._plain(value)
+
+    @staticmethod
+    def upsert(path: str, entry: Union[Entry, None], value: dict) -> "EntryDiff":
+        diff = EntryDiff(path, entry)
+        for key, item in value.items():
+            if key == "attachments":
+                for attachment in item:
+                    filename, source = attachment.get("filename", None), attachment.get("src", None)
+                    if source is not None:
+                        # a file on the controller is only hashed here, it is read in full when it has to be stored
+                        source = os.path.expanduser(source)
+                        filename = filename or os.path.basename(source)
+                        binary, digest = None, BinaryStream.file_digest(source)
+                        if digest is None:
+                            raise AttributeError(u"Invalid query - attachment src not found - %s" % source)
+                    else:
+                        binary = BinaryStream.decode(attachment["binary"])[0]
+                        digest = hashlib.sha256(binary).hexdigest()
+                    existing = EntryDiff.attachment(entry, filename)
+                    before = None if existing is None else BinaryStream.digest(existing)
+                    if before != digest:
+                        diff.attachments[filename] = (before, digest, binary, source)
+            elif hasattr(Entry, key):
+                if EntryDiff._field_differs(entry, key, item):
+                    diff.fields[key] = (None if entry is None else getattr(entry, key, None), item)
+            elif entry is None or key not in entry.custom_properties.keys() or entry.custom_properties.get(key, None) != item:
+                diff.custom_properties[key] = (None if entry is None else entry.custom_properties.get(key, None), item)
+        return diff
+
+    @staticmethod
+    def delete(path: str, entry: Entry, field: Union[str, None]) -> "EntryDiff":
+        diff = EntryDiff(path, entry)
+        if field is None:
+            # taken before the entry is removed from the tree
+            diff.deleted = {key: diff._shown(key, value) for key, value in EntryDump(entry).__dict__.items()}
+            if diff.deleted.get("custom_properties", None) is not None:
+                diff.deleted["custom_properties"] = {key: diff._shown(key, value, custom=True) for key, value in diff.deleted["custom_properties"].items()}
+        elif hasattr(entry, field):
+            cleared = "" if field in ["username", "password"] else None
+            if getattr(entry, field, None) != cleared:
+                diff.fields[field] = (getattr(entry, field, None), cleared)
+        elif field in entry.custom_properties.keys():
+            diff.custom_properties[field] = (entry.custom_properties[field], None)
+        else:
+            attachment = EntryDiff.attachment(entry, field)
+            if attachment is None:
+                raise AttributeError(u"No property/file found")
+            diff.attachments[field] = (BinaryStream.digest(attachment), None, None, None)
+        return diff
+
+    @property
+    def created(self) -> bool:
+        return self.entry is None
+
+    @property
+    def changed(self) -> bool:
+        return self.created or self.deleted is not None or len(self.fields) + len(self.custom_properties) + len(self.attachments) > 0
+
+    def _side(self, side: int) -> dict:
+        # attachments are compared by the sha256 digest of their content, secrets are masked
+        described = {key: self._shown(key, change[side]) for key, change in self.fields.items()}
+        if len(self.custom_properties) > 0:
+            described["custom_properties"] = {key: self._shown(key, change[side], custom=True) for key, change in self.custom_properties.items()}
+        if len(self.attachments) > 0:
+            described["attachments"] = {filename: change[side] for filename, change in self.attachments.items()}
+        return described
+
+    def diff(self) -> dict:
+        # in the form ansible renders for --diff
+        if self.deleted is not None:
+            before, after = self.deleted, {}
+        elif self.created:
+            before, after = {}, dict(self._side(1), path=self.path)
+        else:
+            before, after = self._side(0), self._side(1)
+        return {"before": before, "after": after, "before_header": self.path, "after_header": self.path}
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fcntl
+import os
+import threading
+from typing import Union, IO
+
+
+class FileLock(object):
+    def __init__(self, filename: str):
+        # the database itself is replaced on every save, so the lock lives in a stable file beside it
+        self.location = filename + ".lock"  # type: str
+        self._file = None                   # type: Union[IO, None]
+        self._depth = 0                     # type: int
+        self._lock = threading.RLock()
+
+    @property
+    def is_held(self) -> bool:
+        return self._depth > 0
+
+    def __enter__(self) -> "FileLock":
+        self._lock.acquire()
+        if self._depth == 0:
+            descriptor = os.open(self.location, os.O_RDWR | os.O_CREAT, 0o600)
+            self._file = os.fdopen(descriptor, mode="r+b")
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                self._file.close()
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple, Union
+
+from lxml import etree
+from pykeepass import PyKeePass
+from pykeepass.entry import Entry
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.binary_stream import BinaryStream
+
+
+class HistoryRetention(object):
+    # None leaves that limit unbounded, the newest history items are the ones kept
+    def __init__(self, max_items: Union[int, None] = None, max_age: Union[int, None] = None, max_bytes: Union[int, None] = None):
+        self.max_items = HistoryRetention._limit("history_max_items", max_items)    # type: Union[int, None]
+        self.max_age = HistoryRetention._limit("history_max_age", max_age)          # type: Union[int, None]
+        self.max_bytes = HistoryRetention._limit("history_max_bytes", max_bytes)    # type: Union[int, None]
+
+    @staticmethod
+    def _limit(name: str, limit) -> Union[int, None]:
+        # a templated value may arrive as a string
+        if limit is None or (isinstance(limit, int) and not isinstance(limit, bool) and limit >= 0):
+            return limit
+        if isinstance(limit, str) and limit.isdigit():
+            return int(limit)
+        raise AttributeError(u"Invalid database - %s must be a whole number, not %s" % (name, limit))
+
+    @staticmethod
+    def of(database: PyKeePass) -> "HistoryRetention":
+        # the limits keepass itself applies, kept in the database's meta data, -1 is unbounded
+        limits = [database.tree.findtext("Meta/" + name) for name in ["HistoryMaxItems", "HistoryMaxSize"]]
+        max_items, max_bytes = [None if limit in [None, ""] or int(limit) < 0 else int(limit) for limit in limits]
+        return HistoryRetention(max_items=max_items, max_bytes=max_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items is not None or self.max_age is not None or self.max_bytes is not None
+
+    @staticmethod
+    def size(item: Entry) -> int:
+        return len(etree.tostring(item._element)) + sum(BinaryStream.length(attachment) for attachment in item.attachments)
+
+    def expired(self, entry: Entry, now: datetime) -> List[Entry]:
+        # history is kept oldest first, once an item is beyond a limit so is every older one
+        history, kept, kept_bytes = entry.history or [], 0, 0
+        oldest = None if self.max_age is None else now - timedelta(days=self.max_age)
+        for position, item in enumerate(reversed(history)):
+            kept_bytes += HistoryRetention.size(item) if self.max_bytes is not None else 0
+            if (self.max_items is not None and kept >= self.max_items) or \
+                    (oldest is not None and item.mtime is not None and item.mtime < oldest) or \
+                    (self.max_bytes is not None and kept_bytes > self.max_bytes):
+                return history[:len(history) - position]
+            kept += 1
+        return []
+
+    def prune(self, entry: Entry, now: Union[datetime, None] = None, check_mode: bool = False) -> Tuple[List[Entry], int]:
+        expired = self.expired(entry, now or datetime.now(timezone.utc))
+        released = sum(len(etree.tostring(item._element)) for item in expired)
+        if not check_mode:
+            list(map(lambda item: item._element.getparent().remove(item._element), expired))
+        return expired, released
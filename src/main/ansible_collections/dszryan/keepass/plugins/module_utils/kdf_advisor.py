@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import time
+from typing import Union
+
+import argon2
+from construct import Container
+from pykeepass import PyKeePass
+from pykeepass.kdbx_parsing.common import aes_kdf
+from pykeepass.kdbx_parsing.kdbx import KDBX
+from pykeepass.kdbx_parsing.kdbx4 import kdf_uuids
+
+
+class KdfAdvisor(object):
+    DEFAULT_TARGET_MS = 1000            # type: int
+    TOLERANCE = 0.25                    # type: float
+    MIN_MEMORY = 1048576                # type: int
+
+    def __init__(self, target_ms: Union[int, None] = DEFAULT_TARGET_MS):
+        # a templated value may arrive as a string
+        if isinstance(target_ms, str) and target_ms.isdigit():
+            target_ms = int(target_ms)
+        if not isinstance(target_ms, int) or isinstance(target_ms, bool) or target_ms <= 0:
+            raise AttributeError(u"Invalid database - kdf_target_ms must be a whole number above zero, not %s" % target_ms)
+        self.target_ms = target_ms      # type: int
+
+    @staticmethod
+    def _kdf(header: Container) -> dict:
+        # kdbx 3 only knows aes-kdf, its rounds are held in the header itself
+        dynamic_header = header.dynamic_header
+        if header.major_version == 3:
+            return {"type": "aeskdf", "iterations": dynamic_header.transform_rounds.data, "memory": None, "parallelism": None}
+        parameters = dynamic_header.kdf_parameters.data.dict
+        if parameters["$UUID"].value == kdf_uuids["argon2"]:
+            return {"type": "argon2", "iterations": parameters["I"].value, "memory": parameters["M"].value, "parallelism": parameters["P"].value, "version": parameters["V"].value}
+        if parameters["$UUID"].value == kdf_uuids["aeskdf"]:
+            return {"type": "aeskdf", "iterations": parameters["R"].value, "memory": None, "parallelism": None}
+        raise AttributeError(u"Invalid database - unknown key derivation function %s" % parameters["$UUID"].value.hex())
+
+    @staticmethod
+    def header(filename: str) -> dict:
+        # only the unencrypted header is read, neither the credentials nor the key derivation are needed
+        with open(filename, mode="rb") as file:
+            header = KDBX.header.parse_stream(file).value
+        return {
+            "version": u"%d.%d" % (header.major_version, header.minor_version),
+            "cipher": header.dynamic_header.cipher_id.data,
+            "compression": header.dynamic_header.compression_flags.data.compression,
+            "kdf": KdfAdvisor._kdf(header)
+        }
+
+    @staticmethod
+    def measure(kdf: dict) -> float:
+        # the cost of a derivation does not depend on the key or the seed, random ones are as good as the real ones
+        started = time.perf_counter()
+        if kdf["type"] == "argon2":
+            argon2.low_level.hash_secret_raw(
+                secret=os.urandom(32),
+                salt=os.urandom(32),
+                hash_len=32,
+                type=argon2.low_level.Type.D,
+                time_cost=kdf["iterations"],
+                memory_cost=kdf["memory"] // 1024,
+                parallelism=kdf["parallelism"],
+                version=kdf.get("version", 19))
+        else:
+            aes_kdf(os.urandom(32), kdf["iterations"], os.urandom(32))
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def recommend(self, kdf: dict, measured_ms: float) -> dict:
+        # the cost grows with the iterations, when a single one is too slow the memory is cut instead
+        per_iteration = max(measured_ms, 0.1) / kdf["iterations"]
+        iterations = max(1, int(kdf["iterations"] * self.target_ms / max(measured_ms, 0.1)))
+        memory = kdf["memory"]
+        if kdf["type"] == "argon2" and per_iteration > self.target_ms:
+            memory = max(KdfAdvisor.MIN_MEMORY, int(memory * self.target_ms / per_iteration) // KdfAdvisor.MIN_MEMORY * KdfAdvisor.MIN_MEMORY)
+        predicted = per_iteration * iterations * (memory / kdf["memory"] if kdf["type"] == "argon2" else 1)
+        return dict(kdf, iterations=iterations, memory=memory, predicted_ms=round(predicted, 1))
+
+    def on_target(self, measured_ms: float) -> bool:
+        # timings vary from run to run, close enough is left alone so that re-keying settles
+        return abs(measured_ms - self.target_ms) <= self.target_ms * KdfAdvisor.TOLERANCE
+
+    def report(self, filename: str) -> dict:
+        header = KdfAdvisor.header(filename)
+        measured = KdfAdvisor.measure(header["kdf"])
+        return dict(header, target_ms=self.target_ms, measured_ms=measured, on_target=self.on_target(measured), recommended=self.recommend(header["kdf"], measured))
+
+    @staticmethod
+    def apply(database: PyKeePass, kdf: dict):
+        # a fresh seed goes with the new parameters, the header is rebuilt from its values when next saved
+        header = database.kdbx.header.value
+        if header.major_version == 3:
+            header.dynamic_header.transform_rounds.data = kdf["iterations"]
+            header.dynamic_header.transform_seed.data = os.urandom(32)
+        else:
+            parameters = header.dynamic_header.kdf_parameters.data.dict
+            parameters["R" if kdf["type"] == "aeskdf" else "I"].value = kdf["iterations"]
+            if kdf["type"] == "argon2":
+                parameters["M"].value, parameters["P"].value = kdf["memory"], kdf["parallelism"]
+            parameters["S"].value = os.urandom(32)
+        del database.kdbx.header.data
+
+    @staticmethod
+    def build(database: PyKeePass) -> bytes:
+        # built in memory, the header is read back from the stream while it is built, the key is derived for its new parameters
+        return KDBX.build(database.kdbx, password=database.password, keyfile=database.keyfile, transformed_key=None)
@@ -3,11 +3,13 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import base64
-import inspect
 import os
+import re
+import tempfile
 import traceback
-import uuid
-from typing import Tuple, Union, AnyStr
+from datetime import datetime, timezone
+from contextlib import contextmanager, nullcontext
+from typing import Tuple, Union, AnyStr, List
 
 from ansible.errors import AnsibleParserError, AnsibleError
 from ansible.module_utils.common.text.converters import to_native
@@ -15,66 +17,297 @@ from ansible.utils.display import Display
 from pykeepass import PyKeePass
 from pykeepass.attachment import Attachment
 from pykeepass.entry import Entry
+from pykeepass.exceptions import CredentialsError
 from pykeepass.group import Group
 
 from ansible_collections.dszryan.keepass.plugins.module_utils import EntryDump, Result
+from ansible_collections.dszryan.keepass.plugins.module_utils.binary_stream import BinaryStream
+from ansible_collections.dszryan.keepass.plugins.module_utils.daemon import KeepassDaemon, KeepassDaemonClient
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE, DatabaseCache
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_index import DatabaseIndex
+from ansible_collections.dszryan.keepass.plugins.module_utils.entry_diff import EntryDiff
+from ansible_collections.dszryan.keepass.plugins.module_utils.file_lock import FileLock
+from ansible_collections.dszryan.keepass.plugins.module_utils.history_retention import HistoryRetention
+from ansible_collections.dszryan.keepass.plugins.module_utils.kdf_advisor import KdfAdvisor
+from ansible_collections.dszryan.keepass.plugins.module_utils.key_cache import TRANSFORMED_KEY_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import Log
+from ansible_collections.dszryan.keepass.plugins.module_utils.metrics import Metrics, NO_METRICS
+from ansible_collections.dszryan.keepass.plugins.module_utils.path_pattern import PathPattern
+from ansible_collections.dszryan.keepass.plugins.module_utils.reference_resolver import ReferenceResolver
 from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
+from ansible_collections.dszryan.keepass.plugins.module_utils.snapshot import SNAPSHOT_CACHE, Snapshot
 
 
 class KeepassDatabase(object):
+    MAINTENANCE = ["collect_binaries", "compact", "kdf", "rekey", "snapshot"]  # type: List[str]
+    READ_MAINTENANCE = ["kdf", "snapshot"]                      # type: List[str]
+    SNAPSHOT_FIELDS = ("title", "username", "password", "url", "notes")   # type: tuple
+
     def __init__(self, display: Display, details: dict):
         self._display = display                                         # type: Display
+        self._log = Log(display)                                        # type: Log
         self.location = details.get("location", None)                   # type: Union[AnyStr, None]
         self.keyfile = details.get("keyfile", None)                     # type: Union[AnyStr, None]
         self.password = details.get("password", None)                   # type: Union[AnyStr, None]
         self.transformed_key = details.get("transformed_key", None)     # type: Union[AnyStr, None]
         self.is_updatable = details.get("updatable", False)             # type: bool
-        self._database = self._open()                                   # type: PyKeePass
+        self.cache_ttl = details.get("cache_ttl", DatabaseCache.DEFAULT_TTL)  # type: int
+        self.cache_transformed_key = details.get("cache_transformed_key", False)  # type: bool
+        self.daemon = details.get("daemon", False)                      # type: bool
+        self.daemon_idle_timeout = details.get("daemon_idle_timeout", KeepassDaemon.DEFAULT_IDLE_TIMEOUT)  # type: int
+        self.concurrency = details.get("concurrency", "lock")           # type: str
+        self.metrics = details.get("metrics", False)                    # type: bool
+        self._recorded = Metrics()                                      # type: Metrics
+        self._cache_key = None                                          # type: Union[tuple, None]
+        self._client = None                                             # type: Union[KeepassDaemonClient, None]
+        self._snapshot = None                                           # type: Union[Snapshot, None]
+        self._resolved_entries = None                                   # type: Union[dict, None]
+        self._diff = None                                               # type: Union[EntryDiff, None]
+        self._in_transaction = False                                    # type: bool
+        self._save_deferred = False                                     # type: bool
+        self._dirty = False                                             # type: bool
+        self._pending = []                                              # type: List[Search]
+        self._file_lock = None                                          # type: Union[FileLock, None]
+        self._database = None                                           # type: Union[PyKeePass, None]
+        if self.concurrency not in ["lock", "optimistic"]:
+            raise AnsibleParserError(u"invalid concurrency - %s" % self.concurrency)
+        try:
+            self.history = HistoryRetention(details.get("history_max_items", None), details.get("history_max_age", None), details.get("history_max_bytes", None))  # type: HistoryRetention
+            self.key_derivation = KdfAdvisor(details.get("kdf_target_ms", KdfAdvisor.DEFAULT_TARGET_MS))  # type: KdfAdvisor
+        except AttributeError as error:
+            raise AnsibleParserError(to_native(error))
+        with self._metrics.timed("open"):
+            self._database = self._open()
+
+    @property
+    def _metrics(self) -> Metrics:
+        return self._recorded if self.metrics else NO_METRICS
 
-    def _open(self) -> PyKeePass:
+    @property
+    def _key_identity(self) -> str:
+        return u"%s:%s" % (self._cache_key[0], self._cache_key[4])
+
+    def _open(self, snapshot: bool = True) -> PyKeePass:
         if self.location is None or not os.path.isfile(os.path.realpath(os.path.expanduser(os.path.expandvars(self.location)))):
             raise AnsibleParserError(u"could not find keepass database - %s" % self.location)
-        self._display.v(u"Keepass: database found - %s" % self.location)
+        self._log.v(u"Keepass: database found - %s", self.location)
 
         if self.keyfile is not None:
             if not os.path.isfile(os.path.realpath(os.path.expanduser(os.path.expandvars(self.keyfile)))):
                 raise AnsibleParserError(u"could not find keyfile - %s" % self.keyfile)
-            self._display.vvv(u"Keepass: keyfile found - %s" % self.keyfile)
+            self._log.vvv(u"Keepass: keyfile found - %s", self.keyfile)
 
-        database = PyKeePass(
-            filename=os.path.realpath(os.path.expanduser(os.path.expandvars(self.location))),
-            keyfile=(os.path.realpath(os.path.expanduser(os.path.expandvars(self.keyfile))) if self.keyfile is not None else None),
-            password=self.password,
-            transformed_key=self.transformed_key)
-        self._display.v(u"Keepass: database opened - %s" % self.location)
+        filename = os.path.realpath(os.path.expanduser(os.path.expandvars(self.location)))
+        keyfile = os.path.realpath(os.path.expanduser(os.path.expandvars(self.keyfile))) if self.keyfile is not None else None
+        self._cache_key = DatabaseCache.key(filename, keyfile, self.password, self.transformed_key)
+        if snapshot:
+            self._snapshot = SNAPSHOT_CACHE.get(self._key_identity, self._cache_key[1:4])
+            if self._snapshot is not None:
+                self._log.v(u"Keepass: database served by snapshot - %s", self.location)
+                return None
+        if self.daemon and self._client is None and self._database is None:
+            daemon = KeepassDaemon(self, self._key_identity, self.daemon_idle_timeout)
+            client = KeepassDaemonClient(daemon.socket_path)
+            if not client.is_available:
+                # forks starting together wait for the first one to open the database and spawn the daemon, then use it
+                with daemon.spawn_lock:
+                    if not client.is_available:
+                        # the daemon is forked from this process and so inherits the database opened here
+                        self._database = self._open_file(filename, keyfile)
+                        self._client = daemon.client()
+                        return self._database
+            self._log.v(u"Keepass: database served by daemon - %s", self.location)
+            self._client = client
+            return None
+        return self._open_file(filename, keyfile)
+
+    def _open_file(self, filename: str, keyfile: Union[str, None]) -> PyKeePass:
+        database = DATABASE_CACHE.get(self._cache_key, self.cache_ttl)
+        self._metrics.count("database_cache_hit" if database is not None else "database_cache_miss")
+        if database is not None:
+            self._file_lock = FileLock(filename)
+            self._log.v(u"Keepass: database opened (cached) - %s", self.location)
+            return database
+
+        cached_transformed_key = TRANSFORMED_KEY_CACHE.get(self._key_identity) if self.cache_transformed_key and self.transformed_key is None else None
+        if self.cache_transformed_key and self.transformed_key is None:
+            self._metrics.count("transformed_key_cache_hit" if cached_transformed_key is not None else "transformed_key_cache_miss")
+        try:
+            database = PyKeePass(
+                filename=filename,
+                keyfile=keyfile,
+                password=self.password,
+                transformed_key=self.transformed_key if cached_transformed_key is None else cached_transformed_key)
+        except CredentialsError:
+            if cached_transformed_key is None:
+                raise
+            # the database was re-keyed since the key was derived, derive it again
+            self._log.vvv(u"Keepass: cached transformed key rejected - %s", self.location)
+            TRANSFORMED_KEY_CACHE.discard(self._key_identity)
+            cached_transformed_key = None
+            database = PyKeePass(
+                filename=filename,
+                keyfile=keyfile,
+                password=self.password,
+                transformed_key=self.transformed_key)
+        if self.cache_transformed_key and self.transformed_key is None and cached_transformed_key is None:
+            TRANSFORMED_KEY_CACHE.put(self._key_identity, database.transformed_key)
+        DATABASE_CACHE.put(self._cache_key, database, self.cache_ttl)
+        self._file_lock = FileLock(filename)
+        self._log.v(u"Keepass: database opened - %s", self.location)
 
         return database
 
-    # noinspection PyBroadException
+    def _materialise(self):
+        # the snapshot only answers reads of what it holds, anything else needs the database itself
+        if self._snapshot is not None:
+            self._snapshot = None
+            with self._metrics.timed("open"):
+                self._database = self._open(snapshot=False)
+
+    @property
+    def _index(self) -> DatabaseIndex:
+        return DatabaseIndex.of(self._database)
+
+    @property
+    def _references(self) -> ReferenceResolver:
+        return ReferenceResolver.of(self._database)
+
+    @property
+    def _is_stale(self) -> bool:
+        return DatabaseCache.version(self._cache_key[0]) != self._cache_key[1:4]
+
+    def refresh(self):
+        if self._is_stale:
+            if self._snapshot is not None:
+                self._materialise()
+            else:
+                self._reload()
+
     @staticmethod
     def _get_binary(possibly_base64_encoded) -> Tuple[bytes, bool]:
-        return_value, was_encoded = (None, None)
-        try:
-            binary_stream = base64.b64decode(possibly_base64_encoded)
-            if base64.b64encode(binary_stream) == possibly_base64_encoded:
-                return_value, was_encoded = binary_stream, True
-        except Exception:
-            return_value, was_encoded = (str(possibly_base64_encoded).encode() if isinstance(possibly_base64_encoded, str) else bytes(possibly_base64_encoded), False)
-        return return_value, was_encoded
+        return BinaryStream.decode(possibly_base64_encoded)
 
     def _save(self):
-        self._database.save()
-        self._display.v(u"Keepass: database saved - %s" % self.location)
+        if self._in_transaction:
+            self._save_deferred = True
+            return
+        with self._file_lock, self._metrics.timed("save"):
+            if self._is_stale:
+                self._replay()
+                if not self._dirty:
+                    # another writer already saved the very same changes, there is nothing left to write
+                    self._pending = []
+                    self._metrics.count("save_skipped")
+                    self._log.v(u"Keepass: database unchanged, not saved - %s", self.location)
+                    return
+            self._replace_file()
+            # the version written here, once the lock is released another writer may already have replaced it
+            saved = DatabaseCache.key(self._database.filename, self._database.keyfile, self.password, self.transformed_key)
+        self._pending, self._dirty = [], False
+        DATABASE_CACHE.discard(self._cache_key)
+        SNAPSHOT_CACHE.discard(self._key_identity)
+        self._cache_key = saved
+        DATABASE_CACHE.put(self._cache_key, self._database, self.cache_ttl)
+        self._log.v(u"Keepass: database saved - %s", self.location)
+
+    def _replace_file(self, rekey: bool = False):
+        # write beside the live file and swap it in, readers only ever see a complete file
+        filename = self._database.filename
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(filename), prefix="." + os.path.basename(filename) + ".", suffix=".tmp")
+        try:
+            os.close(descriptor)
+            if rekey:
+                with open(temporary, mode="wb") as file:
+                    file.write(KdfAdvisor.build(self._database))
+            else:
+                # the header, and so its seeds, are written back as they were read, the key derived on open still applies
+                self._database.save(filename=temporary, transformed_key=self._database.transformed_key)
+            with open(temporary, mode="rb") as file:
+                os.fsync(file.fileno())
+            os.chmod(temporary, os.stat(filename).st_mode & 0o7777)
+            os.replace(temporary, filename)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        directory = os.open(os.path.dirname(filename), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _reload(self):
+        # read the file as it is on disk now, reusing the key already derived unless the database was re-keyed
+        DATABASE_CACHE.discard(self._cache_key)
+        # the version is taken before reading, a write landing while parsing then shows as stale
+        reloaded = DatabaseCache.key(self._database.filename, self._database.keyfile, self.password, self.transformed_key)
+        with self._metrics.timed("open"):
+            try:
+                database = PyKeePass(
+                    filename=self._database.filename,
+                    keyfile=self._database.keyfile,
+                    password=self.password,
+                    transformed_key=self._database.transformed_key)
+            except CredentialsError:
+                database = PyKeePass(
+                    filename=self._database.filename,
+                    keyfile=self._database.keyfile,
+                    password=self.password,
+                    transformed_key=self.transformed_key)
+        self._database, self._dirty, self._cache_key = database, False, reloaded
+        DATABASE_CACHE.put(self._cache_key, self._database, self.cache_ttl)
+        self._log.v(u"Keepass: database reloaded - %s", self.location)
+
+    def _rollback(self):
+        # the file on disk still holds the last committed state
+        self._pending = []
+        self._reload()
+        self._log.v(u"Keepass: database rolled back - %s", self.location)
+
+    def _replay(self):
+        # another writer saved since this copy was read, apply the changes made here on top of theirs
+        pending, in_transaction, save_deferred = self._pending, self._in_transaction, self._save_deferred
+        self._log.v(u"Keepass: database changed on disk, re-applying %d change(s) - %s", len(pending), self.location)
+        self._reload()
+        self._in_transaction = True
+        try:
+            list(map(lambda search: getattr(self, search.action.replace("del", "delete"))(search, False), pending))
+        finally:
+            self._pending, self._in_transaction, self._save_deferred = pending, in_transaction, save_deferred
+
+    @contextmanager
+    def _write_guard(self, search: Search, check_mode: bool):
+        if search.action in Search.READ_ACTIONS or check_mode:
+            yield
+        elif self.concurrency == "lock":
+            with self._file_lock:
+                self.refresh()
+                self._pending.append(search)
+                yield
+        else:
+            self._pending.append(search)
+            yield
 
     def _entry_find(self, search: Search, ref_uuid=None, not_found_throw=True) -> Entry:
-        entry = self._database.find_entries_by_path(path=search.path, first=True) if ref_uuid is None else self._database.find_entries_by_uuid(uuid=ref_uuid, first=True)
+        with self._metrics.timed("entry_find"):
+            if ref_uuid is None and self._resolved_entries is not None:
+                # within a batch every distinct path is resolved once and shared by the searches on it
+                path = search.path.strip("/")
+                if path not in self._resolved_entries:
+                    self._resolved_entries[path] = self._index.find_entry_by_path(path)
+                else:
+                    self._metrics.count("resolved_entry_hit")
+                entry = self._resolved_entries[path]
+            else:
+                entry = self._index.find_entry_by_path(search.path) if ref_uuid is None else self._index.find_entry_by_uuid(ref_uuid)
         if entry is None:
-            self._display.vv(u"KeePass: entry%s NOT found - %s" % ("" if ref_uuid is None else " (and its reference)", search))
+            self._log.vv(u"KeePass: entry%s NOT found - %s", "" if ref_uuid is None else " (and its reference)", search)
             if not_found_throw:
                 raise AnsibleError(u"Entry is not found")
             else:
                 return None
-        self._display.vv(u"KeePass: entry%s found - %s" % ("" if ref_uuid is None else " (and its reference)", search))
+        self._log.vv(u"KeePass: entry%s found - %s", "" if ref_uuid is None else " (and its reference)", search)
         return entry
 
     def _entry_upsert(self, search: Search, check_mode: bool) -> Tuple[bool, dict]:
@@ -83,21 +316,28 @@ class KeepassDatabase(object):
             raise AttributeError(u"Invalid query - cannot post/insert when entry exists")
 
         path_split = (entry.path if entry is not None else search.path).rsplit("/", 1)
-        title = path_split if len(path_split) == 1 else path_split[1]
+        title = path_split[0] if len(path_split) == 1 else path_split[1]
         group_path = "/" if len(path_split) == 1 else path_split[0]
 
-        destination_group: Group = self._database.find_groups(path=group_path, regex=False, first=True)
-        if not check_mode and destination_group is None:
-            previous_group: Group = self._database.root_group
-            for path in group_path.split("/"):
-                found_group: Group = self._database.find_groups(path=(previous_group.path + path), regex=False, first=True)
-                previous_group = found_group if found_group is not None else self._database.add_group(previous_group, path)
-            destination_group = previous_group
-
-        search_value = dict(search.value)
-        entry_is_created, entry_is_updated = (False, False)
-        if not check_mode:
-            if entry is None:
+        destination_group: Group = self._index.find_group_by_path(group_path)
+        with self._metrics.timed("upsert"):
+            diff = self._diff = EntryDiff.upsert(search.path.strip("/"), entry, dict(search.value))
+            if check_mode or not diff.changed:
+                # nothing is applied, not even the missing groups
+                return diff.changed and check_mode, (EntryDump(entry).__dict__ if entry is not None else None)
+
+            if destination_group is None:
+                previous_group: Group = self._index.find_group_by_path("/")
+                for path in group_path.split("/"):
+                    found_group: Group = self._index.find_group_by_path(previous_group.path + path)
+                    if found_group is None:
+                        found_group = self._database.add_group(previous_group, path)
+                        self._index.add_group(found_group)
+                    previous_group = found_group
+                destination_group = previous_group
+
+            search_value, applied = dict(search.value), []
+            if diff.created:
                 entry: Entry = self._database.add_entry(
                     destination_group=destination_group,
                     title=title,
@@ -108,48 +348,97 @@ class KeepassDatabase(object):
                     expiry_time=search_value.get("expiry_time", None),
                     tags=search_value.get("tags", None),
                     force_creation=False)
-                list(map(lambda dict_key: search_value.pop(dict_key, None), ["username", "password", "url", "notes", "expiry_time", "tags"]))
-                entry_is_created = True
-
-            for (key, value) in search_value.items():
-                if key == "attachments":
-                    entry_attachments = entry.attachments
-                    for item in value:
-                        filename = item["filename"]
-                        binary, was_encoded = KeepassDatabase._get_binary(item["binary"])
-                        entry_attachment_item: Attachment = \
-                            ([attachment for index, attachment in enumerate(entry_attachments) if attachment.filename == filename] or [None])[0]
-                        if entry_attachment_item is None or entry_attachment_item.binary != binary:
-                            if not (entry_is_updated or entry_is_created):
-                                entry.save_history()
-                            if entry_attachment_item is not None:
-                                self._database.delete_binary(entry_attachment_item.id)
-                            entry.add_attachment(self._database.add_binary(binary), filename)
-                            entry_is_updated = True
-                elif hasattr(entry, key):
-                    if getattr(entry, key, None) != value or (key in ["username", "password"] and getattr(entry, key, "") != ("" if value is None else value)):
-                        if not (entry_is_updated or entry_is_created):
-                            entry.save_history()
-                        setattr(entry, key, value)
-                        entry_is_updated = True
-                elif key not in entry.custom_properties.keys() or entry.custom_properties.get(key, None) != value:
-                    if not (entry_is_updated or entry_is_created):
-                        entry.save_history()
-                    entry.set_custom_property(key, value)
-                    entry_is_updated = True
-
-        if not check_mode and (entry_is_created or entry_is_updated):
-            if not entry_is_created:
-                entry.touch(True)
-            self._save()
-            return True, EntryDump(self._entry_find(search)).__dict__
+                self._index.add_entry(entry)
+                applied = ["username", "password", "url", "notes", "expiry_time", "tags"]
+            else:
+                entry.save_history()
+                if self.history.enabled:
+                    self.history.prune(entry)
+
+            for key, (before, after) in diff.fields.items():
+                if key not in applied:
+                    setattr(entry, key, after)
+            for key, (before, after) in diff.custom_properties.items():
+                entry.set_custom_property(key, after)
+            for filename, (before, digest, binary, source) in diff.attachments.items():
+                entry_attachment_item: Attachment = EntryDiff.attachment(entry, filename)
+                if entry_attachment_item is not None:
+                    # the binary stays for the history and any other entry sharing it, collect_binaries drops it once unreferenced
+                    entry.delete_attachment(entry_attachment_item)
+                binary_id = BinaryStream.find(self._database, digest)
+                if binary_id is None:
+                    if binary is None:
+                        with open(source, mode="rb") as file:
+                            binary = file.read()
+                    binary_id = BinaryStream.add(self._database, binary, digest)
+                entry.add_attachment(binary_id, filename)
+
+        if not diff.created:
+            entry.touch(True)
+        self._dirty = True
+        self._save()
+        return True, EntryDump(self._entry_find(search)).__dict__
+
+    def _snapshot_record(self, entry: Entry) -> dict:
+        # what a search of each field would return, with its references already resolved
+        fields = {}
+        for field in KeepassDatabase.SNAPSHOT_FIELDS + tuple(key for key in entry.custom_properties.keys() if not hasattr(Entry, key) and not key.startswith("_")):
+            value = (getattr(entry, field, None) if field in KeepassDatabase.SNAPSHOT_FIELDS else None) or entry.custom_properties.get(field, None)
+            if not value and any(attachment.filename == field for attachment in entry.attachments):
+                continue
+            try:
+                fields[field] = [self._references.resolve(value), True] if ReferenceResolver.has_reference(value) else [value, False]
+            except AttributeError:
+                continue
+        try:
+            dump = EntryDump(entry, resolve=self._references.resolve).__dict__
+        except AttributeError:
+            dump = None
+        return {"dump": dump, "fields": fields, "attachments": [attachment.filename for attachment in entry.attachments]}
+
+    def _snapshot_get(self, search: Search, check_mode: bool) -> Union[Tuple[bool, dict], None]:
+        # None when the snapshot does not hold the answer, attachments and entry attributes are read from the database
+        field = search.field
+        if search.dest is not None or (field is not None and field not in KeepassDatabase.SNAPSHOT_FIELDS and (hasattr(Entry, field) or field.startswith("_"))):
+            return None
+        try:
+            record = self._snapshot.get(search.path.strip("/"))
+        except ValueError:
+            return None
+        if record is None:
+            self._log.vv(u"KeePass: entry NOT found - %s", search)
+            raise AnsibleError(u"Entry is not found")
+        self._metrics.count("snapshot_hit")
+        self._log.vv(u"KeePass: entry found (snapshot) - %s", search)
+        if field is None:
+            if record["dump"] is None:
+                return None
+            return False, {name: record["dump"][name] for name in (EntryDump.FIELDS if search.fields is None else search.fields)}
+
+        default = search.value if not check_mode and search.value_was_provided else None
+        if field in record["fields"]:
+            value, resolved = record["fields"][field]
+        elif field in KeepassDatabase.SNAPSHOT_FIELDS or field in record["attachments"]:
+            return None
         else:
-            return False, (EntryDump(entry).__dict__ if entry is not None else None)
+            value, resolved = None, False
+        if not resolved and not value and ReferenceResolver.has_reference(default):
+            return None
+        result = value if resolved else (value or default)
+        if result is not None or (not check_mode and search.value_was_provided):
+            return False, {field: result}
+        raise AttributeError(u"No property/file found")
 
     def get(self, search: Search, check_mode=False) -> Tuple[bool, dict]:
+        if self._snapshot is not None:
+            served = self._snapshot_get(search, check_mode)
+            if served is not None:
+                return served
+            self._materialise()
+
         entry = self._entry_find(search)
         if search.field is None:
-            return False, EntryDump(entry).__dict__
+            return False, EntryDump(entry, search.fields, self._references.resolve).__dict__
 
         # get entry value
         result = getattr(entry, search.field, None) or \
@@ -157,20 +446,44 @@ class KeepassDatabase(object):
             ([attachment for index, attachment in enumerate(entry.attachments) if attachment.filename == search.field] or [None])[0] or \
             (search.value if not check_mode and search.value_was_provided else None)
 
-        # get reference value
-        if search.field in ["title", "username", "password", "url", "notes", "uuid"]:
-            if hasattr(result, "startswith") and result.startswith("{REF:"):
-                entry = self._entry_find(search, uuid.UUID(result.split(":")[2].strip("}")))
-                result = getattr(entry, search.field, (None if check_mode else search.value))
+        # get reference value, through as many entries as the references chain
+        if ReferenceResolver.has_reference(result):
+            with self._metrics.timed("reference"):
+                result = self._references.resolve(result)
+            self._log.vv(u"KeePass: entry (and its reference) found - %s", search)
+
+        # stream the attachment to a file, it never has to be held in memory as a whole
+        if search.dest is not None:
+            if not hasattr(result, "binary"):
+                raise AttributeError(u"Invalid query - dest can only export an attachment")
+            changed, exported = BinaryStream.export(result, search.dest, check_mode)
+            self._log.vv(u"KeePass: exported file on entry - %s", search)
+            return changed, {search.field: exported}
 
         # return result
         if result is not None or (not check_mode and search.value_was_provided):
-            self._display.vv(u"KeePass: found property/file on entry - %s" % search)
+            self._log.vv(u"KeePass: found property/file on entry - %s", search)
             return False, {search.field: (base64.b64encode(result.binary) if hasattr(result, "binary") else result)}
 
         # throw error, value not found
         raise AttributeError(u"No property/file found")
 
+    @staticmethod
+    def _tags(entry: Entry) -> set:
+        # keepass separates tags with ';', keepassxc also with ','
+        return set(tag.strip() for tag in re.split("[;,]", ";".join(entry.tags or [])) if tag.strip() != "")
+
+    def find(self, search: Search, check_mode=False) -> Tuple[bool, List[dict]]:
+        # one pass over the indexed paths, the tags are only read for the entries whose path matched
+        pattern, tags = PathPattern.compile(search.path, search.match or "glob"), set(search.tags or [])
+        with self._metrics.timed("find"):
+            found = [
+                EntryDump(entry, search.fields, self._references.resolve).__dict__ for path, entry in self._index.entries()
+                if pattern.search(path) is not None and tags.issubset(KeepassDatabase._tags(entry))
+            ]
+        self._log.vv(u"KeePass: %d entries found - %s", len(found), search)
+        return False, found
+
     def post(self, search: Search, check_mode=False) -> Tuple[bool, dict]:
         return self._entry_upsert(search, check_mode)
 
@@ -179,31 +492,203 @@ class KeepassDatabase(object):
 
     def delete(self, search: Search, check_mode=False) -> Tuple[bool, dict]:
         entry = self._entry_find(search, not_found_throw=True)
-        if search.field is None:
-            self._database.delete_entry(entry) and not check_mode
-        elif hasattr(entry, search.field):
-            setattr(entry, search.field, ("" if search.field in ["username", "password"] else None)) and not check_mode
-        elif search.field in entry.custom_properties.keys():
-            entry.delete_custom_property(search.field) and not check_mode
-        else:
-            attachment = ([attachment for index, attachment in enumerate(entry.attachments) if attachment.filename == search.field] or [None])[0]
-            if attachment is not None:
-                entry.delete_attachment(attachment) and not check_mode
-            else:
-                raise AttributeError(u"No property/file found")
+        diff = self._diff = EntryDiff.delete(search.path.strip("/"), entry, search.field)
+        if check_mode or not diff.changed:
+            return diff.changed and check_mode, (None if search.field is None and check_mode else EntryDump(entry).__dict__)
 
-        self._save() and not check_mode
+        if diff.deleted is not None or "title" in diff.fields:
+            # a cleared title moves the entry off the path it is indexed under, it is indexed again once cleared
+            self._index.remove_entry(entry)
+        if diff.deleted is not None:
+            self._database.delete_entry(entry)
+        for key, (before, after) in diff.fields.items():
+            # pykeepass cannot write a string field of None, an empty value reads back as None all the same
+            setattr(entry, key, "" if after is None and key in EntryDiff.STRINGS else after)
+        if "title" in diff.fields:
+            self._index.add_entry(entry)
+        for key in diff.custom_properties.keys():
+            entry.delete_custom_property(key)
+        for filename in diff.attachments.keys():
+            entry.delete_attachment(EntryDiff.attachment(entry, filename))
+
+        self._dirty = True
+        self._save()
+        if "title" in diff.fields:
+            return True, EntryDump(entry).__dict__
         return True, (None if search.field is None else EntryDump(self._entry_find(search, not_found_throw=True)).__dict__)
 
+    def collect_binaries(self, check_mode=False) -> Tuple[bool, dict]:
+        removed, released = BinaryStream.collect(self._database, check_mode)
+        if removed > 0 and not check_mode:
+            self._dirty = True
+            self._save()
+        return removed > 0, {"binaries_removed": removed, "bytes_released": released}
+
+    def compact(self, check_mode=False) -> Tuple[bool, dict]:
+        # without limits of its own, the history is held to the limits set in the database
+        retention, now = self.history if self.history.enabled else HistoryRetention.of(self._database), datetime.now(timezone.utc)
+        size_before, expired, history_released = os.path.getsize(self._database.filename), [], 0
+        for entry in self._database.entries:
+            pruned, released = retention.prune(entry, now, check_mode)
+            expired, history_released = expired + pruned, history_released + released
+        removed, binaries_released = BinaryStream.collect(self._database, check_mode, frozenset(item._element for item in expired) if check_mode else frozenset())
+        changed = len(expired) > 0 or removed > 0
+        if changed and not check_mode:
+            self._dirty = True
+            self._save()
+        return changed, {
+            "history_removed": len(expired),
+            "binaries_removed": removed,
+            "bytes_released": history_released + binaries_released,
+            "size_before": size_before,
+            "size_after": None if check_mode else os.path.getsize(self._database.filename)
+        }
+
+    def kdf(self, check_mode=False) -> Tuple[bool, dict]:
+        return False, self.key_derivation.report(self._cache_key[0])
+
+    def rekey(self, check_mode=False) -> Tuple[bool, dict]:
+        # only the key derivation changes, the contents are written back as they are
+        if self.transformed_key is not None:
+            raise AttributeError(u"Invalid maintenance - rekey needs the password or keyfile, a transformed_key only opens the database as it is keyed now")
+        report = self.key_derivation.report(self._database.filename)
+        chosen = {name: value for name, value in report["recommended"].items() if name != "predicted_ms"}
+        changed = not report["on_target"] and chosen != report["kdf"]
+        if not changed or check_mode:
+            return changed, report
+        KdfAdvisor.apply(self._database, chosen)
+        with self._metrics.timed("save"):
+            self._replace_file(rekey=True)
+        TRANSFORMED_KEY_CACHE.discard(self._key_identity)
+        SNAPSHOT_CACHE.discard(self._key_identity)
+        self._reload()
+        self._log.v(u"Keepass: database re-keyed - %s", self.location)
+        return True, report
+
+    def snapshot(self, check_mode=False) -> Tuple[bool, dict]:
+        current = self._snapshot if self._snapshot is not None else SNAPSHOT_CACHE.get(self._key_identity, self._cache_key[1:4])
+        if current is not None:
+            return False, {"entries": len(current), "bytes": current.size}
+        records = {path: self._snapshot_record(entry) for path, entry in self._index.entries()}
+        size = SNAPSHOT_CACHE.put(self._key_identity, self._cache_key[1:4], records, check_mode)
+        return True, {"entries": len(records), "bytes": size}
+
+    def maintain(self, operation: str, check_mode: bool) -> dict:
+        if self._client is not None:
+            return self._client.maintain(operation, check_mode, self.is_updatable, self.metrics)
+
+        try:
+            if operation not in KeepassDatabase.MAINTENANCE:
+                raise AttributeError(u"Invalid maintenance - must be one of %s" % KeepassDatabase.MAINTENANCE)
+            if not self.is_updatable and operation not in KeepassDatabase.READ_MAINTENANCE:
+                raise AttributeError(u"Invalid maintenance - database is not 'updatable'")
+            if operation not in KeepassDatabase.READ_MAINTENANCE:
+                self._materialise()
+            with (self._file_lock if not check_mode and operation not in KeepassDatabase.READ_MAINTENANCE else nullcontext()):
+                self.refresh()
+                changed, outcome = getattr(self, operation)(check_mode)
+            self._log.v(u"Keepass: maintenance %s - %s", operation, self.location)
+            maintained = {"changed": changed, "failed": False, "result": {"maintenance": operation, "outcome": outcome}}
+            if self.metrics:
+                maintained["metrics"] = self._recorded.collect()
+            return maintained
+        except Exception as error:
+            DATABASE_CACHE.discard(self._cache_key)
+            raise AnsibleParserError(AnsibleError(message=traceback.format_exc(), orig_exc=error))
+
+    def bulk_import(self, searches: List[Search], check_mode: bool) -> dict:
+        if self._client is not None:
+            return self._client.bulk_import(searches, check_mode, self.is_updatable, self.metrics)
+
+        if not self.is_updatable:
+            raise AnsibleParserError(AnsibleError(u"Invalid import - database is not 'updatable'"))
+        self._materialise()
+        with (self._file_lock if self.concurrency == "lock" and not check_mode else nullcontext()):
+            self.refresh()
+            existing = set(path for path, entry in self._index.entries())
+            # every record is a put within one transaction, the database is saved once
+            results = self.execute_transaction(searches, check_mode)
+
+        records, counts, metrics, diffs = [], {"created": 0, "updated": 0, "unchanged": 0}, {}, []
+        for search, result in zip(searches, results):
+            path = search.path.strip("/")
+            status = "created" if path not in existing else ("updated" if result["changed"] else "unchanged")
+            existing.add(path)
+            counts[status] += 1
+            records.append({"path": path, "status": status})
+            Metrics.merge(metrics, result.get("metrics", {}))
+            if result["changed"] and "diff" in result:
+                diffs.append(result["diff"])
+        self._log.v(u"Keepass: imported %d records - %s", len(records), self.location)
+        imported = {"changed": counts["created"] + counts["updated"] > 0, "failed": False, "result": {"counts": counts, "records": records}, "diff": diffs}
+        if self.metrics:
+            imported["metrics"] = metrics
+        return imported
+
     def execute(self, search: Search, check_mode: bool, fail_silently: bool) -> dict:
-        self._display.vvv(u"Keepass: execute - %s" % list(({key: to_native(value)} for key, value in inspect.currentframe().f_locals.items() if key != "self" and not key.startswith("__"))))
-        result = Result(search)
+        if self._log.is_verbose(3):
+            self._log.vvv(u"Keepass: execute - %s", [{"search": to_native(search)}, {"check_mode": to_native(check_mode)}, {"fail_silently": to_native(fail_silently)}])
+        if self._client is not None:
+            return self._client.execute(search, check_mode, fail_silently, self.is_updatable, self.metrics)
+
+        result, self._diff = Result(search), None
         try:
-            if not self.is_updatable and search.action != "get":
+            if not self.is_updatable and search.action not in Search.READ_ACTIONS:
                 raise AttributeError(u"Invalid query - database is not 'updatable'")
-            result.success(getattr(self, search.action.replace("del", "delete"))(search, check_mode))
+            if search.action != "get":
+                self._materialise()
+            with self._write_guard(search, check_mode):
+                result.success(getattr(self, search.action.replace("del", "delete"))(search, check_mode))
+            if self._diff is not None:
+                result.compared(self._diff.diff())
         except Exception as error:
+            if search.action not in Search.READ_ACTIONS:
+                # the shared handle may hold a partially applied change, never serve it again
+                DATABASE_CACHE.discard(self._cache_key)
+                if not check_mode and not self._in_transaction and self._database is not None:
+                    # neither the partial change nor the failed search may reach a later save or replay
+                    self._rollback()
             if not fail_silently:
                 raise AnsibleParserError(AnsibleError(message=traceback.format_exc(), orig_exc=error))
             result.fail((traceback.format_exc(), error))
+        finally:
+            if search.action not in Search.READ_ACTIONS and self._database is not None:
+                # any field may have changed, the references are resolved afresh
+                self._references.invalidate()
+        if self.metrics:
+            result.measured(self._recorded.collect())
         return result.__dict__
+
+    def execute_many(self, searches: List[Search], check_mode: bool, fail_silently: bool) -> List[dict]:
+        if self._client is not None:
+            return self._client.execute_many(searches, check_mode, fail_silently, self.is_updatable, self.metrics)
+
+        # entries can only be shared while nothing in the batch changes the tree
+        self._resolved_entries = {} if all(search.action in Search.READ_ACTIONS for search in searches) else None
+        try:
+            return list(map(lambda search: self.execute(search, check_mode=check_mode, fail_silently=fail_silently), searches))
+        finally:
+            self._resolved_entries = None
+
+    def execute_transaction(self, searches: List[Search], check_mode: bool) -> List[dict]:
+        if self._client is not None:
+            return self._client.execute_transaction(searches, check_mode, self.is_updatable, self.metrics)
+
+        self._materialise()
+        with (self._file_lock if self.concurrency == "lock" and not check_mode else nullcontext()):
+            self._in_transaction, self._save_deferred = True, False
+            try:
+                results = list(map(lambda search: self.execute(search, check_mode=check_mode, fail_silently=False), searches))
+                self._in_transaction = False
+                if self._save_deferred:
+                    self._save()
+                if self.metrics and len(results) > 0:
+                    # the save is shared by the whole transaction, it is reported with its last search
+                    Metrics.merge(results[-1]["metrics"], self._recorded.collect())
+                return results
+            except Exception:
+                self._in_transaction = False
+                self._rollback()
+                raise
+            finally:
+                self._in_transaction, self._save_deferred = False, False
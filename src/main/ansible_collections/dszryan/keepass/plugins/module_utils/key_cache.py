@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+from typing import Union
+
+from Cryptodome.Cipher import AES
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.run_scope import RUN_SCOPE, RunScope
+
+
+class TransformedKeyCache(object):
+    def __init__(self, run_scope: RunScope = RUN_SCOPE):
+        self._run_scope = run_scope     # type: RunScope
+
+    def _location(self, identity: str) -> str:
+        return self._run_scope.location(identity, ".key")
+
+    # noinspection PyBroadException
+    def get(self, identity: str) -> Union[bytes, None]:
+        try:
+            with open(self._location(identity), mode="rb") as file:
+                content = file.read()
+            cipher = AES.new(self._run_scope.secret, AES.MODE_GCM, nonce=content[:16])
+            cipher.update(identity.encode())
+            return cipher.decrypt_and_verify(content[32:], content[16:32])
+        except Exception:
+            return None
+
+    # noinspection PyBroadException
+    def put(self, identity: str, transformed_key: bytes):
+        try:
+            nonce = os.urandom(16)
+            cipher = AES.new(self._run_scope.secret, AES.MODE_GCM, nonce=nonce)
+            cipher.update(identity.encode())
+            ciphertext, tag = cipher.encrypt_and_digest(transformed_key)
+            location = self._location(identity)
+            descriptor = os.open(location + ".%d" % os.getpid(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, mode="wb") as file:
+                file.write(nonce + tag + ciphertext)
+            os.replace(location + ".%d" % os.getpid(), location)
+        except Exception:
+            pass
+
+    def discard(self, identity: str):
+        try:
+            os.remove(self._location(identity))
+        except (OSError, ValueError):
+            pass
+
+
+TRANSFORMED_KEY_CACHE = TransformedKeyCache()
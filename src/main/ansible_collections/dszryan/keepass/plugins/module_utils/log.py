@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+def is_verbose(display, level: int) -> bool:
+    # checked before a message is formatted, displays without a numeric verbosity are given everything
+    verbosity = getattr(display, "verbosity", None)
+    return not isinstance(verbosity, int) or verbosity >= level
+
+
+class Log(object):
+    def __init__(self, display):
+        self._display = display
+
+    def is_verbose(self, level: int) -> bool:
+        return is_verbose(self._display, level)
+
+    def _write(self, level: int, message: str, args: tuple):
+        if is_verbose(self._display, level):
+            getattr(self._display, "v" * level)(message % args if args else message)
+
+    def v(self, message: str, *args):
+        self._write(1, message, args)
+
+    def vv(self, message: str, *args):
+        self._write(2, message, args)
+
+    def vvv(self, message: str, *args):
+        self._write(3, message, args)
+
+    def vvvv(self, message: str, *args):
+        self._write(4, message, args)
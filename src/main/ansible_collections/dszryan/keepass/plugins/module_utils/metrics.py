@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import time
+from contextlib import contextmanager
+
+
+class Metrics(object):
+    def __init__(self):
+        self.timings = {}       # type: dict
+        self.counters = {}      # type: dict
+        self._running = set()   # type: set
+
+    @contextmanager
+    def timed(self, name: str):
+        # a nested call to the same operation is already inside the outer measurement
+        if name in self._running:
+            yield
+            return
+        self._running.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._running.discard(name)
+            self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def count(self, name: str, increment: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + increment
+
+    def collect(self) -> dict:
+        # hands over what was recorded since the last collection
+        collected = {"timings_ms": {name: round(value, 3) for name, value in self.timings.items()}, "counters": dict(self.counters)}
+        self.timings, self.counters = {}, {}
+        return collected
+
+    @staticmethod
+    def merge(into: dict, collected: dict) -> dict:
+        for key in ["timings_ms", "counters"]:
+            merged = into.setdefault(key, {})
+            for name, value in collected.get(key, {}).items():
+                merged[name] = round(merged.get(name, 0) + value, 3)
+        return into
+
+
+class NoMetrics(Metrics):
+    @contextmanager
+    def timed(self, name: str):
+        yield
+
+    def count(self, name: str, increment: int = 1):
+        pass
+
+
+NO_METRICS = NoMetrics()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import functools
+import re
+from typing import Pattern
+
+
+class PathPattern(object):
+    MATCHES = ("glob", "regex")     # type: tuple
+    _CACHE_SIZE = 256               # type: int
+
+    @staticmethod
+    def _glob(pattern: str) -> str:
+        # '**' spans groups, '*', '?' and '[...]' stay within a single group or title
+        translated, index = [], 0
+        while index < len(pattern):
+            if pattern.startswith("**/", index):
+                translated.append("(?:.*/)?")
+                index += 3
+            elif pattern.startswith("**", index):
+                translated.append(".*")
+                index += 2
+            elif pattern[index] == "*":
+                translated.append("[^/]*")
+                index += 1
+            elif pattern[index] == "?":
+                translated.append("[^/]")
+                index += 1
+            elif pattern[index] == "[" and "]" in pattern[index + 2:]:
+                end = pattern.index("]", index + 2)
+                members = pattern[index + 1:end]
+                translated.append("[" + ("^" + re.escape(members[1:]) if members.startswith("!") else re.escape(members)).replace("\\-", "-") + "]")
+                index = end + 1
+            else:
+                translated.append(re.escape(pattern[index]))
+                index += 1
+        return "\\A" + "".join(translated) + "\\Z"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=_CACHE_SIZE)
+    def compile(pattern: str, match: str = "glob") -> Pattern:
+        # both are applied with search, a regex matches anywhere in the path unless it is anchored
+        if match == "regex":
+            return re.compile(pattern)
+        return re.compile(PathPattern._glob(pattern.strip("/")))
@@ -2,44 +2,72 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import copy
+import functools
 import json
 import re
+from typing import Union, List
 
 from ansible.errors import AnsibleParserError, AnsibleError
 from ansible.module_utils.common.text.converters import to_native
 
 from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import is_verbose
 
 
 class Query(object):
-    _PATTERN = u"(get|put|post|del)?:\\/\\/(((?![#\\?])[\\s\\S])*)(\\?(((?!#)[\\s\\S])*))?(#(.*))?"
+    _PATTERN = re.compile(u"(get|find|put|post|del)?:\\/\\/([^#\\?]*)(\\?([^#]*))?(#(.*))?")
+    _CACHE_SIZE = 1024  # type: int
 
-    def __init__(self, display, read_only: bool, term: str):
+    def __init__(self, display, read_only: bool, term: str, fields: Union[str, List[str], None] = None, dest: Union[str, None] = None,
+                 match: Union[str, None] = None, tags: Union[str, List[str], None] = None):
         self._display = display
         self.read_only = read_only     # type: bool
         self.term = term                # type: str
+        self.fields = fields            # type: Union[str, List[str], None]
+        self.dest = dest                # type: Union[str, None]
+        self.match = match              # type: Union[str, None]
+        self.tags = tags                # type: Union[str, List[str], None]
 
-    @property
-    def search(self) -> Search:
+    @staticmethod
+    @functools.lru_cache(maxsize=_CACHE_SIZE)
+    def _parse(display, read_only: bool, term: str, fields: Union[str, tuple, None], dest: Union[str, None], match: Union[str, None], tags: Union[str, tuple, None]) -> tuple:
         try:
-            find_all = re.findall(Query._PATTERN, self.term)
-            self._display.vvvv(u"Keepass: find_all - [%s]" % find_all)
-            if len(find_all) != 1 or len(find_all[0]) != 8:
-                raise AttributeError(u"Invalid term provided [%s]-[%s]" % (self.term, find_all))
+            find_all = Query._PATTERN.findall(term)
+            if is_verbose(display, 4):
+                display.vvvv(u"Keepass: find_all - [%s]" % find_all)
+            if len(find_all) != 1 or len(find_all[0]) != 6:
+                raise AttributeError(u"Invalid term provided [%s]-[%s]" % (term, find_all))
 
             matches = find_all[0]
-            self._display.vvv(u"Keepass: matches - [%s]" % to_native(matches))
-            return Search(
-                display=self._display,
-                read_only=self.read_only,
+            if is_verbose(display, 3):
+                display.vvv(u"Keepass: matches - [%s]" % to_native(matches))
+            search = Search(
+                display=display,
+                read_only=read_only,
                 action=matches[0] if matches[0] != "" else None,
                 path=matches[1] if matches[1] != "" else None,
-                field=matches[4] if matches[4] != "" else None,
-                value=matches[7],
-                value_was_provided=matches[6] != ""
+                field=matches[3] if matches[3] != "" else None,
+                value=matches[5],
+                value_was_provided=matches[4] != "",
+                fields=list(fields) if isinstance(fields, tuple) else fields,
+                dest=dest,
+                match=match,
+                tags=list(tags) if isinstance(tags, tuple) else tags
             )
+            # only the parsed and validated state is kept, never an instance a caller could change
+            return tuple(search.__dict__.items())
         except AttributeError as error:
             raise AnsibleParserError(AnsibleError(message=to_native(error), orig_exc=error))
 
+    @property
+    def search(self) -> Search:
+        # terms repeat across templated loops, each is parsed and validated once and built afresh on every access
+        fields = tuple(self.fields) if isinstance(self.fields, list) else self.fields
+        tags = tuple(self.tags) if isinstance(self.tags, list) else self.tags
+        search = object.__new__(Search)
+        search.__dict__.update(copy.deepcopy(dict(Query._parse(self._display, self.read_only, self.term, fields, self.dest, self.match, tags))))
+        return search
+
     def __str__(self) -> str:
         return json.dumps(self.__dict__)
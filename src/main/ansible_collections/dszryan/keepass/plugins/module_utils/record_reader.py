@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from typing import Iterator, Union
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
+
+
+class RecordReader(object):
+    FORMATS = ["csv", "jsonl", "yaml"]
+    _EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".yaml": "yaml", ".yml": "yaml", ".json": "yaml"}
+
+    @staticmethod
+    def format_of(filename: str, record_format: Union[str, None] = None) -> str:
+        record_format = record_format or RecordReader._EXTENSIONS.get(os.path.splitext(filename)[1].lower(), None)
+        if record_format not in RecordReader.FORMATS:
+            raise AttributeError(u"Invalid import - format must be one of %s - %s" % (RecordReader.FORMATS, filename))
+        return record_format
+
+    @staticmethod
+    def _csv(file) -> Iterator[dict]:
+        # an empty cell leaves the value as it is rather than clearing it
+        for row in csv.DictReader(file):
+            yield {key.strip(): value for key, value in row.items() if key is not None and value not in [None, ""]}
+
+    @staticmethod
+    def _jsonl(file) -> Iterator[dict]:
+        for line in file:
+            if line.strip() != "":
+                yield json.loads(line)
+
+    @staticmethod
+    def _yaml(file) -> Iterator[dict]:
+        # json is read as yaml, a document holds the list of records
+        records = yaml.load(file, Loader=SafeLoader) or []
+        if not isinstance(records, list):
+            raise AttributeError(u"Invalid import - yaml must hold a list of records")
+        return iter(records)
+
+    @staticmethod
+    def records(filename: str, record_format: Union[str, None] = None) -> Iterator[dict]:
+        reader = getattr(RecordReader, "_" + RecordReader.format_of(filename, record_format))
+        with open(filename, mode="r", encoding="utf-8", newline="") as file:
+            try:
+                for record in reader(file):
+                    yield record
+            except (csv.Error, yaml.YAMLError, ValueError) as error:
+                raise AttributeError(u"Invalid import - %s - %s" % (filename, error))
+
+    @staticmethod
+    def _expiry_time(number: int, expiry_time) -> datetime:
+        # yaml reads a timestamp itself, csv and json leave it as text, a time without an offset is taken as utc
+        try:
+            parsed = expiry_time if isinstance(expiry_time, datetime) else datetime.fromisoformat(expiry_time)
+        except (TypeError, ValueError):
+            raise AttributeError(u"Invalid import - record %d expiry_time is not an iso 8601 time - %s" % (number, expiry_time))
+        return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+    @staticmethod
+    def _search(display, directory: str, number: int, record: dict) -> Search:
+        if not isinstance(record, dict):
+            raise AttributeError(u"Invalid import - record %d is not a mapping" % number)
+        value = dict(record)
+        path, group, title = value.pop("path", None), value.pop("group", None), value.pop("title", None)
+        if path is not None and (group is not None or title is not None):
+            raise AttributeError(u"Invalid import - record %d provides both a path and a group/title" % number)
+        if path is None and title is not None:
+            path = title if group in [None, "", "/"] else group.strip("/") + "/" + title
+        if path in [None, ""]:
+            raise AttributeError(u"Invalid import - record %d has neither a path nor a title" % number)
+        if value.get("expiry_time", None) is not None:
+            value["expiry_time"] = RecordReader._expiry_time(number, value["expiry_time"])
+        attachments = value.get("attachments", [])
+        if not isinstance(attachments, list) or not all(isinstance(attachment, dict) for attachment in attachments):
+            raise AttributeError(u"Invalid import - record %d attachments must be a list of mappings" % number)
+        for attachment in attachments:
+            # a relative src is read from beside the import file
+            if attachment.get("src", None) is not None:
+                attachment["src"] = os.path.join(directory, os.path.expanduser(attachment["src"]))
+        return Search(display=display, read_only=False, action="put", path=path, field=None, value=value, value_was_provided=True)
+
+    @staticmethod
+    def searches(display, filename: str, record_format: Union[str, None] = None) -> Iterator[Search]:
+        filename = os.path.abspath(os.path.expanduser(filename))
+        for number, record in enumerate(RecordReader.records(filename, record_format), start=1):
+            yield RecordReader._search(display, os.path.dirname(filename), number, record)
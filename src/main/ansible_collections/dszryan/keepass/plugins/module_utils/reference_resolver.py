@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+import threading
+import uuid
+import weakref
+from typing import Union
+
+from pykeepass import PyKeePass
+from pykeepass.entry import Entry
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_index import DatabaseIndex
+
+
+class ReferenceResolver(object):
+    # {REF:<wanted field>@<searched field>:<text>}, see https://keepass.info/help/base/fieldrefs.html
+    _PATTERN = re.compile(u"\\{REF:([TUPANI])@([TUPANIO]):([^}]*)\\}", re.IGNORECASE)
+    _FIELDS = {"T": "title", "U": "username", "P": "password", "A": "url", "N": "notes", "I": "uuid"}
+    MAX_DEPTH = 16  # type: int
+
+    _RESOLVERS = weakref.WeakKeyDictionary()    # type: weakref.WeakKeyDictionary
+    _RESOLVERS_LOCK = threading.Lock()
+
+    def __init__(self, database: PyKeePass):
+        self._database = database   # type: PyKeePass
+        self._resolved = {}         # type: dict
+        self._targets = {}          # type: dict
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def of(database: PyKeePass) -> "ReferenceResolver":
+        with ReferenceResolver._RESOLVERS_LOCK:
+            resolver = ReferenceResolver._RESOLVERS.get(database, None)
+            if resolver is None:
+                resolver = ReferenceResolver._RESOLVERS[database] = ReferenceResolver(database)
+            return resolver
+
+    @staticmethod
+    def has_reference(value) -> bool:
+        return isinstance(value, str) and ReferenceResolver._PATTERN.search(value) is not None
+
+    def invalidate(self):
+        with self._lock:
+            self._resolved, self._targets = {}, {}
+
+    @staticmethod
+    def _field(entry: Entry, field: str) -> str:
+        if field == "uuid":
+            return entry.uuid.hex.upper()
+        return getattr(entry, field, None) or ""
+
+    def _target(self, searched: str, text: str) -> Union[Entry, None]:
+        key = (searched, text)
+        if key not in self._targets:
+            index = DatabaseIndex.of(self._database)
+            if searched == "I":
+                try:
+                    self._targets[key] = index.find_entry_by_uuid(uuid.UUID(text))
+                except ValueError:
+                    self._targets[key] = None
+            else:
+                # the first entry, in the order of the tree, whose field holds exactly the text
+                self._targets[key] = next((
+                    entry for path, entry in index.entries()
+                    if (text in entry.custom_properties.values() if searched == "O" else ReferenceResolver._field(entry, ReferenceResolver._FIELDS[searched]) == text)
+                ), None)
+        return self._targets[key]
+
+    def _referenced(self, entry: Entry, field: str, chain: tuple) -> str:
+        key = (entry.uuid, field)
+        if key in self._resolved:
+            return self._resolved[key]
+        if key in chain:
+            raise AttributeError(u"Invalid reference - cycle through the %s of %s" % (field, entry.path))
+        if len(chain) >= ReferenceResolver.MAX_DEPTH:
+            raise AttributeError(u"Invalid reference - more than %d references chained from the %s of %s" % (ReferenceResolver.MAX_DEPTH, field, entry.path))
+        resolved = self._resolve(ReferenceResolver._field(entry, field), chain + (key, ))
+        self._resolved[key] = resolved
+        return resolved
+
+    def _resolve(self, value: str, chain: tuple) -> str:
+        def substitute(match) -> str:
+            target = self._target(match.group(2).upper(), match.group(3))
+            # a reference to nothing is left as it is, as keepass does
+            return match.group(0) if target is None else self._referenced(target, ReferenceResolver._FIELDS[match.group(1).upper()], chain)
+        return ReferenceResolver._PATTERN.sub(substitute, value)
+
+    def resolve(self, value):
+        if not ReferenceResolver.has_reference(value):
+            return value
+        with self._lock:
+            return self._resolve(value, ())
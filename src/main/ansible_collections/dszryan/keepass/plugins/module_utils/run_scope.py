@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import hmac
+import os
+from typing import Union
+
+
+class RunScope(object):
+    _SECRET_NAME = "run.secret"
+
+    def __init__(self, directory: Union[str, None] = None):
+        self._directory = directory     # type: Union[str, None]
+        self._secret = None             # type: Union[bytes, None]
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            # the controller creates a private local tmp per run and removes it on exit, forks inherit its location
+            from ansible import constants as C
+            self._directory = os.path.join(C.DEFAULT_LOCAL_TMP, "keepass")
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory, mode=0o700, exist_ok=True)
+        return self._directory
+
+    @property
+    def secret(self) -> bytes:
+        if self._secret is None:
+            location = os.path.join(self.directory, RunScope._SECRET_NAME)
+            try:
+                descriptor = os.open(location, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(descriptor, mode="wb") as file:
+                    file.write(os.urandom(32))
+            except FileExistsError:
+                pass
+            with open(location, mode="rb") as file:
+                self._secret = file.read()
+            if len(self._secret) != 32:
+                # another fork is still writing the secret
+                self._secret = None
+                raise ValueError(u"run secret is not available yet")
+        return self._secret
+
+    def location(self, identity: str, suffix: str, length: int = 64) -> str:
+        return os.path.join(self.directory, hmac.new(self.secret, identity.encode(), hashlib.sha256).hexdigest()[:length] + suffix)
+
+
+RUN_SCOPE = RunScope()
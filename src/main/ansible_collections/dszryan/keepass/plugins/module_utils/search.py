@@ -3,29 +3,42 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import json
-from typing import Union
+import re
+from typing import Union, List
 
 from ansible.errors import AnsibleParserError, AnsibleError
 from ansible.module_utils.common.text.converters import to_native
 
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import is_verbose
+from ansible_collections.dszryan.keepass.plugins.module_utils.path_pattern import PathPattern
+
 
 class Search(object):
-    def __init__(self, display, read_only: bool, action: str, path: str, field: str, value: dict, value_was_provided: bool):
+    ENTRY_FIELDS = ("title", "path", "username", "password", "url", "notes", "custom_properties", "attachments")
+    READ_ACTIONS = ("get", "find")
+
+    def __init__(self, display, read_only: bool, action: str, path: str, field: str, value: dict, value_was_provided: bool, fields: Union[str, List[str], None] = None, dest: Union[str, None] = None,
+                 match: Union[str, None] = None, tags: Union[str, List[str], None] = None):
         self.read_only = read_only                                                                      # type: bool
         self.action = action                                                                            # type: str
         self.path = path                                                                                # type: str
         self.field = field                                                                              # type: str
         self.value = json.loads(value) if isinstance(value, str) and value.startswith('{') else value   # type: Union[str, dict]
         self.value_was_provided = value_was_provided                                                    # type: bool
+        self.fields = fields.split(",") if isinstance(fields, str) else fields                          # type: Union[List[str], None]
+        self.dest = dest                                                                                # type: Union[str, None]
+        self.match = match                                                                              # type: Union[str, None]
+        self.tags = tags.split(",") if isinstance(tags, str) else tags                                  # type: Union[List[str], None]
         self._validate()
-        display.vvv(u"Keepass: valid search - %s" % self.__str__())
+        if is_verbose(display, 3):
+            display.vvv(u"Keepass: valid search - %s" % self.__str__())
 
     def _validate(self):
         try:
             if self.action is None or self.action == "":
                 raise AttributeError(u"Invalid query - no action")
-            if self.read_only and self.action != "get":
-                raise AttributeError(u"Invalid query - only get operations supported")
+            if self.read_only and self.action not in Search.READ_ACTIONS:
+                raise AttributeError(u"Invalid query - only get and find operations supported")
             if self.path is None or self.path == "":
                 raise AttributeError(u"Invalid query - no path")
             if self.action == "del" and not (self.value is None or self.value == ""):
@@ -42,8 +55,26 @@ class Search(object):
                         raise AttributeError(u"Invalid query - path is already provided")
                     if self.value.get("title", None) is not None:
                         raise AttributeError(u"Invalid query - title is already provided")
+            if self.action == "find":
+                if self.field is not None or self.value_was_provided:
+                    raise AttributeError(u"Invalid query - find returns whole entries, cannot provide a field or value")
+                if self.match is not None and self.match not in PathPattern.MATCHES:
+                    raise AttributeError(u"Invalid query - match must be one of %s" % list(PathPattern.MATCHES))
+                try:
+                    PathPattern.compile(self.path, self.match or "glob")
+                except re.error as error:
+                    raise AttributeError(u"Invalid query - path is not a valid pattern - %s" % error)
+            elif self.match is not None or self.tags is not None:
+                raise AttributeError(u"Invalid query - match and tags can only filter a find")
+            if self.fields is not None:
+                if self.action not in Search.READ_ACTIONS or self.field is not None:
+                    raise AttributeError(u"Invalid query - fields can only project a whole entry get or find")
+                if len(self.fields) == 0 or not set(self.fields).issubset(Search.ENTRY_FIELDS):
+                    raise AttributeError(u"Invalid query - fields must be from %s" % list(Search.ENTRY_FIELDS))
+            if self.dest is not None and (self.action != "get" or self.field is None):
+                raise AttributeError(u"Invalid query - dest can only export an attachment with get")
         except AttributeError as error:
             raise AnsibleParserError(AnsibleError(message=to_native(error), orig_exc=error))
 
     def __str__(self) -> str:
-        return json.dumps(self.__dict__)
+        return json.dumps(self.__dict__, default=str)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Tuple, Union
+
+from Cryptodome.Cipher import AES
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.run_scope import RUN_SCOPE, RunScope
+
+
+class Snapshot(object):
+    # a header, a sorted index of fixed size slots and the records, each record encrypted on its own
+    MAGIC = b"KPSNAP01"
+    _HEADER = struct.Struct("<8sQQQI")  # magic, database version (mtime_ns, size, inode), slot count
+    _SLOT = struct.Struct("<16sQI")     # keyed digest of the path, record offset, record length
+
+    def __init__(self, location: str, secret: bytes, identity: str):
+        self._secret = secret           # type: bytes
+        self._identity = identity       # type: str
+        with open(location, mode="rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)    # type: mmap.mmap
+        magic, mtime, size, inode, self._count = Snapshot._HEADER.unpack_from(self._map, 0)
+        if magic != Snapshot.MAGIC:
+            raise ValueError(u"not a snapshot - %s" % location)
+        self.version = (mtime, size, inode)     # type: Tuple
+        self.size = len(self._map)              # type: int
+
+    @staticmethod
+    def _digest(secret: bytes, identity: str, path: str) -> bytes:
+        # paths are never stored, only their digests keyed with the run secret
+        return hmac.new(secret, (identity + "\x00" + path).encode(), hashlib.sha256).digest()[:16]
+
+    @staticmethod
+    def _associated(identity: str, version: Tuple, digest: bytes) -> bytes:
+        return identity.encode() + Snapshot._HEADER.pack(Snapshot.MAGIC, *version, 0) + digest
+
+    @staticmethod
+    def _cipher(secret: bytes, nonce: bytes, associated: bytes):
+        # aes-gcm as the transformed key cache uses it, a cipher object only ever seals or opens one record
+        cipher = AES.new(secret, AES.MODE_GCM, nonce=nonce)
+        cipher.update(associated)
+        return cipher
+
+    @staticmethod
+    def build(secret: bytes, identity: str, version: Tuple, records: dict) -> bytes:
+        slots, encrypted, offset = [], [], Snapshot._HEADER.size + Snapshot._SLOT.size * len(records)
+        for digest, path in sorted((Snapshot._digest(secret, identity, path), path) for path in records.keys()):
+            nonce = os.urandom(12)
+            ciphertext, tag = Snapshot._cipher(secret, nonce, Snapshot._associated(identity, version, digest)).encrypt_and_digest(json.dumps(records[path], separators=(",", ":")).encode())
+            sealed = nonce + ciphertext + tag
+            slots.append(Snapshot._SLOT.pack(digest, offset, len(sealed)))
+            encrypted.append(sealed)
+            offset += len(sealed)
+        return Snapshot._HEADER.pack(Snapshot.MAGIC, *version, len(records)) + b"".join(slots) + b"".join(encrypted)
+
+    def get(self, path: str) -> Union[dict, None]:
+        digest = Snapshot._digest(self._secret, self._identity, path)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            slot, offset, length = Snapshot._SLOT.unpack_from(self._map, Snapshot._HEADER.size + middle * Snapshot._SLOT.size)
+            if slot < digest:
+                low = middle + 1
+            elif slot > digest:
+                high = middle
+            else:
+                cipher = Snapshot._cipher(self._secret, self._map[offset:offset + 12], Snapshot._associated(self._identity, self.version, digest))
+                try:
+                    record = cipher.decrypt_and_verify(self._map[offset + 12:offset + length - 16], self._map[offset + length - 16:offset + length])
+                except ValueError:
+                    raise ValueError(u"snapshot record failed verification")
+                return json.loads(record)
+        return None
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class SnapshotCache(object):
+    def __init__(self, run_scope: RunScope = RUN_SCOPE):
+        self._run_scope = run_scope     # type: RunScope
+        self._opened = {}               # type: dict
+        self._lock = threading.Lock()
+
+    def _location(self, identity: str) -> str:
+        return self._run_scope.location(identity, ".snapshot")
+
+    # noinspection PyBroadException
+    def get(self, identity: str, version: Tuple) -> Union[Snapshot, None]:
+        try:
+            with self._lock:
+                snapshot = self._opened.get(identity, None)
+                if snapshot is None or snapshot.version != version:
+                    # the file on disk may have been replaced by a later snapshot since it was mapped
+                    snapshot = self._opened[identity] = Snapshot(self._location(identity), self._run_scope.secret, identity)
+                return snapshot if snapshot.version == version else None
+        except Exception:
+            return None
+
+    def put(self, identity: str, version: Tuple, records: dict, check_mode: bool = False) -> int:
+        content = Snapshot.build(self._run_scope.secret, identity, version, records)
+        if check_mode:
+            return len(content)
+        location = self._location(identity)
+        descriptor = os.open(location + ".%d" % os.getpid(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, mode="wb") as file:
+            file.write(content)
+        os.replace(location + ".%d" % os.getpid(), location)
+        return len(content)
+
+    def discard(self, identity: str):
+        with self._lock:
+            self._opened.pop(identity, None)
+        try:
+            os.remove(self._location(identity))
+        except (OSError, ValueError):
+            pass
+
+
+SNAPSHOT_CACHE = SnapshotCache()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+from shutil import copy
+from unittest import TestCase, mock
+
+from ansible.errors import AnsibleParserError
+from ansible.parsing.dataloader import DataLoader
+from ansible.playbook.play_context import PlayContext
+from ansible.plugins import display
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.action.keepass import ActionModule
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+
+
+class TestActionModule(TestCase):
+
+    def setUp(self) -> None:
+        DATABASE_CACHE.clear()
+        self._directory = tempfile.TemporaryDirectory()
+        scratch = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "module_utils")
+        self._database = {
+            "location": os.path.join(self._directory.name, "scratch.kdbx"),
+            "keyfile": os.path.join(scratch, "scratch.keyfile"),
+            "password": "scratch",
+            "updatable": True
+        }
+        copy(os.path.join(scratch, "scratch.kdbx"), self._database["location"])
+        # the playbook's directory, with the files a task refers to by a relative path
+        self._playbook = os.path.join(self._directory.name, "playbook")
+        os.makedirs(os.path.join(self._playbook, "files"))
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _run(self, **args) -> dict:
+        task = mock.Mock(args=dict({"database": self._database}, **args), async_val=0)
+        task.get_search_path.return_value = [self._playbook]
+        return ActionModule(task, mock.Mock(), PlayContext(), DataLoader(), None, None).run(task_vars={})
+
+    def _reopened(self) -> PyKeePass:
+        return PyKeePass(self._database["location"], password=self._database["password"], keyfile=self._database["keyfile"])
+
+    def test_run_attachment_src_found_in_files(self):
+        with open(os.path.join(self._playbook, "files", "keystore.p12"), mode="wb") as file:
+            file.write(b"keystore content")
+        actual = self._run(term='put://one/two/test#{"attachments": [{"src": "keystore.p12"}]}')
+        self.assertTrue(actual["changed"])
+        attachment = [attachment for attachment in self._reopened().find_entries_by_path("one/two/test", first=True).attachments if attachment.filename == "keystore.p12"][0]
+        self.assertEqual(b"keystore content", attachment.data)
+        self.assertEqual([{"src": "keystore.p12"}], Query(display, False, 'put://one/two/test#{"attachments": [{"src": "keystore.p12"}]}').search.value["attachments"])
+        with self.assertRaises(AnsibleParserError):
+            self._run(terms=['put://one/two/test#{"attachments": [{"src": "DOES_NOT_EXISTS"}]}'])
+
+    def test_run_kdf_reads_only_the_header(self):
+        self._database["kdf_target_ms"] = 500
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.PyKeePass") as opened:
+            actual = self._run(maintenance="kdf")
+        opened.assert_not_called()
+        self.assertFalse(actual["changed"])
+        self.assertEqual(("kdf", 500, "argon2"), (actual["result"]["maintenance"], actual["result"]["outcome"]["target_ms"], actual["result"]["outcome"]["kdf"]["type"]))
+        with self.assertRaises(AnsibleParserError):
+            self._run(maintenance="kdf", database=dict(self._database, location=os.path.join(self._directory.name, "DOES_NOT_EXISTS.kdbx")))
+
+    def test_run_import_src_found_in_files(self):
+        with open(os.path.join(self._playbook, "files", "seed.csv"), mode="w") as file:
+            file.write("path,username\none/two/imported,imported_username\n")
+        actual = self._run(import_src="seed.csv")
+        self.assertEqual({"created": 1, "updated": 0, "unchanged": 0}, actual["result"]["counts"])
+        self.assertEqual("imported_username", self._reopened().find_entries_by_path("one/two/imported", first=True).username)
+        with self.assertRaises(AnsibleParserError):
+            self._run(import_src="DOES_NOT_EXISTS.csv")
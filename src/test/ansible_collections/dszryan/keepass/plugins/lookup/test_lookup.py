@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+from shutil import copy
+from unittest import TestCase
+
+from ansible.plugins.loader import lookup_loader
+from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
+
+
+class TestLookupModule(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # the plugin is loaded the way a play loads it, its documentation is parsed on the way
+        # the collection is imported afresh through the finder, the modules the other tests imported are put back after
+        cls._imported = {name: sys.modules.pop(name) for name in list(sys.modules) if name.split(".")[0] == "ansible_collections"}
+        _AnsibleCollectionFinder(paths=[os.path.join(os.path.realpath(__file__).split(os.sep + "src" + os.sep)[0], "src", "main")])._install()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        _AnsibleCollectionFinder._remove()
+        list(map(lambda name: sys.modules.pop(name), [name for name in list(sys.modules) if name.split(".")[0] == "ansible_collections"]))
+        sys.modules.update(cls._imported)
+
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+        scratch = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "module_utils")
+        self._databases = {}
+        for name in ["team_a", "team_b"]:
+            location = os.path.join(self._directory.name, name + ".kdbx")
+            copy(os.path.join(scratch, "scratch.kdbx"), location)
+            self._databases[name] = {"location": location, "keyfile": os.path.join(scratch, "scratch.keyfile"), "password": "scratch"}
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_run_with_databases(self):
+        lookup = lookup_loader.get("dszryan.keepass.lookup")
+        self.assertIsNotNone(lookup)
+        actual = lookup.run([
+            {"database": "team_b", "term": "get://one/two/test?username"},
+            "get://one/two/test?url",
+            {"database": "team_a", "term": "get://one/two/DOES_NOT_EXISTS"}
+        ], variables=None, database=self._databases["team_a"], databases=self._databases)
+        self.assertEqual([False, False, True], [result["failed"] for result in actual])
+        self.assertEqual([{"username": "test_username"}, {"url": "test_url"}], [result["result"]["outcome"] for result in actual[:2]])
@@ -0,0 +1,113 @@
+import base64
+import glob
+import gzip
+import hashlib
+import itertools
+import os
+from unittest import TestCase, mock
+
+from lxml import etree
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.binary_stream import BinaryStream
+
+
+class TestBinaryStream(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx")
+        cls._keyfile = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile")
+        with open(cls._keyfile, mode="rb") as file:
+            cls._content = file.read()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        list(map(lambda file: os.remove(file), glob.glob(os.path.join(os.path.dirname(os.path.realpath(__file__)), "temp_*"))))
+
+    def setUp(self) -> None:
+        self._attachment = PyKeePass(self._location, password="scratch", keyfile=self._keyfile).find_entries_by_path("one/two/test", first=True).attachments[0]
+
+    @staticmethod
+    def _kdbx3_attachment(content: bytes, compressed: bool):
+        element = etree.Element("Binary", ID="0", Compressed="True" if compressed else "False")
+        element.text = base64.b64encode(gzip.compress(content) if compressed else content)
+        database = mock.Mock(version=(3, 1))
+        database._xpath.return_value = element
+        return mock.Mock(_kp=database, id=0)
+
+    def test_length_and_chunks_kdbx4(self):
+        self.assertEqual(len(self._content), BinaryStream.length(self._attachment))
+        self.assertEqual(self._content, b"".join(BinaryStream.chunks(self._attachment, chunk_size=100)))
+
+    def test_length_and_chunks_kdbx3(self):
+        for content, compressed in itertools.product([os.urandom(size) for size in [1, 4998, 4999, 5000]], [True, False]):
+            attachment = self._kdbx3_attachment(content, compressed)
+            with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.binary_stream.base64.b64decode", wraps=base64.b64decode) as b64decode:
+                self.assertEqual(len(content), BinaryStream.length(attachment))
+            # the length is worked out without decoding the binary
+            self.assertTrue(all(len(decoded[0][0]) <= 8 for decoded in b64decode.call_args_list))
+            self.assertEqual(content, b"".join(BinaryStream.chunks(attachment, chunk_size=100)))
+
+    def test_digest_is_cached_until_the_binary_changes(self):
+        expected = hashlib.sha256(self._content).hexdigest()
+        self.assertEqual(expected, BinaryStream.digest(self._attachment))
+        with mock.patch.object(BinaryStream, "chunks", side_effect=AssertionError("digest must be cached")):
+            self.assertEqual(expected, BinaryStream.digest(self._attachment))
+        database = self._attachment._kp
+        database.kdbx.body.payload.inner_header.binary[self._attachment.id].data = b"\x01changed"
+        self.assertEqual(hashlib.sha256(b"changed").hexdigest(), BinaryStream.digest(self._attachment))
+
+    def test_add_shares_identical_content(self):
+        database = self._attachment._kp
+        count = BinaryStream.count(database)
+        self.assertEqual(self._attachment.id, BinaryStream.add(database, self._content))
+        self.assertEqual(count, BinaryStream.count(database))
+        added = BinaryStream.add(database, b"new content")
+        self.assertEqual((count, count + 1), (added, BinaryStream.count(database)))
+        self.assertEqual(added, BinaryStream.find(database, hashlib.sha256(b"new content").hexdigest()))
+
+    def test_collect_removes_unreferenced_binaries(self):
+        database = self._attachment._kp
+        unreferenced = BinaryStream.add(database, b"unreferenced")
+        referenced = BinaryStream.add(database, b"referenced")
+        entry = database.find_entries_by_path("one/two/clone", first=True)
+        entry.add_attachment(referenced, "referenced")
+        self.assertEqual((1, len(b"unreferenced")), BinaryStream.collect(database, check_mode=True))
+        self.assertEqual(unreferenced + 2, BinaryStream.count(database))
+        self.assertEqual((1, len(b"unreferenced")), BinaryStream.collect(database))
+        self.assertEqual(unreferenced + 1, BinaryStream.count(database))
+        self.assertEqual(b"referenced", b"".join(BinaryStream.chunks(entry.attachments[0])))
+        self.assertEqual(self._content, b"".join(BinaryStream.chunks(self._attachment)))
+
+    def test_collect_renumbers_kdbx3_binaries(self):
+        database = self._attachment._kp
+        # the binaries move into the xml, as kdbx 3 keeps them, behind one nothing refers to
+        binaries = database.tree.find("Meta").makeelement("Binaries")
+        database.tree.find("Meta").append(binaries)
+        for binary_id, data in enumerate([b"orphan"] + database.binaries):
+            element = binaries.makeelement("Binary", ID=str(binary_id), Compressed="True")
+            element.text = base64.b64encode(gzip.compress(data)).decode()
+            binaries.append(element)
+        for value in database.tree.xpath("//Entry/Binary/Value[@Ref]"):
+            value.set("Ref", str(int(value.get("Ref")) + 1))
+        with mock.patch.object(PyKeePass, "version", new_callable=mock.PropertyMock, return_value=(3, 1)):
+            count = BinaryStream.count(database)
+            self.assertEqual(1, BinaryStream.collect(database)[0])
+            self.assertEqual(list(map(str, range(count - 1))), [element.get("ID") for element in binaries])
+            self.assertTrue(all(binaries.find('Binary[@ID="%s"]' % value.get("Ref")) is not None for value in database.tree.xpath("//Entry/Binary/Value[@Ref]")))
+            self.assertEqual(self._content, b"".join(BinaryStream.chunks(self._attachment)))
+            self.assertEqual(count - 1, BinaryStream.add(database, b"new content"))
+            self.assertEqual(b"new content", b"".join(BinaryStream._chunks(database, count - 1)))
+
+    def test_export_only_replaces_when_content_differs(self):
+        dest = os.path.join(os.path.dirname(os.path.realpath(__file__)), "temp_export")
+        expected = {"dest": dest, "size": len(self._content), "sha256": hashlib.sha256(self._content).hexdigest()}
+        self.assertEqual((True, expected), BinaryStream.export(self._attachment, dest, check_mode=True))
+        self.assertFalse(os.path.exists(dest))
+        self.assertEqual((True, expected), BinaryStream.export(self._attachment, dest))
+        with open(dest, mode="rb") as file:
+            self.assertEqual(self._content, file.read())
+        self.assertEqual((False, expected), BinaryStream.export(self._attachment, dest))
+        self.assertEqual((False, expected), BinaryStream.export(self._attachment, dest, check_mode=True))
+        self.assertEqual([], glob.glob(dest + ".*") + glob.glob(os.path.join(os.path.dirname(dest), ".temp_export.*")))
@@ -0,0 +1,119 @@
+import glob
+import os
+import random
+import socket
+import string
+from datetime import datetime, timezone
+from shutil import copy
+from unittest import TestCase, mock
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins import display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.daemon import Frame, KeepassDaemon, KeepassDaemonClient
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+
+
+class TestKeepassDaemon(TestCase):
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        list(map(lambda file: os.remove(file), glob.glob(os.path.join(os.path.dirname(os.path.realpath(__file__)), "temp_*"))))
+
+    def setUp(self) -> None:
+        DATABASE_CACHE.clear()
+        location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)) + ".kdbx")
+        copy(os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx"), location)
+        self._database_details = {
+            "location": location,
+            "keyfile": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile"),
+            "password": "scratch",
+            "updatable": True,
+            "cache_ttl": 0,
+            "daemon": True,
+            "daemon_idle_timeout": 30
+        }
+        self._display = mock.Mock()
+
+    def tearDown(self) -> None:
+        for socket_path in set(storage._client.socket_path for storage in getattr(self, "_storages", []) if storage._client is not None):
+            if KeepassDaemonClient(socket_path).is_available:
+                KeepassDaemonClient(socket_path).shutdown()
+
+    def _storage(self, details: dict) -> KeepassDatabase:
+        storage = KeepassDatabase(self._display, details)
+        self._storages = getattr(self, "_storages", []) + [storage]
+        return storage
+
+    def test_frame_round_trip(self):
+        left, right = socket.socketpair()
+        with left, right:
+            Frame.send(left, {"text": "value", "binary": b"\x00\x01", "time": datetime(2030, 1, 1, tzinfo=timezone.utc)})
+            self.assertEqual({"text": "value", "binary": b"\x00\x01", "time": datetime(2030, 1, 1, tzinfo=timezone.utc)}, Frame.receive(right))
+            left.close()
+            self.assertIsNone(Frame.receive(right))
+
+    def test_second_open_is_served_by_daemon(self):
+        first = self._storage(self._database_details)
+        self.assertIsNotNone(first._client)
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.PyKeePass") as py_keepass:
+            second = self._storage(self._database_details)
+            actual = second.execute(Query(display, True, "get://one/two/test?password").search, check_mode=False, fail_silently=False)
+        py_keepass.assert_not_called()
+        self.assertIsNone(second._database)
+        self.assertEqual({"password": "test_password"}, actual["result"]["outcome"])
+
+    def test_daemon_applies_updates_and_errors(self):
+        storage = self._storage(self._database_details)
+        actual = storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_daemon"}').search, check_mode=False, fail_silently=False)
+        self.assertTrue(actual["changed"])
+        self.assertEqual("url_daemon", self._storage(dict(self._database_details, daemon=False)).execute(Query(display, True, "get://one/two/test?url").search, check_mode=False, fail_silently=False)["result"]["outcome"]["url"])
+        self.assertTrue(storage.execute(Query(display, True, "get://one/two/DOES_NOT_EXISTS").search, check_mode=False, fail_silently=True)["failed"])
+        self.assertRaises(AnsibleParserError, storage.execute, Query(display, True, "get://one/two/DOES_NOT_EXISTS").search, False, False)
+
+    def test_daemon_executes_many_in_one_request(self):
+        self._storage(self._database_details)
+        second = self._storage(self._database_details)
+        actual = second.execute_many([Query(display, True, "get://one/two/test?username").search, Query(display, True, "get://one/two/DOES_NOT_EXISTS").search], check_mode=False, fail_silently=True)
+        self.assertEqual({"username": "test_username"}, actual[0]["result"]["outcome"])
+        self.assertTrue(actual[1]["failed"])
+
+    def test_daemon_respects_read_only_client(self):
+        self._storage(self._database_details)
+        read_only = self._storage(dict(self._database_details, updatable=False))
+        actual = read_only.execute(Query(display, False, "del://one/two/test").search, check_mode=False, fail_silently=True)
+        self.assertTrue(actual["failed"])
+        self.assertTrue("Invalid query - database is not 'updatable'" in actual["result"]["outcome"]["error"])
+
+    def test_open_waits_for_the_daemon_being_spawned(self):
+        self._storage(self._database_details)
+        # the daemon is not up yet when first asked, but is once the fork spawning it lets go of the lock
+        with mock.patch.object(KeepassDaemonClient, "is_available", new_callable=mock.PropertyMock, side_effect=[False, True]), \
+                mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.PyKeePass") as py_keepass:
+            second = self._storage(self._database_details)
+        py_keepass.assert_not_called()
+        self.assertIsNotNone(second._client)
+
+    def test_request_updatable_is_not_kept(self):
+        storage = KeepassDatabase(self._display, dict(self._database_details, daemon=False))
+        daemon = KeepassDaemon(storage, "test_request_updatable_is_not_kept")
+        actual = daemon._handle({"method": "execute", "search": Query(display, False, "del://one/two/test").search.__dict__, "check_mode": True, "fail_silently": True, "updatable": False})
+        self.assertTrue(actual["result"]["failed"])
+        self.assertTrue(storage.is_updatable)
+        self.assertFalse(daemon._handle({"method": "execute", "search": Query(display, False, "del://one/two/test").search.__dict__, "check_mode": True, "fail_silently": True, "updatable": True})["result"]["failed"])
+
+    def test_stalled_client_does_not_block_the_daemon(self):
+        with mock.patch.object(KeepassDaemon, "CONNECTION_TIMEOUT", 1):
+            storage = self._storage(self._database_details)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled, socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            stalled.connect(storage._client.socket_path)
+            stalled.sendall(b"\x00\x00")
+            connection.settimeout(10)
+            connection.connect(storage._client.socket_path)
+            Frame.send(connection, {"method": "execute", "search": Query(display, True, "get://one/two/test?username").search.__dict__, "check_mode": False, "fail_silently": False, "updatable": False})
+            self.assertEqual({"username": "test_username"}, Frame.receive(connection)["result"]["result"]["outcome"])
+
+    def test_client_unavailable_without_daemon(self):
+        self.assertFalse(KeepassDaemonClient(os.path.join(os.path.dirname(self._database_details["location"]), "missing.sock")).is_available)
@@ -0,0 +1,93 @@
+import glob
+import os
+import random
+import string
+from shutil import copy
+from unittest import TestCase, mock
+from unittest.mock import call
+
+from ansible.plugins import display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE, DatabaseCache
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+
+
+class TestDatabaseCache(TestCase):
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        list(map(lambda file: os.remove(file), glob.glob(os.path.join(os.path.dirname(os.path.realpath(__file__)), "temp_*"))))
+
+    def setUp(self) -> None:
+        DATABASE_CACHE.clear()
+        self._database_details_valid = {
+            "location": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx"),
+            "keyfile": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile"),
+            "password": "scratch",
+            "updatable": True
+        }
+        self._display = mock.Mock()
+
+    def _copy_database(self):
+        new_location = os.path.join(os.path.dirname(self._database_details_valid["location"]), "temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)) + ".kdbx")
+        copy(self._database_details_valid["location"], new_location)
+        return dict(self._database_details_valid, location=new_location)
+
+    def test_open_reuses_cached_database(self):
+        first = KeepassDatabase(self._display, self._database_details_valid)
+        second = KeepassDatabase(self._display, self._database_details_valid)
+        self.assertIs(first._database, second._database)
+        self.assertEqual(1, len(DATABASE_CACHE))
+        self._display.assert_has_calls([
+            call.v("Keepass: database opened - %s" % self._database_details_valid["location"]),
+            call.v("Keepass: database found - %s" % self._database_details_valid["location"]),
+            call.vvv("Keepass: keyfile found - %s" % self._database_details_valid["keyfile"]),
+            call.v("Keepass: database opened (cached) - %s" % self._database_details_valid["location"])
+        ])
+
+    def test_open_disabled_when_ttl_is_zero(self):
+        first = KeepassDatabase(self._display, dict(self._database_details_valid, cache_ttl=0))
+        second = KeepassDatabase(self._display, dict(self._database_details_valid, cache_ttl=0))
+        self.assertIsNot(first._database, second._database)
+        self.assertEqual(0, len(DATABASE_CACHE))
+
+    def test_open_expired_entry_is_reopened(self):
+        first = KeepassDatabase(self._display, self._database_details_valid)
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.database_cache.time.monotonic", return_value=float("inf")):
+            second = KeepassDatabase(self._display, self._database_details_valid)
+        self.assertIsNot(first._database, second._database)
+
+    def test_key_differs_by_credentials(self):
+        location, keyfile = self._database_details_valid["location"], self._database_details_valid["keyfile"]
+        self.assertEqual(DatabaseCache.key(location, keyfile, "scratch", None), DatabaseCache.key(location, keyfile, "scratch", None))
+        self.assertNotEqual(DatabaseCache.key(location, keyfile, "scratch", None), DatabaseCache.key(location, keyfile, "other", None))
+        self.assertNotEqual(DatabaseCache.key(location, keyfile, "scratch", None), DatabaseCache.key(location, None, "scratch", None))
+
+    def test_save_replaces_cached_version(self):
+        database_details = self._copy_database()
+        storage = KeepassDatabase(self._display, database_details)
+        old_key = storage._cache_key
+        storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_cached"}').search, check_mode=False, fail_silently=False)
+        self.assertNotEqual(old_key, storage._cache_key)
+        self.assertIsNone(DATABASE_CACHE.get(old_key, DatabaseCache.DEFAULT_TTL))
+        self.assertIs(storage._database, KeepassDatabase(self._display, database_details)._database)
+
+    def test_failed_update_discards_cached_database(self):
+        database_details = self._copy_database()
+        storage = KeepassDatabase(self._display, database_details)
+        failed = storage._database
+        storage.execute(Query(display, False, "del://one/two/DOES_NOT_EXISTS").search, check_mode=False, fail_silently=True)
+        # the handle the update failed on is replaced by one read afresh from the file
+        self.assertIsNot(failed, DATABASE_CACHE.get(storage._cache_key, DatabaseCache.DEFAULT_TTL))
+        self.assertIs(storage._database, DATABASE_CACHE.get(storage._cache_key, DatabaseCache.DEFAULT_TTL))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = DatabaseCache(size=2)
+        cache.put(("a", 1, 1, 1, "x"), mock.sentinel.a, 60)
+        cache.put(("b", 1, 1, 1, "x"), mock.sentinel.b, 60)
+        cache.get(("a", 1, 1, 1, "x"), 60)
+        cache.put(("c", 1, 1, 1, "x"), mock.sentinel.c, 60)
+        self.assertIs(mock.sentinel.a, cache.get(("a", 1, 1, 1, "x"), 60))
+        self.assertIsNone(cache.get(("b", 1, 1, 1, "x"), 60))
+        self.assertIs(mock.sentinel.c, cache.get(("c", 1, 1, 1, "x"), 60))
@@ -0,0 +1,56 @@
+import os
+from unittest import TestCase
+from uuid import UUID
+
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_index import DatabaseIndex
+
+
+class TestDatabaseIndex(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx")
+        cls._keyfile = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile")
+
+    def setUp(self) -> None:
+        self._database = PyKeePass(self._location, password="scratch", keyfile=self._keyfile)
+        self._index = DatabaseIndex.of(self._database)
+
+    def test_of_is_shared_per_database(self):
+        self.assertIs(self._index, DatabaseIndex.of(self._database))
+
+    def test_find_matches_xpath_search(self):
+        for path in ["one/two/test", "/one/two/clone", "one/two/DOES_NOT_EXISTS", "test"]:
+            self.assertEqual(self._database.find_entries_by_path(path=path, first=True), self._index.find_entry_by_path(path))
+        for group_path in ["/", "one", "one/two/", "three", "four"]:
+            expected, actual = self._database.find_groups(path=group_path, regex=False, first=True), self._index.find_group_by_path(group_path)
+            self.assertEqual(None if expected is None else expected.path, None if actual is None else actual.path)
+        self.assertEqual("one/two/test", self._index.find_entry_by_uuid(UUID("9366b38f-2ee9-412f-a6ba-b2ab10d1f100")).path)
+        self.assertIsNone(self._index.find_entry_by_uuid(UUID("00000000-0000-0000-0000-000000000000")))
+
+    def test_kept_in_sync_on_add_and_remove(self):
+        group = self._database.add_group(self._index.find_group_by_path("three"), "four")
+        self._index.add_group(group)
+        entry = self._database.add_entry(group, "new", "username", "password")
+        self._index.add_entry(entry)
+        self.assertEqual(entry, self._index.find_entry_by_path("three/four/new"))
+        self.assertEqual(entry, self._index.find_entry_by_uuid(entry.uuid))
+        self.assertEqual("three/four/", self._index.find_group_by_path("three/four").path)
+
+        self._index.remove_entry(entry)
+        self._database.delete_entry(entry)
+        self.assertIsNone(self._index.find_entry_by_path("three/four/new"))
+        self.assertIsNone(self._index.find_entry_by_uuid(entry.uuid))
+
+    def test_removing_a_duplicate_path_exposes_the_next_entry(self):
+        group = self._index.find_group_by_path("one/two")
+        duplicate = self._database.add_entry(group, "test", "other_username", "password")
+        self._index.add_entry(duplicate)
+        original = self._index.find_entry_by_path("one/two/test")
+        self.assertNotEqual(duplicate, original)
+
+        self._index.remove_entry(original)
+        self._database.delete_entry(original)
+        self.assertEqual(duplicate, self._index.find_entry_by_path("one/two/test"))
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+from shutil import copy
+from unittest import TestCase, mock
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins import display
+from pykeepass.exceptions import CredentialsError
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_pool import DatabasePool
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+
+
+class TestDatabasePool(TestCase):
+
+    def setUp(self) -> None:
+        DATABASE_CACHE.clear()
+        self._directory = tempfile.TemporaryDirectory()
+        self._display = mock.Mock()
+        database = {
+            "location": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx"),
+            "keyfile": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile"),
+            "password": "scratch"
+        }
+        self._databases = {}
+        for name in ["team_a", "team_b"]:
+            location = os.path.join(self._directory.name, name + ".kdbx")
+            copy(database["location"], location)
+            self._databases[name] = dict(database, location=location, updatable=True)
+            KeepassDatabase(self._display, self._databases[name]).execute(Query(display, False, 'put://one/two/test#{"url": "%s_url"}' % name).search, check_mode=False, fail_silently=False)
+        DATABASE_CACHE.clear()
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_execute_many_keeps_the_order_of_the_searches(self):
+        searches = [
+            ("team_b", Query(display, True, "get://one/two/test?url").search),
+            ("team_a", Query(display, True, "get://one/two/test?url").search),
+            ("team_b", Query(display, True, "get://one/two/DOES_NOT_EXISTS").search),
+            ("team_a", Query(display, True, "get://one/two/test?username").search)
+        ]
+        # both databases have to be queried at the same time to pass the barrier
+        opened_by, execute_many, barrier = set(), KeepassDatabase.execute_many, threading.Barrier(2, timeout=30)
+
+        def record(storage, *args):
+            opened_by.add(threading.current_thread().name)
+            barrier.wait()
+            return execute_many(storage, *args)
+
+        with mock.patch.object(KeepassDatabase, "execute_many", autospec=True, side_effect=record):
+            actual = DatabasePool(self._display, self._databases).execute_many(searches, check_mode=False, fail_silently=True)
+        self.assertEqual([{"url": "team_b_url"}, {"url": "team_a_url"}, None, {"username": "test_username"}], [result["result"]["outcome"] if not result["failed"] else None for result in actual])
+        self.assertEqual([search.__dict__ for name, search in searches], [result["result"]["search"] for result in actual])
+        self.assertEqual(2, len(opened_by))
+        self.assertTrue(all(name.startswith("keepass") for name in opened_by))
+
+    def test_execute_many_single_database_runs_inline(self):
+        actual = DatabasePool(self._display, {None: self._databases["team_a"]}).execute_many([(None, Query(display, True, "get://one/two/test?url").search)], check_mode=False, fail_silently=False)
+        self.assertEqual({"url": "team_a_url"}, actual[0]["result"]["outcome"])
+
+    def test_execute_many_daemon_only_from_the_main_thread(self):
+        databases = {name: dict(details, daemon=True) for name, details in self._databases.items()}
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.KeepassDaemon") as daemon:
+            actual = DatabasePool(self._display, databases).execute_many([(name, Query(display, True, "get://one/two/test?url").search) for name in databases], check_mode=False, fail_silently=False)
+        daemon.assert_not_called()
+        self.assertEqual([{"url": "team_a_url"}, {"url": "team_b_url"}], [result["result"]["outcome"] for result in actual])
+
+    def test_execute_many_invalid_database(self):
+        pool = DatabasePool(self._display, dict(self._databases, **{"none": None}))
+        for name in ["DOES_NOT_EXISTS", "none", None]:
+            self.assertRaises(AnsibleParserError, pool.execute_many, [("team_a", Query(display, True, "get://one/two/test").search), (name, Query(display, True, "get://one/two/test").search)], False, True)
+        with self.assertRaises(CredentialsError):
+            DatabasePool(self._display, dict(self._databases, team_b=dict(self._databases["team_b"], password="invalid"))).execute_many(
+                [("team_a", Query(display, True, "get://one/two/test").search), ("team_b", Query(display, True, "get://one/two/test").search)], False, True)
@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timezone
+from unittest import TestCase
+
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.history_retention import HistoryRetention
+
+
+class TestHistoryRetention(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx")
+        cls._keyfile = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile")
+        cls._now = datetime(2020, 11, 3, tzinfo=timezone.utc)
+
+    def setUp(self) -> None:
+        self._database = PyKeePass(self._location, password="scratch", keyfile=self._keyfile)
+        self._entry = self._database.find_entries_by_path("one/two/test", first=True)
+        self._history = self._entry.history
+
+    def _expired(self, retention: HistoryRetention) -> list:
+        # history items share the uuid of their entry, they are told apart by their modification time
+        return [[history.mtime for history in self._history].index(item.mtime) for item in retention.expired(self._entry, self._now)]
+
+    def test_limits(self):
+        self.assertFalse(HistoryRetention().enabled)
+        self.assertEqual([], self._expired(HistoryRetention()))
+        self.assertEqual([0, 1, 2], self._expired(HistoryRetention(max_items=2)))
+        self.assertEqual([0, 1, 2, 3, 4], self._expired(HistoryRetention(max_items=0)))
+        self.assertEqual([0], self._expired(HistoryRetention(max_age=1)))
+        self.assertEqual([0, 1, 2], self._expired(HistoryRetention(max_bytes=7000)))
+        self.assertEqual([0, 1, 2], self._expired(HistoryRetention(max_items=4, max_age=1, max_bytes=7000)))
+
+    def test_limits_validated(self):
+        self.assertEqual(3, HistoryRetention(max_items="3").max_items)
+        for limit in [-1, "many", 1.5, True]:
+            self.assertRaises(AttributeError, HistoryRetention, limit)
+
+    def test_of_database(self):
+        retention = HistoryRetention.of(self._database)
+        self.assertEqual((10, None, 6291456), (retention.max_items, retention.max_age, retention.max_bytes))
+
+    def test_prune(self):
+        expired, released = HistoryRetention(max_items=2).prune(self._entry, self._now, check_mode=True)
+        self.assertEqual(3, len(expired))
+        self.assertTrue(released > 0)
+        self.assertEqual(5, len(self._entry.history))
+        HistoryRetention(max_items=2).prune(self._entry, self._now)
+        self.assertEqual([item.mtime for item in self._history[3:]], [item.mtime for item in self._entry.history])
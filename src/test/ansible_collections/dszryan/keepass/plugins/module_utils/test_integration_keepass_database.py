@@ -1,5 +1,7 @@
 import base64
+import fcntl
 import glob
+import hashlib
 import json
 import os
 import random
@@ -15,8 +17,11 @@ from ansible.plugins import display
 from pykeepass import PyKeePass
 from pykeepass.exceptions import CredentialsError
 
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.file_lock import FileLock
 from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase, EntryDump
 from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+from ansible_collections.dszryan.keepass.plugins.module_utils.search import Search
 
 
 # noinspection DuplicatedCode
@@ -37,6 +42,7 @@ class TestStorage(TestCase):
         return new_dict
 
     def setUp(self) -> None:
+        DATABASE_CACHE.clear()
         self._database_details_valid = {
             "location": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx"),
             "keyfile": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile"),
@@ -177,6 +183,29 @@ class TestStorage(TestCase):
             call.v(u"Keepass: database saved - %s" % database_details_save["location"])
         ])
 
+    def test__save_valid_replaces_file_atomically(self):
+        database_details_save = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        os.chmod(database_details_save["location"], 0o640)
+        before = os.stat(database_details_save["location"])
+        storage = KeepassDatabase(self._display, database_details_save)
+        storage._save()
+        after = os.stat(database_details_save["location"])
+        self.assertNotEqual(before.st_ino, after.st_ino)
+        self.assertEqual(0o640, after.st_mode & 0o7777)
+        self.assertEqual([], glob.glob(os.path.join(os.path.dirname(database_details_save["location"]), ".temp_*")))
+        self.assertDictEqual(self._database_entry, KeepassDatabase(self._display, database_details_save).get(self._search_path_valid.search)[1])
+
+    def test__save_invalid_leaves_file_untouched(self):
+        database_details_save = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        with open(database_details_save["location"], mode="rb") as file:
+            before = file.read()
+        storage = KeepassDatabase(self._display, database_details_save)
+        with mock.patch.object(storage._database, "save", side_effect=IOError("disk full")):
+            self.assertRaises(IOError, storage._save)
+        with open(database_details_save["location"], mode="rb") as file:
+            self.assertEqual(before, file.read())
+        self.assertEqual([], glob.glob(os.path.join(os.path.dirname(database_details_save["location"]), ".temp_*")))
+
     # def test__save_invalid(self):
     #     storage = Storage(self._display)
     #     self.assertRaises(AttributeError, storage._save, None, self._search_path_valid)
@@ -269,6 +298,109 @@ class TestStorage(TestCase):
             call.vv("KeePass: entry found - %s" % self._noop_path_valid.search)
         ])
 
+    def test__entry_upsert_valid_attachment_src(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        unchanged = Query(display, False, 'put://one/two/test#{"attachments": [{"src": "%s"}]}' % database_details_upsert["keyfile"]).search
+        self.assertEqual((False, self._database_entry), storage._entry_upsert(unchanged, check_mode=False))
+
+        changed = Query(display, False, 'put://one/two/test#{"attachments": [{"filename": "scratch.keyfile", "src": "%s"}]}' % database_details_upsert["location"]).search
+        has_changed, updated_entry = storage._entry_upsert(changed, check_mode=False)
+        self.assertTrue(has_changed)
+        self.assertEqual([{"filename": "scratch.keyfile", "length": os.path.getsize(self._database_details_valid["location"])}], updated_entry["attachments"])
+
+        missing = Query(display, False, 'put://one/two/test#{"attachments": [{"src": "DOES_NOT_EXISTS"}]}').search
+        with self.assertRaises(AttributeError):
+            storage._entry_upsert(missing, check_mode=False)
+
+    def test__entry_upsert_valid_attachment_shares_binary(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        count = len(storage._database.binaries)
+        storage._entry_upsert(Query(display, False, 'put://one/two/clone#{"attachments": [{"src": "%s"}]}' % database_details_upsert["keyfile"]).search, check_mode=False)
+        self.assertEqual(count, len(storage._database.binaries))
+        self.assertEqual(storage._entry_find(self._search_path_valid.search).attachments[0].id, storage._entry_find(self._query_clone.search).attachments[0].id)
+
+    def test_maintain_collect_binaries(self):
+        database_details_maintain = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_maintain)
+        self.assertEqual({"changed": False, "failed": False, "result": {"maintenance": "collect_binaries", "outcome": {"binaries_removed": 0, "bytes_released": 0}}}, storage.maintain("collect_binaries", check_mode=False))
+        # only the history of the deleted entry referred to the second binary
+        storage.execute(self._delete_entry.search, check_mode=False, fail_silently=False)
+        self.assertTrue(storage.maintain("collect_binaries", check_mode=True)["changed"])
+        self.assertEqual({"changed": True, "failed": False, "result": {"maintenance": "collect_binaries", "outcome": {"binaries_removed": 1, "bytes_released": 18}}}, storage.maintain("collect_binaries", check_mode=False))
+        self.assertEqual([2048], list(map(len, PyKeePass(database_details_maintain["location"], password=database_details_maintain["password"], keyfile=database_details_maintain["keyfile"]).binaries)))
+        with self.assertRaises(AnsibleParserError):
+            storage.maintain("DOES_NOT_EXISTS", check_mode=False)
+        with self.assertRaises(AnsibleParserError):
+            KeepassDatabase(self._display, dict(database_details_maintain, updatable=False)).maintain("collect_binaries", check_mode=False)
+
+    def test_maintain_compact(self):
+        database_details_maintain = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), history_max_items=0)
+        # within the limits set in the database itself, there is nothing to compact
+        self.assertFalse(KeepassDatabase(self._display, dict(database_details_maintain, history_max_items=None)).maintain("compact", check_mode=False)["changed"])
+
+        storage = KeepassDatabase(self._display, database_details_maintain)
+        size_before = os.path.getsize(database_details_maintain["location"])
+        actual = storage.maintain("compact", check_mode=True)
+        self.assertTrue(actual["changed"])
+        self.assertEqual({"history_removed": 8, "binaries_removed": 1, "size_before": size_before, "size_after": None}, {key: value for key, value in actual["result"]["outcome"].items() if key != "bytes_released"})
+        self.assertEqual(5, len(storage._entry_find(self._search_path_valid.search).history))
+
+        actual = storage.maintain("compact", check_mode=False)["result"]["outcome"]
+        self.assertEqual((8, 1), (actual["history_removed"], actual["binaries_removed"]))
+        self.assertTrue(actual["bytes_released"] > 18)
+        self.assertEqual(os.path.getsize(database_details_maintain["location"]), actual["size_after"])
+        self.assertTrue(actual["size_after"] < actual["size_before"])
+        reopened = PyKeePass(database_details_maintain["location"], password=database_details_maintain["password"], keyfile=database_details_maintain["keyfile"])
+        self.assertEqual([[], []], [entry.history for entry in reopened.entries])
+        self.assertEqual([2048], list(map(len, reopened.binaries)))
+        self.assertFalse(storage.maintain("compact", check_mode=False)["changed"])
+        with self.assertRaises(AnsibleParserError):
+            KeepassDatabase(self._display, dict(database_details_maintain, history_max_items="many"))
+
+    def test_maintain_kdf(self):
+        actual = KeepassDatabase(self._display, dict(self._database_details_valid, kdf_target_ms=1)).maintain("kdf", check_mode=False)
+        self.assertFalse(actual["changed"])
+        outcome = actual["result"]["outcome"]
+        self.assertEqual(("4.0", "aes256", True, 1), (outcome["version"], outcome["cipher"], outcome["compression"], outcome["target_ms"]))
+        self.assertEqual({"type": "argon2", "iterations": 23, "memory": 67108864, "parallelism": 2, "version": 19}, outcome["kdf"])
+        self.assertFalse(outcome["on_target"])
+        self.assertEqual(1, outcome["recommended"]["iterations"])
+        with self.assertRaises(AnsibleParserError):
+            KeepassDatabase(self._display, dict(self._database_details_valid, kdf_target_ms="fast"))
+
+    def test_maintain_rekey(self):
+        database_details_maintain = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), updatable=True, kdf_target_ms=1)
+        with open(database_details_maintain["location"], mode="rb") as file:
+            content = file.read()
+        storage = KeepassDatabase(self._display, database_details_maintain)
+        self.assertTrue(storage.maintain("rekey", check_mode=True)["changed"])
+        with open(database_details_maintain["location"], mode="rb") as file:
+            self.assertEqual(content, file.read())
+
+        actual = storage.maintain("rekey", check_mode=False)
+        self.assertTrue(actual["changed"])
+        self.assertEqual(actual["result"]["outcome"]["recommended"]["memory"], 1048576)
+        reopened = PyKeePass(database_details_maintain["location"], password=database_details_maintain["password"], keyfile=database_details_maintain["keyfile"])
+        self.assertEqual(reopened.kdbx.header.value.dynamic_header.kdf_parameters.data.dict["M"].value, 1048576)
+        self.assertEqual("test_password", reopened.find_entries_by_path("one/two/test", first=True).password)
+        # the database stays usable with the key derived for its new parameters
+        storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_rekeyed"}').search, check_mode=False, fail_silently=False)
+        self.assertEqual("url_rekeyed", KeepassDatabase(self._display, database_details_maintain).execute(Query(display, True, "get://one/two/test?url").search, False, False)["result"]["outcome"]["url"])
+        self.assertFalse(storage.maintain("rekey", check_mode=False)["changed"])
+        with self.assertRaises(AnsibleParserError):
+            KeepassDatabase(self._display, dict(database_details_maintain, transformed_key=storage._database.transformed_key)).maintain("rekey", check_mode=False)
+
+    def test__entry_upsert_valid_prunes_history(self):
+        database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), history_max_items=2)
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        history = [item.mtime for item in storage._entry_find(self._search_path_valid.search).history]
+        storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_updated"}').search, check_mode=False, fail_silently=False)
+        pruned = PyKeePass(database_details_upsert["location"], password=database_details_upsert["password"], keyfile=database_details_upsert["keyfile"]).find_entries_by_path("one/two/test", first=True).history
+        self.assertEqual(history[-1:], [item.mtime for item in pruned[:1]])
+        self.assertEqual(["test_url"], [item.url for item in pruned[1:]])
+
     def test__entry_insert_valid(self):
         database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
         storage = KeepassDatabase(self._display, database_details_upsert)
@@ -296,6 +428,26 @@ class TestStorage(TestCase):
             call.vv("KeePass: entry found - %s" % self._search_path_valid.search)
         ])
 
+    def test_get_valid_entry_fields(self):
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        has_changed, actual_entry = storage.get(Query(display, True, "get://one/two/test", "username,url").search, check_mode=False)
+        self.assertFalse(has_changed)
+        self.assertDictEqual({"username": self._database_entry["username"], "url": self._database_entry["url"]}, actual_entry)
+
+    def test_get_invalid_fields(self):
+        with self.assertRaises(AnsibleParserError):
+            Query(display, True, "get://one/two/test", ["username", "DOES_NOT_EXISTS"]).search
+        with self.assertRaises(AnsibleParserError):
+            Query(display, True, "get://one/two/test?password", ["username"]).search
+
+    def test_entry_dump_resolves_lazily(self):
+        entry = mock.Mock(title="test", username="test_username")
+        type(entry).attachments = mock.PropertyMock(side_effect=AssertionError("attachments must not be read"))
+        dump = EntryDump(entry, ["title", "username"])
+        self.assertDictEqual({"title": "test", "username": "test_username"}, dump.__dict__)
+        with self.assertRaises(AssertionError):
+            getattr(dump, "attachments")
+
     def test_get_valid_property(self):
         storage = KeepassDatabase(self._display, self._database_details_valid)
         has_changed, actual_entry = storage.get(self._query_password.search, check_mode=False)
@@ -335,6 +487,23 @@ class TestStorage(TestCase):
             call.vv("KeePass: found property/file on entry - %s" % self._query_file.search)
         ])
 
+    def test_get_valid_file_dest(self):
+        dest = os.path.join(os.path.dirname(self._database_details_valid["location"]), "temp_get_valid_file_dest")
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        has_changed, actual_entry = storage.get(Query(display, True, "get://one/two/test?scratch.keyfile", dest=dest).search, check_mode=False)
+        with open(self._database_details_valid["keyfile"], mode="rb") as expected, open(dest, mode="rb") as actual:
+            content = expected.read()
+            self.assertTrue(has_changed)
+            self.assertEqual(content, actual.read())
+            self.assertDictEqual({"scratch.keyfile": {"dest": dest, "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}}, actual_entry)
+
+    def test_get_invalid_dest(self):
+        with self.assertRaises(AnsibleParserError):
+            Query(display, True, "get://one/two/test", dest="temp_dest").search
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        with self.assertRaises(AttributeError):
+            storage.get(Search(display, True, "get", "one/two/test", "password", None, False, dest="temp_dest"), check_mode=False)
+
     def test_get_valid_clone(self):
         storage = KeepassDatabase(self._display, self._database_details_valid)
         has_changed, actual_entry = storage.get(self._query_clone.search, check_mode=False)
@@ -349,6 +518,27 @@ class TestStorage(TestCase):
             call.vv("KeePass: found property/file on entry - %s" % self._query_clone.search)
         ])
 
+    def test_get_valid_clone_entry_resolves_references(self):
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        has_changed, actual_entry = storage.get(Query(display, True, "get://one/two/clone").search, check_mode=False)
+        self.assertFalse(has_changed)
+        self.assertDictEqual(dict(self._clone_entry, username=self._database_entry["username"], password=self._database_entry["password"]), actual_entry)
+
+    def test_get_valid_reference_chain(self):
+        database_details_reference = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_reference)
+        execute = lambda term, read_only=False: storage.execute(Query(display, read_only, term).search, check_mode=False, fail_silently=False)["result"]["outcome"]
+        execute('post://three/hop#{"username": "{REF:U@T:clone}", "password": "{REF:P@T:clone}-{REF:T@T:clone}"}')
+        self.assertEqual({"password": self._database_entry["password"] + "-clone"}, execute("get://three/hop?password", True))
+        self.assertEqual({"username": self._database_entry["username"]}, execute("get://three/hop?username", True))
+
+        # a change to any entry along the chain is seen by the next read
+        execute('put://one/two/test#{"password": "password_updated"}')
+        self.assertEqual({"password": "password_updated-clone"}, execute("get://three/hop?password", True))
+
+        execute('put://three/hop#{"notes": "{REF:N@T:hop}"}')
+        self.assertRaisesRegex(AnsibleParserError, "Invalid reference - cycle", execute, "get://three/hop?notes", True)
+
     def test_get_invalid(self):
         storage = KeepassDatabase(self._display, self._database_details_valid)
         self.assertRaises(AttributeError, storage.get, self._query_invalid.search, False)
@@ -388,6 +578,18 @@ class TestStorage(TestCase):
             call.vv("KeePass: entry found - %s" % self._delete_password.search)
         ])
 
+    def test_delete_valid_title_moves_the_entry(self):
+        database_details_delete = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_delete)
+        entry_uuid = storage._index.find_entry_by_path("one/two/test").uuid
+        has_changed, deleted_entry = storage.delete(Query(display, False, "del://one/two/test?title").search, check_mode=False)
+        self.assertTrue(has_changed)
+        self.assertEqual(("", "test_username"), (deleted_entry["title"], deleted_entry["username"]))
+        self.assertIsNone(storage._index.find_entry_by_path("one/two/test"))
+        self.assertEqual("test_username", storage._index.find_entry_by_uuid(entry_uuid).username)
+        self.assertRaises(AnsibleError, storage.get, self._search_path_valid.search, False)
+        self.assertIsNone(KeepassDatabase(self._display, dict(database_details_delete, cache_ttl=0))._index.find_entry_by_path("one/two/test"))
+
     def test_delete_valid_custom(self):
         database_details_delete = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
         storage = KeepassDatabase(self._display, database_details_delete)
@@ -540,6 +742,290 @@ class TestStorage(TestCase):
         ])
         # {\'search\': \'{"action": "del", "path": "one/two/test", "field": null, "value": "", "value_was_provided": false}\'}, {\'check_mode\': \'False\'}, {\'\': \'False\'}]
 
+    def test_execute_many_valid_resolves_each_entry_once(self):
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        searches = [self._query_password.search, self._query_custom.search, self._query_invalid.search, self._search_path_invalid.search, self._query_password.search]
+        with mock.patch.object(storage._index, "find_entry_by_path", wraps=storage._index.find_entry_by_path) as find_entry_by_path:
+            actual = storage.execute_many(searches, check_mode=False, fail_silently=True)
+        self.assertEqual(2, find_entry_by_path.call_count)
+        self.assertEqual([search.__dict__ for search in searches], [result["result"]["search"] for result in actual])
+        self.assertEqual([False, False, True, True, False], [result["failed"] for result in actual])
+        self.assertEqual({"password": "test_password"}, actual[0]["result"]["outcome"])
+        self.assertEqual({"test_custom_key": "test_custom_value"}, actual[1]["result"]["outcome"])
+        self.assertEqual(actual[0], actual[4])
+        self.assertIsNone(storage._resolved_entries)
+
+    def test_execute_many_valid_updates_are_not_shared(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        actual = storage.execute_many([Query(display, False, "get://one/two/test?url").search, self._update_path_valid.search, Query(display, False, "get://one/two/test?url").search], check_mode=False, fail_silently=False)
+        self.assertEqual(["test_url", "url_updated"], [actual[0]["result"]["outcome"]["url"], actual[2]["result"]["outcome"]["url"]])
+
+    def test_execute_transaction_valid_saves_once(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        with mock.patch.object(storage._database, "save", wraps=storage._database.save) as save:
+            actual = storage.execute_transaction([self._update_path_valid.search, self._insert_path_valid.search, self._delete_clone.search], check_mode=False)
+        self.assertEqual(1, save.call_count)
+        self.assertEqual([True, True, True], [result["changed"] for result in actual])
+        reopened = KeepassDatabase(self._display, dict(database_details_upsert, cache_ttl=0))
+        self.assertDictEqual(self._update_entry_value, reopened.get(self._search_path_valid.search)[1])
+        self.assertDictEqual(dict(self._insert_entry_value, username=None, password=None), reopened.get(Query(display, True, "get://new_path/one/two/test").search)[1])
+        self.assertEqual(None, reopened.get(Query(display, True, "get://one/two/clone").search)[1]["password"])
+
+    def test_execute_valid_metrics(self):
+        DATABASE_CACHE.clear()
+        storage = KeepassDatabase(self._display, dict(self._database_details_valid, metrics=True))
+        actual = storage.execute(self._query_password.search, check_mode=False, fail_silently=False)
+        self.assertEqual({"password": "test_password"}, actual["result"]["outcome"])
+        self.assertEqual(["entry_find", "open"], sorted(actual["metrics"]["timings_ms"].keys()))
+        self.assertEqual({"database_cache_miss": 1}, actual["metrics"]["counters"])
+        actual = storage.execute(self._query_password.search, check_mode=False, fail_silently=False)
+        self.assertEqual(["entry_find"], list(actual["metrics"]["timings_ms"].keys()))
+        self.assertNotIn("metrics", KeepassDatabase(self._display, self._database_details_valid).execute(self._query_password.search, check_mode=False, fail_silently=False))
+
+    def test_execute_transaction_valid_metrics(self):
+        database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), metrics=True)
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        actual = storage.execute_transaction([self._update_path_valid.search, self._delete_clone.search], check_mode=False)
+        self.assertIn("upsert", actual[0]["metrics"]["timings_ms"])
+        self.assertNotIn("save", actual[0]["metrics"]["timings_ms"])
+        self.assertIn("save", actual[1]["metrics"]["timings_ms"])
+
+    def test_execute_valid_find(self):
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        actual = storage.execute(Query(display, True, "find://one/**", "path,title").search, check_mode=False, fail_silently=False)
+        self.assertEqual([{"path": "one/two/", "title": "test"}, {"path": "one/two/", "title": "clone"}], actual["result"]["outcome"])
+        actual = storage.execute(Query(display, True, "find://one/*", "title").search, check_mode=False, fail_silently=False)
+        self.assertEqual([], actual["result"]["outcome"])
+        actual = storage.execute(Search(display, True, "find", "t.st$", None, None, False, fields="title", match="regex"), check_mode=False, fail_silently=False)
+        self.assertEqual([{"title": "test"}], actual["result"]["outcome"])
+        self.assertEqual([EntryDump(storage._entry_find(self._search_path_valid.search)).__dict__], storage.find(Query(display, True, "find://one/two/te*").search)[1])
+
+    def test_execute_valid_find_tags(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        storage.execute(Query(display, False, 'put://one/two/clone#{"tags": "db;primary,prod"}').search, check_mode=False, fail_silently=False)
+        actual = storage.execute(Query(display, True, "find://**", "title", tags="db,prod").search, check_mode=False, fail_silently=False)
+        self.assertEqual([{"title": "clone"}], actual["result"]["outcome"])
+        actual = storage.execute(Query(display, True, "find://**", "title", tags=["db", "missing"]).search, check_mode=False, fail_silently=False)
+        self.assertEqual([], actual["result"]["outcome"])
+
+    def test_execute_invalid_find(self):
+        self.assertRaises(AnsibleParserError, lambda: Query(display, True, "find://one/**?password").search)
+        self.assertRaises(AnsibleParserError, lambda: Query(display, True, "find://one/**#default").search)
+        self.assertRaises(AnsibleParserError, lambda: Query(display, True, "find://one/(", match="regex").search)
+        self.assertRaises(AnsibleParserError, lambda: Query(display, True, "find://one/**", match="fuzzy").search)
+        self.assertRaises(AnsibleParserError, lambda: Query(display, True, "get://one/two/test", tags="db").search)
+
+    def test_bulk_import_valid_saves_once(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        searches = [
+            Search(display, False, "put", "new/group/first", None, {"username": "first_username", "custom": "value"}, True),
+            Search(display, False, "put", "one/two/test", None, {"url": "url_imported"}, True),
+            Search(display, False, "put", "one/two/test", None, {"url": "url_imported"}, True),
+            Search(display, False, "put", "new/group/first", None, {"password": "first_password"}, True)
+        ]
+        with mock.patch.object(storage._database, "save", wraps=storage._database.save) as save:
+            actual = storage.bulk_import(searches, check_mode=False)
+        self.assertEqual(1, save.call_count)
+        self.assertTrue(actual["changed"])
+        self.assertEqual({"created": 1, "updated": 2, "unchanged": 1}, actual["result"]["counts"])
+        self.assertEqual(["created", "updated", "unchanged", "updated"], [record["status"] for record in actual["result"]["records"]])
+        reopened = KeepassDatabase(self._display, dict(database_details_upsert, cache_ttl=0))
+        self.assertEqual("url_imported", reopened.get(self._search_path_valid.search)[1]["url"])
+        first = reopened.get(Query(display, True, "get://new/group/first").search)[1]
+        self.assertEqual(("first_username", "first_password", {"custom": "value"}), (first["username"], first["password"], first["custom_properties"]))
+
+    def test_bulk_import_invalid_not_updatable(self):
+        storage = KeepassDatabase(self._display, dict(self._database_details_valid, updatable=False))
+        self.assertRaises(AnsibleParserError, storage.bulk_import, [Search(display, False, "put", "new/first", None, {"url": "url"}, True)], False)
+
+    def test_bulk_import_valid_check_mode(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        searches = [
+            Search(display, False, "put", "new/group/first", None, {"username": "first_username"}, True),
+            Search(display, False, "put", "one/two/test", None, {"url": "url_imported"}, True),
+            Search(display, False, "put", "one/two/test", None, {"url": "test_url"}, True)
+        ]
+        with mock.patch.object(storage._database, "save", wraps=storage._database.save) as save:
+            actual = storage.bulk_import(searches, check_mode=True)
+        self.assertEqual(0, save.call_count)
+        self.assertEqual({"created": 1, "updated": 1, "unchanged": 1}, actual["result"]["counts"])
+        self.assertEqual([{"after": {"username": "first_username", "path": "new/group/first"}}, {"before": {"url": "test_url"}, "after": {"url": "url_imported"}}],
+                         [{key: value for key, value in diff.items() if key in ["before", "after"] and value != {}} for diff in actual["diff"]])
+        self.assertIsNone(storage._index.find_group_by_path("new/group"))
+
+    def test_execute_valid_check_mode_changes_nothing(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        execute = lambda term: storage.execute(Query(display, False, term).search, check_mode=True, fail_silently=False)
+
+        actual = execute('put://one/two/test#{"url": "url_updated", "test_custom_key": "test_custom_value", "new_custom_key": "new_custom_value", "attachments": [{"filename": "scratch.keyfile", "binary": "replaced content"}]}')
+        self.assertTrue(actual["changed"])
+        self.assertDictEqual(self._database_entry, actual["result"]["outcome"])
+        self.assertEqual({"url": "test_url", "custom_properties": {"new_custom_key": None}}, {key: value for key, value in actual["diff"]["before"].items() if key != "attachments"})
+        self.assertEqual({"url": "url_updated", "custom_properties": {"new_custom_key": "new_custom_value"}}, {key: value for key, value in actual["diff"]["after"].items() if key != "attachments"})
+        self.assertEqual(hashlib.sha256(b"replaced content").hexdigest(), actual["diff"]["after"]["attachments"]["scratch.keyfile"])
+        self.assertNotEqual(actual["diff"]["before"]["attachments"]["scratch.keyfile"], actual["diff"]["after"]["attachments"]["scratch.keyfile"])
+
+        actual = execute('put://one/two/test#{"url": "test_url", "test_custom_key": "test_custom_value"}')
+        self.assertFalse(actual["changed"])
+        self.assertEqual(({}, {}), (actual["diff"]["before"], actual["diff"]["after"]))
+
+        actual = execute('post://new/group/entry#{"username": "new_username"}')
+        self.assertTrue(actual["changed"])
+        self.assertEqual(({}, {"username": "new_username", "path": "new/group/entry"}), (actual["diff"]["before"], actual["diff"]["after"]))
+        self.assertIsNone(storage._index.find_group_by_path("new/group"))
+
+        # secrets only show whether they are set, a custom property is a secret when it is kept protected
+        protected = storage._entry_find(self._search_path_valid.search)._element.xpath('String[Key="test_custom_key"]/Value')[0]
+        protected.set("Protected", "False")
+        actual = execute('put://one/two/test#{"password": "NEW-SECRET", "notes": "", "test_custom_key": "NEW-CUSTOM-SECRET"}')
+        self.assertEqual(({"password": "********", "notes": "test_notes", "custom_properties": {"test_custom_key": "********"}}, {"password": "********", "notes": "", "custom_properties": {"test_custom_key": "********"}}),
+                         (actual["diff"]["before"], actual["diff"]["after"]))
+        self.assertNotIn("SECRET", json.dumps(actual["diff"]))
+        protected.attrib.pop("Protected")
+
+        actual = execute("del://one/two/test?test_custom_key")
+        self.assertTrue(actual["changed"])
+        self.assertEqual(({"custom_properties": {"test_custom_key": "test_custom_value"}}, {"custom_properties": {"test_custom_key": None}}), (actual["diff"]["before"], actual["diff"]["after"]))
+
+        actual = execute("del://one/two/test")
+        self.assertTrue(actual["changed"])
+        self.assertIsNone(actual["result"]["outcome"])
+        self.assertEqual((dict(self._database_entry, password="********"), {}), (actual["diff"]["before"], actual["diff"]["after"]))
+
+        self.assertDictEqual(self._database_entry, storage.get(self._search_path_valid.search)[1])
+        self.assertDictEqual(self._database_entry, KeepassDatabase(self._display, dict(database_details_upsert, cache_ttl=0)).get(self._search_path_valid.search)[1])
+
+    def test_execute_transaction_invalid_rolls_back(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        with open(database_details_upsert["location"], mode="rb") as file:
+            before = file.read()
+        self.assertRaises(AnsibleParserError, storage.execute_transaction, [self._update_path_valid.search, self._delete_invalid_entry.search], False)
+        with open(database_details_upsert["location"], mode="rb") as file:
+            self.assertEqual(before, file.read())
+        self.assertDictEqual(self._database_entry, storage.get(self._search_path_valid.search)[1])
+        self.assertDictEqual(self._database_entry, KeepassDatabase(self._display, database_details_upsert).get(self._search_path_valid.search)[1])
+        self._display.assert_has_calls([
+            call.v("Keepass: database rolled back - %s" % database_details_upsert["location"])
+        ])
+
+    def test_execute_valid_concurrent_writers_lock(self):
+        database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), cache_ttl=0)
+        first, second = KeepassDatabase(self._display, database_details_upsert), KeepassDatabase(self._display, database_details_upsert)
+        first.execute(Query(display, False, 'put://one/two/test#{"url": "url_first"}').search, check_mode=False, fail_silently=False)
+        second.execute(Query(display, False, 'put://one/two/test#{"second_key": "second_value"}').search, check_mode=False, fail_silently=False)
+        actual = KeepassDatabase(self._display, database_details_upsert).get(self._search_path_valid.search)[1]
+        self.assertEqual("url_first", actual["url"])
+        self.assertEqual("second_value", actual["custom_properties"]["second_key"])
+        self._display.assert_has_calls([
+            call.v("Keepass: database reloaded - %s" % database_details_upsert["location"])
+        ])
+
+    def test_execute_valid_concurrent_writers_optimistic(self):
+        database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), cache_ttl=0, concurrency="optimistic")
+        first, second = KeepassDatabase(self._display, database_details_upsert), KeepassDatabase(self._display, database_details_upsert)
+        first.execute(Query(display, False, 'put://one/two/test#{"url": "url_first"}').search, check_mode=False, fail_silently=False)
+        second.execute_transaction([Query(display, False, 'put://one/two/test#{"second_key": "second_value"}').search, self._insert_path_valid.search], check_mode=False)
+        actual = KeepassDatabase(self._display, database_details_upsert).get(self._search_path_valid.search)[1]
+        self.assertEqual("url_first", actual["url"])
+        self.assertEqual("second_value", actual["custom_properties"]["second_key"])
+        self.assertIsNotNone(KeepassDatabase(self._display, database_details_upsert)._index.find_entry_by_path("new_path/one/two/test"))
+        self.assertEqual([], second._pending)
+        self._display.assert_has_calls([
+            call.v("Keepass: database changed on disk, re-applying 2 change(s) - %s" % database_details_upsert["location"]),
+            call.v("Keepass: database reloaded - %s" % database_details_upsert["location"])
+        ])
+
+    def test_execute_valid_concurrent_write_after_save_is_kept(self):
+        database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), cache_ttl=0, concurrency="optimistic")
+        storage, other = KeepassDatabase(self._display, database_details_upsert), KeepassDatabase(self._display, database_details_upsert)
+        original_exit, written = FileLock.__exit__, []
+
+        def _write_on_release(lock, *args):
+            # another writer gets in as soon as the save lets go of the lock
+            original_exit(lock, *args)
+            if lock is storage._file_lock and not lock.is_held and not written:
+                written.append(True)
+                other.execute(Query(display, False, 'put://one/two/test#{"username": "username_other"}').search, check_mode=False, fail_silently=False)
+
+        with mock.patch.object(FileLock, "__exit__", _write_on_release):
+            storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_updated"}').search, check_mode=False, fail_silently=False)
+        self.assertEqual([True], written)
+        self.assertTrue(storage._is_stale)
+        storage.execute(Query(display, False, 'put://one/two/test#{"notes": "notes_updated"}').search, check_mode=False, fail_silently=False)
+        saved = KeepassDatabase(self._display, database_details_upsert).get(self._search_path_valid.search)[1]
+        self.assertEqual(("username_other", "url_updated", "notes_updated"), (saved["username"], saved["url"], saved["notes"]))
+
+    def test_execute_invalid_write_is_rolled_back(self):
+        for concurrency in ["lock", "optimistic"]:
+            database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), cache_ttl=0, concurrency=concurrency)
+            storage, other = KeepassDatabase(self._display, database_details_upsert), KeepassDatabase(self._display, database_details_upsert)
+            failed = storage.execute(Query(display, False, 'put://one/two/test#{"notes": "PARTIAL", "expiry_time": "bad"}').search, check_mode=False, fail_silently=True)
+            self.assertTrue(failed["failed"])
+            self.assertEqual([], storage._pending)
+            other.execute(Query(display, False, 'put://one/two/test#{"username": "username_other"}').search, check_mode=False, fail_silently=False)
+            actual = storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_updated"}').search, check_mode=False, fail_silently=False)
+            self.assertFalse(actual["failed"])
+            saved = KeepassDatabase(self._display, database_details_upsert).get(self._search_path_valid.search)[1]
+            self.assertEqual((self._database_entry["notes"], "username_other", "url_updated"), (saved["notes"], saved["username"], saved["url"]))
+
+    def test_execute_valid_concurrent_writers_same_change_saves_once(self):
+        database_details_upsert = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), cache_ttl=0, concurrency="optimistic")
+        first, second = KeepassDatabase(self._display, database_details_upsert), KeepassDatabase(self._display, database_details_upsert)
+        first.execute(Query(display, False, 'put://one/two/test#{"url": "url_first"}').search, check_mode=False, fail_silently=False)
+        before = os.stat(database_details_upsert["location"])
+        search = Query(display, False, 'put://one/two/test#{"url": "url_first"}').search
+        actual = second.execute(search, check_mode=False, fail_silently=False)
+        self.assertTrue(actual["changed"])
+        self.assertEqual(before.st_ino, os.stat(database_details_upsert["location"]).st_ino)
+        self.assertEqual([], second._pending)
+        self.assertFalse(second._dirty)
+        self._display.assert_has_calls([
+            call.v("Keepass: database changed on disk, re-applying 1 change(s) - %s" % database_details_upsert["location"]),
+            call.v("Keepass: database reloaded - %s" % database_details_upsert["location"]),
+            call.vv("KeePass: entry found - %s" % search),
+            call.v("Keepass: database unchanged, not saved - %s" % database_details_upsert["location"])
+        ])
+
+    def test_execute_valid_save_reuses_the_derived_key(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        with mock.patch("pykeepass.kdbx_parsing.kdbx4.argon2.low_level.hash_secret_raw") as argon2, mock.patch("pykeepass.kdbx_parsing.kdbx4.aes_kdf") as aes_kdf:
+            storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_updated"}').search, check_mode=False, fail_silently=False)
+            storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_updated"}').search, check_mode=False, fail_silently=False)
+        self.assertEqual(0, argon2.call_count + aes_kdf.call_count)
+        self.assertFalse(storage._dirty)
+        self.assertEqual("url_updated", KeepassDatabase(self._display, dict(database_details_upsert, cache_ttl=0)).get(self._search_path_valid.search)[1]["url"])
+
+    def test_execute_valid_lock_is_held_while_writing(self):
+        database_details_upsert = self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16)))
+        storage = KeepassDatabase(self._display, database_details_upsert)
+        held = []
+
+        def _try_lock(*args, **kwargs):
+            with open(database_details_upsert["location"] + ".lock", mode="a") as other:
+                try:
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    held.append(False)
+                except BlockingIOError:
+                    held.append(True)
+            return original_save(*args, **kwargs)
+
+        original_save = storage._database.save
+        with mock.patch.object(storage._database, "save", side_effect=_try_lock):
+            storage.execute(self._update_path_valid.search, check_mode=False, fail_silently=False)
+        self.assertEqual([True], held)
+        self.assertFalse(storage._file_lock.is_held)
+
+    def test_execute_invalid_concurrency(self):
+        self.assertRaises(AnsibleParserError, KeepassDatabase, self._display, dict(self._database_details_valid, concurrency="INVALID"))
+
     def test_execute_invalid_not_updatable_fail_silently(self):
         database_details_delete = dict(self._copy_database("temp_" + "".join(random.choices(string.ascii_uppercase + string.digits, k=16))), updatable=False)
         storage = KeepassDatabase(self._display, database_details_delete)
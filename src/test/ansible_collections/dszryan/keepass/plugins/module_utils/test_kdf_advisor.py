@@ -0,0 +1,55 @@
+import os
+import tempfile
+from shutil import copy
+from unittest import TestCase
+
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.kdf_advisor import KdfAdvisor
+
+
+class TestKdfAdvisor(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx")
+        cls._keyfile = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile")
+        cls._argon2 = {"type": "argon2", "iterations": 20, "memory": 67108864, "parallelism": 2, "version": 19}
+
+    def test_target_validated(self):
+        self.assertEqual(KdfAdvisor.DEFAULT_TARGET_MS, KdfAdvisor().target_ms)
+        self.assertEqual(500, KdfAdvisor("500").target_ms)
+        for target_ms in [0, -1, "fast", 1.5, True, None]:
+            self.assertRaises(AttributeError, KdfAdvisor, target_ms)
+
+    def test_header(self):
+        self.assertEqual({
+            "version": "4.0",
+            "cipher": "aes256",
+            "compression": True,
+            "kdf": {"type": "argon2", "iterations": 23, "memory": 67108864, "parallelism": 2, "version": 19}
+        }, KdfAdvisor.header(self._location))
+
+    def test_recommend(self):
+        self.assertEqual(dict(self._argon2, iterations=10, predicted_ms=1000.0), KdfAdvisor(1000).recommend(self._argon2, 2000))
+        self.assertEqual(dict(self._argon2, iterations=40, predicted_ms=4000.0), KdfAdvisor(4000).recommend(self._argon2, 2000))
+        # a single iteration takes 100ms, the memory is cut to fit
+        self.assertEqual(dict(self._argon2, iterations=1, memory=33554432, predicted_ms=50.0), KdfAdvisor(50).recommend(self._argon2, 2000))
+        aeskdf = {"type": "aeskdf", "iterations": 60000, "memory": None, "parallelism": None}
+        self.assertEqual(dict(aeskdf, iterations=30000, predicted_ms=500.0), KdfAdvisor(500).recommend(aeskdf, 1000))
+        self.assertTrue(KdfAdvisor(1000).on_target(1200))
+        self.assertFalse(KdfAdvisor(1000).on_target(1300))
+
+    def test_apply(self):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, "rekey.kdbx")
+            copy(self._location, location)
+            database = PyKeePass(location, password="scratch", keyfile=self._keyfile)
+            chosen = dict(self._argon2, iterations=1, memory=KdfAdvisor.MIN_MEMORY, parallelism=1)
+            self.assertTrue(KdfAdvisor.measure(chosen) > 0)
+            KdfAdvisor.apply(database, chosen)
+            with open(location, mode="wb") as file:
+                file.write(KdfAdvisor.build(database))
+            self.assertEqual(chosen, KdfAdvisor.header(location)["kdf"])
+            reopened = PyKeePass(location, password="scratch", keyfile=self._keyfile)
+            self.assertEqual("test_password", reopened.find_entries_by_path("one/two/test", first=True).password)
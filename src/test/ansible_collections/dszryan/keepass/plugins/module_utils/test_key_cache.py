@@ -0,0 +1,60 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.key_cache import TransformedKeyCache
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.run_scope import RunScope
+
+
+class TestTransformedKeyCache(TestCase):
+
+    def setUp(self) -> None:
+        DATABASE_CACHE.clear()
+        self._directory = tempfile.TemporaryDirectory()
+        self._key_cache = TransformedKeyCache(RunScope(self._directory.name))
+        self._database_details_valid = {
+            "location": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx"),
+            "keyfile": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile"),
+            "password": "scratch",
+            "cache_ttl": 0,
+            "cache_transformed_key": True
+        }
+        self._display = mock.Mock()
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_put_get_round_trip(self):
+        self._key_cache.put("identity", b"transformed")
+        self.assertEqual(b"transformed", self._key_cache.get("identity"))
+        self.assertIsNone(self._key_cache.get("other"))
+        self.assertFalse(any(b"transformed" in open(os.path.join(self._directory.name, name), mode="rb").read() for name in os.listdir(self._directory.name)))
+
+    def test_get_is_none_when_tampered(self):
+        self._key_cache.put("identity", b"transformed")
+        location = self._key_cache._location("identity")
+        with open(location, mode="r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b"\x00" if file.read(1) != b"\x00" else b"\x01")
+        self.assertIsNone(self._key_cache.get("identity"))
+
+    def test_open_reuses_transformed_key(self):
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.TRANSFORMED_KEY_CACHE", self._key_cache), \
+                mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.PyKeePass", wraps=PyKeePass) as py_keepass:
+            first = KeepassDatabase(self._display, self._database_details_valid)
+            second = KeepassDatabase(self._display, self._database_details_valid)
+        self.assertIsNone(py_keepass.call_args_list[0].kwargs["transformed_key"])
+        self.assertEqual(first._database.transformed_key, py_keepass.call_args_list[1].kwargs["transformed_key"])
+        self.assertEqual(first._database.entries, second._database.entries)
+
+    def test_open_rejected_transformed_key_is_derived_again(self):
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.TRANSFORMED_KEY_CACHE", self._key_cache):
+            first = KeepassDatabase(self._display, self._database_details_valid)
+            self._key_cache.put(u"%s:%s" % (first._cache_key[0], first._cache_key[4]), b"\x00" * 32)
+            second = KeepassDatabase(self._display, self._database_details_valid)
+        self.assertTrue(isinstance(second._database, PyKeePass))
+        self.assertEqual(first._database.transformed_key, self._key_cache.get(u"%s:%s" % (first._cache_key[0], first._cache_key[4])))
@@ -0,0 +1,22 @@
+from unittest import TestCase, mock
+from unittest.mock import call
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.log import Log
+
+
+class TestLog(TestCase):
+
+    def test_formats_only_when_verbose(self):
+        display, argument = mock.Mock(verbosity=2), mock.Mock()
+        argument.__str__ = mock.Mock(return_value="argument")
+        log = Log(display)
+        log.vv(u"Keepass: message - %s", argument)
+        log.vvv(u"Keepass: message - %s", argument)
+        display.assert_has_calls([call.vv(u"Keepass: message - argument")])
+        display.vvv.assert_not_called()
+        self.assertEqual(1, argument.__str__.call_count)
+
+    def test_without_numeric_verbosity_logs_everything(self):
+        display = mock.Mock()
+        Log(display).vvvv(u"Keepass: message - %s %s", "one", "two")
+        display.assert_has_calls([call.vvvv(u"Keepass: message - one two")])
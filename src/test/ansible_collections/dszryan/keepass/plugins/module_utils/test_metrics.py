@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.metrics import Metrics, NO_METRICS
+
+
+class TestMetrics(TestCase):
+
+    def test_timed_nested_is_counted_once(self):
+        metrics = Metrics()
+        with metrics.timed("save"):
+            with metrics.timed("save"):
+                pass
+            with metrics.timed("open"):
+                pass
+        metrics.count("database_cache_hit")
+        metrics.count("database_cache_hit", 2)
+        actual = metrics.collect()
+        self.assertEqual(["open", "save"], sorted(actual["timings_ms"].keys()))
+        self.assertGreaterEqual(actual["timings_ms"]["save"], actual["timings_ms"]["open"])
+        self.assertEqual({"database_cache_hit": 3}, actual["counters"])
+        self.assertEqual({"timings_ms": {}, "counters": {}}, metrics.collect())
+
+    def test_merge(self):
+        actual = Metrics.merge({"timings_ms": {"open": 1.5}}, {"timings_ms": {"open": 1, "save": 2}, "counters": {"database_cache_hit": 1}})
+        self.assertEqual({"timings_ms": {"open": 2.5, "save": 2}, "counters": {"database_cache_hit": 1}}, actual)
+
+    def test_disabled_records_nothing(self):
+        with NO_METRICS.timed("open"):
+            NO_METRICS.count("database_cache_hit")
+        self.assertEqual({"timings_ms": {}, "counters": {}}, NO_METRICS.collect())
@@ -0,0 +1,25 @@
+from unittest import TestCase
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.path_pattern import PathPattern
+
+
+class TestPathPattern(TestCase):
+
+    def test_glob(self):
+        for pattern, path, expected in [
+            ("prod/db/*", "prod/db/mysql", True),
+            ("prod/db/*", "prod/db/replica/mysql", False),
+            ("/prod/**", "prod/db/replica/mysql", True),
+            ("prod/**/mysql", "prod/mysql", True),
+            ("prod/**/mysql", "prod/db/replica/mysql", True),
+            ("prod/d?/*", "prod/db/mysql", True),
+            ("prod/[a-c]b/*", "prod/db/mysql", False),
+            ("prod/[!a-c]b/*", "prod/db/mysql", True),
+            ("prod/db.*", "prod/dbx", False),
+            ("**", "mysql", True)
+        ]:
+            self.assertEqual(expected, PathPattern.compile(pattern).search(path) is not None, (pattern, path))
+
+    def test_regex(self):
+        self.assertIsNotNone(PathPattern.compile("db/.*sql", "regex").search("prod/db/mysql"))
+        self.assertIsNone(PathPattern.compile("^db/", "regex").search("prod/db/mysql"))
@@ -0,0 +1,38 @@
+import re
+from unittest import TestCase, mock
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins import display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+
+
+class TestQuery(TestCase):
+    _REGEX_PATTERN = u"(get|find|put|post|del)?:\\/\\/(((?![#\\?])[\\s\\S])*)(\\?(((?!#)[\\s\\S])*))?(#(.*))?"
+
+    def test_pattern_matches_lookahead_pattern(self):
+        for term in ["get://a/b?c#d", "get://a", 'put://x#{"a": 1}', "://a?b", "get://a?b?c#d#e", "get://a\nb?c#d\nx", "get://a?#", "del://a\nget://b", " get://a b?c d#e f", "find://a/**"]:
+            expected = [(match[0], match[1], match[4], match[7], match[6] != "") for match in re.findall(TestQuery._REGEX_PATTERN, term)]
+            actual = [(match[0], match[1], match[3], match[5], match[4] != "") for match in Query._PATTERN.findall(term)]
+            self.assertEqual(expected, actual, term)
+
+    def test_search_parsed_once_per_term(self):
+        first = Query(display, True, "get://cache/once?password#default").search
+        with mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.query.Search.__init__", side_effect=AssertionError("term must be cached")), \
+                mock.patch.object(Query, "_PATTERN", mock.Mock(findall=mock.Mock(side_effect=AssertionError("term must be cached")))):
+            second = Query(display, True, "get://cache/once?password#default").search
+        self.assertIsNot(first, second)
+        self.assertEqual(first.__dict__, second.__dict__)
+        self.assertEqual({"read_only": True, "action": "get", "path": "cache/once", "field": "password", "value": "default", "value_was_provided": True, "fields": None, "dest": None, "match": None, "tags": None}, first.__dict__)
+
+    def test_search_value_not_shared(self):
+        first = Query(display, False, 'put://cache/shared#{"attachments": [{"name": "a", "src": "a.txt"}]}').search
+        first.value["attachments"][0]["src"] = "/elsewhere/a.txt"
+        first.value["notes"] = "changed"
+        second = Query(display, False, 'put://cache/shared#{"attachments": [{"name": "a", "src": "a.txt"}]}').search
+        self.assertEqual({"attachments": [{"name": "a", "src": "a.txt"}]}, second.value)
+
+    def test_search_invalid_is_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(AnsibleParserError):
+                Query(display, True, "put://cache/invalid").search
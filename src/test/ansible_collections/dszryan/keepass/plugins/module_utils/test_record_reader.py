@@ -0,0 +1,57 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import TestCase
+
+from ansible.plugins import display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.record_reader import RecordReader
+
+
+class TestRecordReader(TestCase):
+
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _write(self, name: str, content: str) -> str:
+        location = os.path.join(self._directory.name, name)
+        with open(location, mode="w") as file:
+            file.write(content)
+        return location
+
+    def test_csv_skips_empty_cells(self):
+        location = self._write("seed.csv", "path,username,password,url,custom\none/two/first,user,secret,,value\n")
+        actual = [search.__dict__ for search in RecordReader.searches(display, location)]
+        self.assertEqual([{
+            "read_only": False, "action": "put", "path": "one/two/first", "field": None,
+            "value": {"username": "user", "password": "secret", "custom": "value"}, "value_was_provided": True, "fields": None, "dest": None, "match": None, "tags": None
+        }], actual)
+
+    def test_jsonl_group_and_title_with_relative_attachment(self):
+        location = self._write("seed.jsonl", '{"group": "one/two", "title": "first", "attachments": [{"src": "file.bin"}]}\n\n{"title": "second"}\n')
+        actual = list(RecordReader.searches(display, location))
+        self.assertEqual(["one/two/first", "second"], [search.path for search in actual])
+        self.assertEqual([{"src": os.path.join(self._directory.name, "file.bin")}], actual[0].value["attachments"])
+
+    def test_yaml_and_json(self):
+        self.assertEqual(["one", "two"], [search.path for search in RecordReader.searches(display, self._write("seed.yml", "- path: one\n  url: x\n- path: two\n"))])
+        self.assertEqual(["one"], [search.path for search in RecordReader.searches(display, self._write("seed.json", '[{"path": "one", "url": "x"}]'))])
+
+    def test_expiry_time_parsed(self):
+        location = self._write("seed.csv", "path,expiry_time\none,2030-01-02T03:04:05\ntwo,2030-01-02T03:04:05+02:00\n")
+        self.assertEqual([datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc), datetime(2030, 1, 2, 1, 4, 5, tzinfo=timezone.utc)],
+                         [search.value["expiry_time"] for search in RecordReader.searches(display, location)])
+        self.assertEqual(datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc), list(RecordReader.searches(display, self._write("seed.yaml", "- path: one\n  expiry_time: 2030-01-02 03:04:05\n")))[0].value["expiry_time"])
+
+    def test_invalid(self):
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("seed.txt", "path\none\n")))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("seed.yaml", "path: one\n")))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("seed.jsonl", '{"username": "user"}\n')))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("broken.jsonl", '{"path": \n')))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("titled.csv", "path,title\none,two\n"), "csv"))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("expiry.csv", "path,expiry_time\none,tomorrow\n")))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("attached.csv", "path,attachments\none,file.bin\n")))
+        self.assertRaises(AttributeError, list, RecordReader.searches(display, self._write("attached.jsonl", '{"path": "one", "attachments": ["file.bin"]}\n')))
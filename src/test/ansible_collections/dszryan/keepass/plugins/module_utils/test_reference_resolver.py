@@ -0,0 +1,81 @@
+import os
+from unittest import TestCase
+
+from pykeepass import PyKeePass
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_index import DatabaseIndex
+from ansible_collections.dszryan.keepass.plugins.module_utils.reference_resolver import ReferenceResolver
+
+
+class TestReferenceResolver(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._location = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx")
+        cls._keyfile = os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile")
+
+    def setUp(self) -> None:
+        self._database = PyKeePass(self._location, password="scratch", keyfile=self._keyfile)
+        self._index = DatabaseIndex.of(self._database)
+        self._resolver = ReferenceResolver.of(self._database)
+        self._test = self._index.find_entry_by_path("one/two/test")
+        self._group = self._index.find_group_by_path("three")
+
+    def _add_entry(self, title: str, username: str, password: str):
+        entry = self._database.add_entry(self._group, title, username, password)
+        self._index.add_entry(entry)
+        return entry
+
+    def test_of_is_shared_per_database(self):
+        self.assertIs(self._resolver, ReferenceResolver.of(self._database))
+
+    def test_has_reference(self):
+        self.assertTrue(ReferenceResolver.has_reference("{REF:P@I:9366B38F2EE9412FA6BAB2AB10D1F100}"))
+        self.assertTrue(ReferenceResolver.has_reference("prefix {ref:u@t:test} suffix"))
+        self.assertFalse(ReferenceResolver.has_reference("{REF:X@I:9366B38F2EE9412FA6BAB2AB10D1F100}"))
+        self.assertFalse(ReferenceResolver.has_reference(None))
+        self.assertFalse(ReferenceResolver.has_reference(b"{REF:P@I:9366B38F2EE9412FA6BAB2AB10D1F100}"))
+
+    def test_resolve_by_each_searched_field(self):
+        for searched, text in [("I", self._test.uuid.hex.upper()), ("T", self._test.title), ("U", self._test.username), ("A", self._test.url)]:
+            self.assertEqual(self._test.password, self._resolver.resolve("{REF:P@%s:%s}" % (searched, text)))
+        self.assertEqual(self._test.uuid.hex.upper(), self._resolver.resolve("{REF:I@T:test}"))
+        self.assertEqual("user: %s, url: %s" % (self._test.username, self._test.url), self._resolver.resolve("user: {REF:U@T:test}, url: {REF:A@T:test}"))
+        self.assertEqual("plain", self._resolver.resolve("plain"))
+
+    def test_resolve_leaves_a_reference_to_nothing(self):
+        for value in ["{REF:P@I:00000000000000000000000000000000}", "{REF:P@I:not_a_uuid}", "{REF:P@T:DOES_NOT_EXISTS}"]:
+            self.assertEqual(value, self._resolver.resolve(value))
+
+    def test_resolve_multi_hop(self):
+        first = self._add_entry("first", "{REF:U@I:%s}" % self._test.uuid.hex.upper(), "{REF:P@I:%s}" % self._test.uuid.hex.upper())
+        second = self._add_entry("second", "{REF:U@T:first}", "prefix-{REF:P@I:%s}" % first.uuid.hex.upper())
+        self.assertEqual(self._test.username, self._resolver.resolve(second.username))
+        self.assertEqual("prefix-" + self._test.password, self._resolver.resolve(second.password))
+
+    def test_resolve_is_memoized_until_invalidated(self):
+        first = self._add_entry("first", "username", "{REF:P@I:%s}" % self._test.uuid.hex.upper())
+        reference = "{REF:P@T:first}"
+        self.assertEqual(self._test.password, self._resolver.resolve(reference))
+        self._test.password = "changed"
+        self.assertNotEqual("changed", self._resolver.resolve(reference))
+        self._resolver.invalidate()
+        self.assertEqual("changed", self._resolver.resolve(reference))
+        self.assertEqual("changed", self._resolver.resolve(first.password))
+
+    def test_resolve_cycle(self):
+        first = self._add_entry("first", "username", "{REF:P@T:second}")
+        self._add_entry("second", "username", "{REF:P@I:%s}" % first.uuid.hex.upper())
+        self._add_entry("self", "{REF:U@T:self}", "password")
+        self.assertRaisesRegex(AttributeError, "Invalid reference - cycle", self._resolver.resolve, first.password)
+        self.assertRaisesRegex(AttributeError, "Invalid reference - cycle", self._resolver.resolve, "{REF:U@T:self}")
+        # a field read twice without a cycle is fine
+        self.assertEqual(self._test.password * 2, self._resolver.resolve("{REF:P@T:test}{REF:P@T:test}"))
+
+    def test_resolve_depth(self):
+        previous = self._add_entry("hop_0", "username", "password")
+        for hop in range(1, ReferenceResolver.MAX_DEPTH + 2):
+            previous = self._add_entry("hop_%d" % hop, "username", "{REF:P@I:%s}" % previous.uuid.hex.upper())
+        self.assertEqual("password", self._resolver.resolve("{REF:P@T:hop_%d}" % (ReferenceResolver.MAX_DEPTH - 1)))
+        self._resolver.invalidate()
+        self.assertRaisesRegex(AttributeError, "Invalid reference - more than", self._resolver.resolve, "{REF:P@T:hop_%d}" % (ReferenceResolver.MAX_DEPTH + 1))
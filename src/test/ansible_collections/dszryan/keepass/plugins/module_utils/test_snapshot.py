@@ -0,0 +1,115 @@
+import os
+import tempfile
+from shutil import copy
+from unittest import TestCase, mock
+
+from ansible.plugins import display
+
+from ansible_collections.dszryan.keepass.plugins.module_utils.database_cache import DATABASE_CACHE
+from ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database import KeepassDatabase
+from ansible_collections.dszryan.keepass.plugins.module_utils.query import Query
+from ansible_collections.dszryan.keepass.plugins.module_utils.run_scope import RunScope
+from ansible_collections.dszryan.keepass.plugins.module_utils.snapshot import Snapshot, SnapshotCache
+
+
+class TestSnapshot(TestCase):
+
+    def setUp(self) -> None:
+        DATABASE_CACHE.clear()
+        self._directory = tempfile.TemporaryDirectory()
+        self._snapshot_cache = SnapshotCache(RunScope(self._directory.name))
+        self._patch = mock.patch("ansible_collections.dszryan.keepass.plugins.module_utils.keepass_database.SNAPSHOT_CACHE", self._snapshot_cache)
+        self._patch.start()
+        self._database_details_valid = {
+            "location": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.kdbx"),
+            "keyfile": os.path.join(os.path.dirname(os.path.realpath(__file__)), "scratch.keyfile"),
+            "password": "scratch",
+            "cache_ttl": 0
+        }
+        self._display = mock.Mock()
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        self._directory.cleanup()
+
+    def _execute(self, storage: KeepassDatabase, term: str, fields=None) -> dict:
+        result = storage.execute(Query(display, True, term, fields).search, check_mode=False, fail_silently=True)
+        if result["failed"]:
+            result["result"]["outcome"].pop("trace")
+        return result
+
+    def test_build_get_round_trip(self):
+        location = os.path.join(self._directory.name, "round_trip.snapshot")
+        with open(location, mode="wb") as file:
+            file.write(Snapshot.build(b"\x01" * 32, "identity", (1, 2, 3), {"one/two/test": {"password": "secret_value"}, "other": {}}))
+        snapshot = Snapshot(location, b"\x01" * 32, "identity")
+        self.assertEqual((1, 2, 3), snapshot.version)
+        self.assertEqual(2, len(snapshot))
+        self.assertEqual({"password": "secret_value"}, snapshot.get("one/two/test"))
+        self.assertEqual({}, snapshot.get("other"))
+        self.assertIsNone(snapshot.get("missing"))
+        with open(location, mode="rb") as file:
+            content = file.read()
+        self.assertNotIn(b"secret_value", content)
+        self.assertNotIn(b"one/two/test", content)
+        self.assertIsNone(Snapshot(location, b"\x02" * 32, "identity").get("one/two/test"))
+        with open(location, mode="r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            last = file.read(1)
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes([last[0] ^ 1]))
+        self.assertRaises(ValueError, lambda: [Snapshot(location, b"\x01" * 32, "identity").get(path) for path in ["one/two/test", "other"]])
+
+    def test_snapshot_serves_reads_as_the_database_does(self):
+        terms = [
+            ("get://one/two/test", None),
+            ("get://one/two/test", "title,custom_properties"),
+            ("get://one/two/test?password", None),
+            ("get://one/two/test?test_custom_key", None),
+            ("get://one/two/test?DOES_NOT_EXISTS", None),
+            ("get://one/two/test?DOES_NOT_EXISTS#default", None),
+            ("get://one/two/clone?password", None),
+            ("get://one/two/clone?username", None),
+            ("get://one/two/clone?url", None),
+            ("get://one/two/missing?password", None)
+        ]
+        storage = KeepassDatabase(self._display, self._database_details_valid)
+        expected = [self._execute(storage, term, fields) for term, fields in terms]
+
+        self.assertTrue(storage.maintain("snapshot", check_mode=False)["changed"])
+        snapshot = KeepassDatabase(self._display, self._database_details_valid)
+        self.assertIsNone(snapshot._database)
+        self.assertIsNotNone(snapshot._snapshot)
+        self.assertEqual(expected, [self._execute(snapshot, term, fields) for term, fields in terms])
+        self.assertIsNone(snapshot._database)
+        self.assertEqual({"changed": False, "failed": False, "result": {"maintenance": "snapshot", "outcome": {"entries": 2, "bytes": snapshot._snapshot.size}}}, snapshot.maintain("snapshot", check_mode=False))
+
+        # attachments are never held by the snapshot, the database is opened to serve them
+        self.assertEqual(self._execute(storage, "get://one/two/test?scratch.keyfile"), self._execute(snapshot, "get://one/two/test?scratch.keyfile"))
+        self.assertIsNotNone(snapshot._database)
+        self.assertIsNone(snapshot._snapshot)
+
+    def test_snapshot_find_is_served_by_the_database(self):
+        KeepassDatabase(self._display, self._database_details_valid).maintain("snapshot", check_mode=False)
+        snapshot = KeepassDatabase(self._display, self._database_details_valid)
+        self.assertEqual([{"title": "test"}, {"title": "clone"}], self._execute(snapshot, "find://one/two/*", "title")["result"]["outcome"])
+        self.assertIsNone(snapshot._snapshot)
+
+    def test_snapshot_check_mode_writes_nothing(self):
+        actual = KeepassDatabase(self._display, self._database_details_valid).maintain("snapshot", check_mode=True)
+        self.assertTrue(actual["changed"])
+        self.assertEqual(2, actual["result"]["outcome"]["entries"])
+        self.assertIsNone(KeepassDatabase(self._display, self._database_details_valid)._snapshot)
+
+    def test_snapshot_is_dropped_on_save(self):
+        location = os.path.join(self._directory.name, "scratch.kdbx")
+        copy(self._database_details_valid["location"], location)
+        details = dict(self._database_details_valid, location=location, updatable=True)
+        KeepassDatabase(self._display, details).maintain("snapshot", check_mode=False)
+        storage = KeepassDatabase(self._display, details)
+        self.assertIsNotNone(storage._snapshot)
+        actual = storage.execute(Query(display, False, 'put://one/two/test#{"url": "url_updated"}').search, check_mode=False, fail_silently=False)
+        self.assertTrue(actual["changed"])
+        reopened = KeepassDatabase(self._display, details)
+        self.assertIsNone(reopened._snapshot)
+        self.assertEqual({"url": "url_updated"}, reopened.execute(Query(display, True, "get://one/two/test?url").search, check_mode=False, fail_silently=False)["result"]["outcome"])